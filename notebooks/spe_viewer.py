@@ -21,6 +21,10 @@ import sys
 
 import winspec
 
+# The witec package sits at the root of the repository, above notebooks/
+sys.path.insert(0, os.path.abspath(os.pardir))
+from witec.grid import ScanGrid, nearest_index
+
 class SPE:
     def __init__(self, file):
         self.spe_dict = winspec.read_spe(file)
@@ -157,19 +161,12 @@ class SPE:
     def build_position_dataset(self, PointsPerLine, LinesPerImage, ScanWidth, ScanHeight, ScanUnit):
         """Correlate the acquisition number with a physical position coordinate."""
         # The dimensions of image (x,y) acquired in a spectral image
-        self.x_pixels = int(PointsPerLine)
-        self.y_pixels = int(LinesPerImage)
-        step_x = float(ScanWidth) / self.x_pixels 
-        step_y = float(ScanHeight) / self.y_pixels 
+        self.grid = ScanGrid(PointsPerLine, LinesPerImage, ScanWidth, ScanHeight, ScanUnit)
+        self.x_pixels = self.grid.points_per_line
+        self.y_pixels = self.grid.lines
         self.position_units = ScanUnit
-        
-        position_indices = []
-        for y in range(self.y_pixels):
-            for x in range(self.x_pixels):
-                position_indices.append((x,y))
-        
-        self.position_indices = np.asarray(position_indices, dtype=np.uint16)
-        self.position_values = self.position_indices * (step_x, step_y)
+        self.position_indices = self.grid.indices.astype(np.uint16)
+        self.position_values = self.grid.values
         return None
 
     def link_supplemental(self, file):
@@ -218,9 +215,7 @@ class SPE:
 
     def find_nearest(self, array, value):
         """Return the index in array that is closest to value."""
-        array = np.asarray(array)
-        idx = (np.abs(array - value)).argmin()
-        return idx
+        return nearest_index(array, value)
     
     def index_from_coord(self, real_coord):
         """Return the index corresponding to a specified coordinate from the heatmap.
@@ -235,9 +230,7 @@ class SPE:
         index : int
             The matching index of the main_dataset corresponding to the real coordinate.
         """
-        condition = np.logical_and(self.position_values[:, 0] == real_coord[0],
-                                   self.position_values[:, 1] == real_coord[1])
-        return np.argwhere(condition)[0][0]
+        return self.grid.index(*real_coord)
         
     
     def spectrum(self, index):
@@ -379,15 +372,11 @@ print(spectra.shape)
 # The dimensions of image (x,y) acquired in a spectral image
 x_width = 98  # Adjust this based on the known number of columns, unique to each file
 y_width = 98  # Adjust this based on the known number of rows, unique to each file
-position_indices = []
-for y in range(y_width):
-   for x in range(x_width):
-       position_indices.append((x,y))
-
-position_indices = np.asarray(position_indices)
-
 step_xy = 1e-6 # Step size between measured acquisitions
-position_values = position_indices * step_xy
+grid = ScanGrid(x_width, y_width, x_width * step_xy, y_width * step_xy, 'm')
+
+position_indices = grid.indices
+position_values = grid.values
 # -
 
 # Specify coordinates from ancillary data
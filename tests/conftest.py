@@ -0,0 +1,95 @@
+import struct
+
+import numpy as np
+import pytest
+
+from witec.winspec import Header, SpeFile
+
+
+def write_spe(path, frames, datatype=3):
+    """Write frames of shape (n, ydim, xdim) to a minimal WinSpec .SPE file."""
+    frames = np.asarray(frames)
+    header = Header()
+    header.NumFrames, header.ydim, header.xdim = frames.shape
+    header.datatype = datatype
+    header.date = b"31Dec1999"
+    header.exp_sec = 0.5
+    header.SpecCenterWlNm = 700.0
+    header.DetTemperature = -70.0
+    xcalib = header.xcalibration
+    xcalib.calib_valid = b"\x01"
+    xcalib.polynom_order = b"\x01"
+    xcalib.polynom_coeff[0] = 650.0
+    xcalib.polynom_coeff[1] = 0.1
+    xcalib.pixel_position[2] = header.xdim
+    xcalib.string = b"Wavelength [nm]"
+    dtype = SpeFile._datatype_map[datatype]
+    with open(path, "wb") as stream:
+        stream.write(bytes(header))
+        stream.write(np.ascontiguousarray(frames, dtype=dtype).tobytes())
+    return path
+
+
+@pytest.fixture
+def spe_map(tmp_path):
+    """A 3 x 4 map of 20-pixel spectra, returned with its frames."""
+    rng = np.random.default_rng(0)
+    frames = rng.integers(0, 2000, size=(12, 1, 20))
+    path = write_spe(tmp_path / "sample_loc_id_map_20230615-1324_1.SPE", frames)
+    return path, frames
+
+
+def _wit_tag(name, dtype, payload, offset):
+    """Encode one WIT tag whose payload starts `offset` bytes into the file."""
+    name = name.encode()
+    head = struct.pack("<I", len(name)) + name + struct.pack("<I", dtype)
+    start = offset + len(head) + 16
+    return head + struct.pack("<QQ", start, start + len(payload)) + payload
+
+
+def _wit_tree(tags, offset):
+    """Encode (name, value) pairs, recursing into dictionaries as subtrees."""
+    encoded = b""
+    for name, value in tags.items():
+        position = offset + len(encoded)
+        if isinstance(value, dict):
+            # Header length depends only on the name, so encode it twice
+            head = len(_wit_tag(name, 0, b"", position))
+            payload = _wit_tree(value, position + head)
+            encoded += _wit_tag(name, 0, payload, position)
+        else:
+            encoded += _wit_tag(name, 7, value, position)
+    return encoded
+
+
+def write_wip(path, infos):
+    """Write a minimal WITec Project file with one info stream per data object.
+
+    `infos` maps names such as "Data 1" to the RTF bytes of their
+    TDStream/StreamData information text.
+    """
+    data = {"Version": b"\x00"}
+    for name, info in infos.items():
+        data[name] = {"TDStream": {"StreamData": info}}
+    project = {"WITec Project": {"Data": data}}
+    with open(path, "wb") as stream:
+        stream.write(b"WIT_PRCT" + _wit_tree(project, 8))
+    return path
+
+
+INFO_RTF = (
+    b"{\\rtf1\\ansi{\\fonttbl{\\f0 Arial;}}\\f0 Spectrum Information\\par "
+    b"Integration Time:\\tab 0.5 s\\par "
+    b"Points per Line:\\tab 4\\par "
+    b"Lines per Image:\\tab 3\\par "
+    b"Scan Width [\\'b5m]:\\tab 20.000\\par }\x00"
+)
+
+
+@pytest.fixture
+def wip_pair(tmp_path, spe_map):
+    """A WIP/SPE pair sharing a basename, returned as the basename."""
+    spe, _ = spe_map
+    basename = spe.with_suffix("")
+    write_wip(basename.with_suffix(".WIP"), {"Data 1": INFO_RTF})
+    return basename
@@ -0,0 +1,151 @@
+from datetime import date
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from witec.catalog import Catalog, find
+from tests.conftest import write_spe, write_wip
+
+
+def test_catalog_indexes_pair(tmp_path, wip_pair):
+    with Catalog(tmp_path / "catalog.sqlite") as catalog:
+        summary = catalog.refresh(tmp_path, processes=1)
+        row = catalog.get(wip_pair)
+    assert summary == {"scanned": 2, "indexed": 1, "removed": 0}
+    assert row["sample"] == "sample" and row["meas_type"] == "map"
+    assert row["has_spe"] and row["has_wip"] and row["error"] is None
+    assert row["exp_sec"] == 0.5 and row["NumFrames"] == 12
+    assert "Points per Line" in row["wip_json"]["Data 1"]
+
+
+def test_catalog_refresh_is_incremental(tmp_path, wip_pair):
+    path = tmp_path / "catalog.sqlite"
+    with Catalog(path) as catalog:
+        catalog.refresh(tmp_path, processes=1)
+    with Catalog(path) as catalog:
+        assert catalog.refresh(tmp_path, processes=1)["indexed"] == 0
+        spe = wip_pair.with_suffix(".SPE")
+        stat = spe.stat()
+        os.utime(spe, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        assert catalog.refresh(tmp_path, processes=1)["indexed"] == 1
+        spe.unlink()
+        assert catalog.refresh(tmp_path, processes=1)["indexed"] == 1
+        assert not catalog.get(wip_pair)["has_spe"]
+        wip_pair.with_suffix(".WIP").unlink()
+        assert catalog.refresh(tmp_path, processes=1)["removed"] == 1
+        assert len(catalog) == 0
+
+
+def test_catalog_refresh_resolves_directory_spelling(tmp_path, wip_pair, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / "catalog.sqlite"
+    with Catalog(path) as catalog:
+        assert catalog.refresh(tmp_path, processes=1)["indexed"] == 1
+        for spelling in (".", "./", os.path.join(tmp_path, ".")):
+            assert catalog.refresh(spelling, processes=1)["indexed"] == 0
+        assert catalog.get(wip_pair.name)["sample"] == "sample"
+    assert len(find(path)) == 1
+
+
+def _acquisitions(directory):
+    frames = np.zeros((2, 1, 8))
+    for name in [
+        "MoS2_A_01_spectra_532nm_1mW_20230615-1324_1",
+        "MoS2_A_02_spectra_633nm_1mW_20230620-0900_2",
+        "MoS2_B_01_map_532nm_20230702-1100_3",
+        "WSe2_A_01_spectra_532nm_20230616-1000_4",
+    ]:
+        write_spe(directory / f"{name}.SPE", frames)
+
+
+def test_catalog_find(tmp_path):
+    _acquisitions(tmp_path)
+    with Catalog(tmp_path / "catalog.sqlite") as catalog:
+        catalog.refresh(tmp_path, processes=1)
+        found = catalog.find(sample="MoS2", wavelength=532e-9)
+        assert [row["measurement_number"] for row in found] == ["1", "3"]
+        june = ("2023-06-01", date(2023, 6, 30))
+        found = catalog.find(wavelength=(500e-9, 600e-9), date_range=june)
+        assert [row["measurement_number"] for row in found] == ["1", "4"]
+        found = catalog.find(sample=["MoS2", "WSe2"], meas_type="spectra")
+        assert len(found) == 3
+        assert len(catalog.find(location="B", set_power=1e-3)) == 0
+        with pytest.raises(TypeError):
+            catalog.find(colour="red")
+    assert len(find(tmp_path / "catalog.sqlite", date_range=(None, "2023-06-16"))) == 2
+
+
+def test_catalog_find_date_strings_cover_whole_days(tmp_path):
+    _acquisitions(tmp_path)
+    path = tmp_path / "catalog.sqlite"
+    with Catalog(path) as catalog:
+        catalog.refresh(tmp_path, processes=1)
+    day = date(2023, 6, 15)
+    assert len(find(path, date_range=("2023-06-15", "2023-06-15"))) == 1
+    assert find(path, date_range=("2023-06-15", "2023-06-15")) == find(
+        path, date_range=(day, day)
+    )
+    assert len(find(path, date_range=("2023-06-15", "2023-06-15T13:00"))) == 0
+    assert len(find(path, date_range=("2023-06-15", "2023-06-15T14:00"))) == 1
+
+
+def test_catalog_keeps_acquisitions_without_a_date(tmp_path):
+    _acquisitions(tmp_path)
+    write_spe(tmp_path / "MoS2_A_03_spectra_532nm_baddate_5.SPE", np.zeros((2, 1, 8)))
+    with Catalog(tmp_path / "catalog.sqlite") as catalog:
+        assert catalog.refresh(tmp_path, processes=1)["indexed"] == 5
+        row = catalog.get(tmp_path / "MoS2_A_03_spectra_532nm_baddate_5")
+        assert row["timestamp"] is None and row["error"] is None
+        assert row["sample"] == "MoS2"
+        assert len(catalog.find(date_range=("2023-01-01", None))) == 4
+
+
+def test_catalog_refresh_in_parallel(tmp_path, wip_pair):
+    copy = tmp_path / "copy" / wip_pair.name
+    copy.parent.mkdir()
+    for suffix in (".SPE", ".WIP"):
+        shutil.copy(wip_pair.with_suffix(suffix), copy.with_suffix(suffix))
+    with Catalog(tmp_path / "serial.sqlite") as serial:
+        serial.refresh(tmp_path, processes=1)
+        with Catalog(tmp_path / "parallel.sqlite") as parallel:
+            assert parallel.refresh(tmp_path, processes=2)["indexed"] == 2
+            for basename in (wip_pair, copy):
+                assert parallel.get(basename) == serial.get(basename)
+
+
+def test_catalog_refresh_in_parallel_records_malformed_rtf(tmp_path, wip_pair):
+    malformed = tmp_path / "sample_loc_id_map_20230616-0900_2"
+    write_wip(malformed.with_suffix(".WIP"), {"Data 1": b"{\\rtf1 x}}"})
+    with Catalog(tmp_path / "serial.sqlite") as serial:
+        serial.refresh(tmp_path, processes=1)
+        with Catalog(tmp_path / "parallel.sqlite") as parallel:
+            assert parallel.refresh(tmp_path, processes=2)["indexed"] == 2
+            assert parallel.get(wip_pair)["error"] is None
+            row = parallel.get(malformed)
+            assert row == serial.get(malformed)
+            assert row["error"].startswith("WIP: IndexError")
+
+
+def test_catalog_find_by_wip_info(tmp_path, wip_pair):
+    with Catalog(tmp_path / "catalog.sqlite") as catalog:
+        catalog.refresh(tmp_path, processes=1)
+        row = catalog.get(wip_pair)
+        assert row["integration_time"] == 0.5 and row["points_per_line"] == 4
+        assert row["scan_width"] == 2e-05 and row["scan_height"] is None
+        assert len(catalog.find(integration_time=0.5)) == 1
+        assert len(catalog.find(scan_width=(10e-6, 30e-6), lines_per_image=4)) == 0
+
+
+def test_catalog_refresh_in_parallel_records_empty_info(tmp_path, wip_pair):
+    empty = tmp_path / "sample_loc_id_map_20230616-0900_3"
+    write_wip(empty.with_suffix(".WIP"), {"Data 1": b"{\\rtf1 }"})
+    with Catalog(tmp_path / "serial.sqlite") as serial:
+        serial.refresh(tmp_path, processes=1)
+        with Catalog(tmp_path / "parallel.sqlite") as parallel:
+            assert parallel.refresh(tmp_path, processes=2)["indexed"] == 2
+            assert parallel.get(wip_pair)["error"] is None
+            row = parallel.get(empty)
+            assert row == serial.get(empty)
+            assert row["error"] == "WIP: ValueError: WIP information text is empty"
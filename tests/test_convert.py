@@ -0,0 +1,122 @@
+import os
+
+import h5py
+import numpy as np
+
+from witec.__main__ import main
+from witec.convert import (
+    MANIFEST,
+    chunk_shape,
+    convert,
+    convert_directory,
+    read_manifest,
+    rechunk,
+)
+from witec.winspec import SpeFile
+from tests.conftest import write_spe
+
+
+def test_convert_pair_streams_frames_and_metadata(wip_pair, monkeypatch):
+    # Force several blocks so the streaming path is exercised
+    monkeypatch.setattr("witec.convert.CHUNK_BYTES", 1)
+    monkeypatch.setattr("witec.convert.H5_CHUNK_BYTES", 100)
+    output = convert(wip_pair)
+    assert output == wip_pair.with_suffix(".hdf5")
+    expected = SpeFile(wip_pair.with_suffix(".SPE")).data
+    with h5py.File(output, "r") as h5:
+        assert h5["spe/data"].chunks[0] < expected.shape[0]
+        assert np.array_equal(h5["spe/data"][()], expected)
+        assert h5["spe"].attrs["exp_sec"] == 0.5
+        assert h5.attrs["Experiment.sample"] == "sample"
+        assert h5.attrs["WIP.Data 1.Points per Line"] == "4"
+        info = h5["wip/WITec Project/Data/Data 1/TDStream/StreamData"][()]
+        assert info.dtype == np.uint8 and info.tobytes().startswith(b"{\\rtf")
+
+
+def test_cli_converts_into_output_directory(tmp_path):
+    frames = np.arange(4 * 2 * 5).reshape(4, 2, 5)
+    spe = write_spe(tmp_path / "sample_loc_id_spectra_20230615-1324_1.SPE", frames)
+    assert main(["convert", str(spe), "-o", str(tmp_path / "out")]) == 0
+    with h5py.File(tmp_path / "out" / spe.with_suffix(".hdf5").name, "r") as h5:
+        assert np.array_equal(h5["spe/data"][()], frames.transpose(0, 2, 1))
+        assert "wip" not in h5
+
+
+def test_cli_converts_remaining_files_after_a_failure(tmp_path, monkeypatch):
+    converted = []
+
+    def fake_convert(basename, *args, **kwargs):
+        if basename.name == "broken":
+            raise RuntimeError("corrupt header")
+        converted.append(basename.name)
+
+    monkeypatch.setattr("witec.__main__.convert", fake_convert)
+    paths = [str(tmp_path / "broken.SPE"), str(tmp_path / "fine.SPE")]
+    assert main(["convert", *paths]) == 1
+    assert converted == ["fine"]
+
+
+def test_convert_directory_resumes_from_manifest(wip_pair, tmp_path):
+    output_dir = tmp_path / "converted"
+    summary = convert_directory(wip_pair.parent, output_dir, processes=1)
+    assert summary == {"converted": 1, "skipped": 0, "failed": 0}
+    assert convert_directory(wip_pair.parent, output_dir)["skipped"] == 1
+    # A touched file keeps its hash, so it is not converted again
+    spe = wip_pair.with_suffix(".SPE")
+    stat = spe.stat()
+    os.utime(spe, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert convert_directory(wip_pair.parent, output_dir)["skipped"] == 1
+    with open(spe, "ab") as stream:
+        stream.write(bytes(2))
+    with open(output_dir / MANIFEST, "a", encoding="utf-8") as stream:
+        stream.write('{"basename": "interrupted')
+    assert convert_directory(wip_pair.parent, output_dir)["converted"] == 1
+    entries = read_manifest(output_dir / MANIFEST)
+    assert entries[wip_pair.name]["sources"][".SPE"]["size"] == spe.stat().st_size
+    assert [path.name for path in output_dir.iterdir()] == sorted(
+        [MANIFEST, wip_pair.with_suffix(".hdf5").name]
+    )
+
+
+def test_convert_directory_serially_clears_stale_partials(
+    wip_pair, tmp_path, monkeypatch
+):
+    output_dir = tmp_path / "converted"
+    (output_dir / "nested").mkdir(parents=True)
+    stale = output_dir / "nested" / f".map.hdf5.{2**22 + 1}.partial"
+    live = output_dir / f".other.hdf5.{os.getpid()}.partial"
+    for path in (stale, live):
+        path.write_bytes(b"")
+    # A single process converts in-process, without starting a pool
+    monkeypatch.setattr("witec.convert.ProcessPoolExecutor", None)
+    summary = convert_directory(wip_pair.parent, output_dir, processes=1)
+    assert summary == {"converted": 1, "skipped": 0, "failed": 0}
+    assert not stale.exists() and live.exists()
+
+
+def test_chunk_shape_balances_spectra_and_band_images(monkeypatch):
+    monkeypatch.setattr("witec.convert.H5_CHUNK_BYTES", 2**20)
+    shape = (200 * 200, 1340, 1)
+    frames, pixels, _ = chunk_shape(shape, 2, points_per_line=200)
+    assert frames % 200 == 0
+    spectrum_chunks = -(-shape[1] // pixels)
+    image_chunks = -(-shape[0] // frames)
+    assert spectrum_chunks <= 16 and image_chunks <= 16
+    assert chunk_shape(shape, 2, access="spectra")[1] == 1340
+    assert chunk_shape((12, 20, 1), 2) is None
+
+
+def test_rechunk_keeps_data_and_metadata(wip_pair, monkeypatch):
+    monkeypatch.setattr("witec.convert.H5_CHUNK_BYTES", 64)
+    output = convert(wip_pair)
+    with h5py.File(output, "r") as h5:
+        expected = h5["spe/data"][()]
+        attrs = dict(h5["spe"].attrs)
+    rechunk(output, access="spectra")
+    with h5py.File(output, "r") as h5:
+        assert h5["spe/data"].chunks[1] == expected.shape[1]
+        assert np.array_equal(h5["spe/data"][()], expected)
+        assert h5["spe/data"].attrs["points_per_line"] == 4
+        assert dict(h5["spe"].attrs).keys() == attrs.keys()
+        assert h5.attrs["Experiment.sample"] == "sample"
+        assert "StreamData" in h5["wip/WITec Project/Data/Data 1/TDStream"]
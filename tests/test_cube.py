@@ -0,0 +1,72 @@
+import h5py
+import numpy as np
+import pytest
+
+from witec.cube import Cube
+from tests.conftest import write_spe
+
+
+def _in_memory(frames, points_per_line=4):
+    return frames.sum(axis=1).reshape(-1, points_per_line, frames.shape[-1])
+
+
+def test_cube_from_spe_matches_frames(spe_map):
+    path, frames = spe_map
+    cube = Cube.from_spe(path, points_per_line=4)
+    assert cube.shape == (3, 4, 20)
+    assert np.array_equal(cube.compute(), _in_memory(frames))
+
+
+def test_cube_bins_multiple_ccd_rows(tmp_path):
+    frames = np.arange(6 * 3 * 5).reshape(6, 3, 5)
+    path = write_spe(tmp_path / "binned.SPE", frames)
+    cube = Cube.from_spe(path, points_per_line=2)
+    assert np.array_equal(cube.compute(), _in_memory(frames, 2))
+
+
+def test_cube_slicing_is_lazy_and_composes(spe_map):
+    path, frames = spe_map
+    expected = _in_memory(frames)
+    cube = Cube.from_spe(path, points_per_line=4)
+    sub = cube[1:, ::2][:, 1:, 5:15:3]
+    assert sub.shape == expected[1:, ::2][:, 1:, 5:15:3].shape
+    assert np.array_equal(sub.compute(), expected[1:, ::2][:, 1:, 5:15:3])
+
+
+def test_cube_sel_by_wavelength(spe_map):
+    path, frames = spe_map
+    cube = Cube.from_spe(path, points_per_line=4)
+    window = cube.sel(wavelength=(650.5, 651.0))
+    assert np.allclose(window.wavelength, [650.5, 650.6, 650.7, 650.8, 650.9, 651.0])
+
+
+@pytest.mark.parametrize("axis", [None, 0, 1, 2, (0, 1), (1, 2), (0, 2)])
+@pytest.mark.parametrize("name", ["sum", "mean", "max"])
+def test_cube_reductions_match_numpy(spe_map, name, axis):
+    path, frames = spe_map
+    expected = getattr(np, name)(_in_memory(frames), axis=axis)
+    cube = Cube.from_spe(path, points_per_line=4, chunk_lines=1, workers=2)
+    assert np.allclose(getattr(cube, name)(axis=axis), expected)
+
+
+@pytest.mark.parametrize("axis", [None, 0, 1, 2])
+def test_cube_argmax_matches_numpy(spe_map, axis):
+    path, frames = spe_map
+    expected = np.argmax(_in_memory(frames), axis=axis)
+    cube = Cube.from_spe(path, points_per_line=4, chunk_lines=1, workers=2)
+    assert np.array_equal(cube.argmax(axis=axis), expected)
+
+
+def test_cube_from_hdf5_closes_its_file(tmp_path):
+    data = np.arange(2 * 3 * 4).reshape(2, 3, 4)
+    with h5py.File(tmp_path / "map.hdf5", "w") as h5:
+        h5["spectra"] = data
+        h5["spectra"].attrs["wavelength"] = np.linspace(600, 630, 4)
+    with Cube.from_hdf5(tmp_path / "map.hdf5", "spectra") as cube:
+        np.testing.assert_array_equal(cube[:, 1:].sum(axis=2), data[:, 1:].sum(axis=2))
+        assert cube.wavelength[-1] == 630
+    assert not cube.file.id.valid
+    with h5py.File(tmp_path / "map.hdf5", "a") as h5:
+        del h5["spectra"]
+    with pytest.raises(KeyError):
+        Cube.from_hdf5(tmp_path / "map.hdf5", "spectra")
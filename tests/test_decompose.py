@@ -0,0 +1,48 @@
+import numpy as np
+
+from witec.cube import Cube
+from witec.decompose import nmf, pca
+
+
+def _mixture(seed=0):
+    """A 6 x 5 map mixing two Gaussian bands, plus a little noise."""
+    rng = np.random.default_rng(seed)
+    axis = np.linspace(600, 700, 40)
+    bands = np.exp(-((axis[None] - [[630], [670]]) ** 2) / 50)
+    abundances = rng.random((6, 5, 2))
+    noise = 1e-3 * rng.random((6, 5, 40))
+    return axis, bands, abundances, 100 * (abundances @ bands) + noise
+
+
+def test_pca_matches_full_svd():
+    axis, _, _, data = _mixture()
+    cube = Cube(data, wavelength=axis, chunk_lines=2)
+    result = pca(cube, n_components=3, seed=0)
+    spectra = data.reshape(-1, 40)
+    centered = spectra - spectra.mean(axis=0)
+    _, singular, vt = np.linalg.svd(centered, full_matrices=False)
+    np.testing.assert_allclose(result.mean, spectra.mean(axis=0))
+    np.testing.assert_allclose(
+        result.explained_variance,
+        singular[:3] ** 2 / (len(spectra) - 1),
+        rtol=1e-6,
+        atol=1e-6,
+    )
+    for component, reference in zip(result.components[:2], vt[:2]):
+        assert abs(component @ reference) > 1 - 1e-6
+    np.testing.assert_array_equal(result.axis, axis)
+    assert result.scores.shape == (6, 5, 3)
+    np.testing.assert_allclose(result.reconstruct(), data, atol=1e-2)
+
+
+def test_nmf_recovers_non_negative_factors():
+    axis, bands, _, data = _mixture()
+    result = nmf(Cube(data, wavelength=axis, chunk_lines=4), n_components=2, seed=0)
+    assert result.components.shape == (2, 40) and result.scores.shape == (6, 5, 2)
+    assert (result.components >= 0).all() and (result.scores >= 0).all()
+    np.testing.assert_allclose(result.components.max(axis=1), 1)
+    error = np.linalg.norm(result.reconstruct() - data) / np.linalg.norm(data)
+    assert error < 1e-2
+    # Each component peaks at one of the bands
+    peaks = sorted(axis[result.components.argmax(axis=1)])
+    np.testing.assert_allclose(peaks, [630, 670], atol=3)
@@ -0,0 +1,81 @@
+import json
+import os
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+
+from witec.dedupe import dedupe, find_duplicates, restore, rsync_excludes
+from witec.winspec import Header
+from tests.conftest import write_spe
+
+
+def _archive(directory):
+    frames = np.arange(4 * 1 * 6).reshape(4, 1, 6)
+    original = write_spe(directory / "a_1.SPE", frames)
+    (directory / "sync").mkdir()
+    exact = directory / "sync" / "a_1.SPE"
+    exact.write_bytes(original.read_bytes())
+    # Saved again under another name, which WinSpec records in the header
+    renamed = bytearray(original.read_bytes())
+    field = Header.background
+    renamed[field.offset : field.offset + 5] = b"b.SPE"
+    (directory / "sync" / "b_1.SPE").write_bytes(renamed)
+    write_spe(directory / "c_1.SPE", frames + 1)
+    for age, path in enumerate([original, exact, directory / "sync" / "b_1.SPE"]):
+        os.utime(path, ns=(0, age * 10**9))
+    return original, exact, directory / "sync" / "b_1.SPE"
+
+
+def test_find_duplicates_ignores_filename_fields(tmp_path):
+    original, exact, renamed = _archive(tmp_path)
+    groups = find_duplicates(tmp_path, processes=1)
+    assert groups == [[str(original), str(exact), str(renamed)]]
+
+
+def test_dedupe_hardlinks_exact_copies_and_restores_others(tmp_path):
+    original, exact, renamed = _archive(tmp_path)
+    content = renamed.read_bytes()
+    dedupe(tmp_path, action="hardlink", processes=1)
+    assert os.path.samefile(original, exact) and renamed.exists()
+    dedupe(tmp_path, action="manifest", processes=1)
+    assert not renamed.exists()
+    assert find_duplicates(tmp_path, processes=1) == []
+    assert restore(tmp_path / "duplicates.jsonl") == [renamed]
+    assert renamed.read_bytes() == content
+
+
+def test_rsync_excludes_lists_every_recorded_copy(tmp_path):
+    _archive(tmp_path)
+    manifest = tmp_path / "duplicates.jsonl"
+    assert rsync_excludes(manifest, tmp_path) == []
+    dedupe(tmp_path, action="manifest", processes=1)
+    assert rsync_excludes(manifest, tmp_path) == ["/sync/a_1.SPE", "/sync/b_1.SPE"]
+    with open(manifest, "a", encoding="utf-8") as stream:
+        stream.write(json.dumps({"path": str(tmp_path / "d*[1].SPE")}) + "\n")
+    assert rsync_excludes(manifest, tmp_path)[-1] == "/d\\*\\[1].SPE"
+
+
+@pytest.mark.skipif(shutil.which("rsync") is None, reason="rsync is not installed")
+def test_deduplicated_copies_survive_a_later_sync(tmp_path):
+    source, data = tmp_path / "network" / "folder", tmp_path / "data"
+    source.mkdir(parents=True)
+    original, exact, renamed = _archive(source)
+    excludes = tmp_path / "excludes.txt"
+
+    def sync():
+        subprocess.run(
+            ["rsync", "-a", f"--exclude-from={excludes}", str(source), f"{data}/"],
+            check=True,
+        )
+
+    excludes.write_text("")
+    sync()
+    dedupe(data, action="manifest", processes=1)
+    patterns = rsync_excludes(data / "duplicates.jsonl", data)
+    excludes.write_text("".join(pattern + "\n" for pattern in patterns))
+    sync()
+    synced = data / "folder"
+    assert os.path.samefile(synced / "a_1.SPE", synced / "sync" / "a_1.SPE")
+    assert not (synced / "sync" / "b_1.SPE").exists()
@@ -0,0 +1,36 @@
+import numpy as np
+
+from witec.fitting import fit_map, lorentzian, multipeak, serpentine_order
+
+
+def _lorentzian_map(lines=3, points=4):
+    x = np.linspace(500, 540, 200)
+    centers = np.linspace(518, 522, lines * points).reshape(lines, points)
+    spectra = 100 + lorentzian(x, 1000, centers[..., None], 2.0)
+    return x, centers, spectra
+
+
+def test_serpentine_order_reverses_odd_lines():
+    assert serpentine_order(2, 3).tolist() == [0, 1, 2, 5, 4, 3]
+
+
+def test_multipeak_adds_offset():
+    x = np.array([0.0, 10.0])
+    params = np.array([5.0, 0.0, 1.0, 2.0])
+    assert np.allclose(multipeak(x, params), [7.0, 2.0 + lorentzian(10.0, 5, 0, 1)])
+
+
+def test_fit_map_recovers_centers():
+    x, centers, spectra = _lorentzian_map()
+    maps = fit_map(spectra, x, centers=[520], processes=1)
+    assert maps["center_0"].shape == centers.shape
+    assert maps["success"].all()
+    assert np.allclose(maps["center_0"], centers, atol=1e-3)
+    assert np.allclose(maps["offset"], 100, atol=1e-2)
+
+
+def test_fit_map_process_pool_matches_serial():
+    x, centers, spectra = _lorentzian_map()
+    serial = fit_map(spectra, x, centers=[520], processes=1, blocks=3)
+    pooled = fit_map(spectra, x, centers=[520], processes=2, blocks=3)
+    assert np.allclose(serial["center_0"], pooled["center_0"])
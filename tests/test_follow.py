@@ -0,0 +1,25 @@
+import h5py
+import numpy as np
+
+from witec.follow import SpeFollower
+from witec.winspec import SpeFile
+from tests.conftest import write_spe
+
+
+def test_follower_appends_only_completed_frames(tmp_path):
+    frames = np.arange(5 * 2 * 3, dtype=np.uint16).reshape(5, 2, 3)
+    spe = write_spe(tmp_path / "series.SPE", frames)
+    content = spe.read_bytes()
+    frame_bytes = 2 * 3 * 2
+    # WinSpec has written two and a half frames so far
+    spe.write_bytes(content[: 4100 + 2 * frame_bytes + frame_bytes // 2])
+    follower = SpeFollower(spe)
+    assert follower.poll() == 2
+    assert follower.poll() == 0
+    with h5py.File(follower.output, "r", swmr=True) as h5:
+        assert h5["spe/data"].shape == (2, 3, 2)
+        spe.write_bytes(content)
+        assert follower.poll() == 3 and follower.complete
+        h5["spe/data"].refresh()
+        assert np.array_equal(h5["spe/data"][()], SpeFile(spe).data)
+    assert follower.run(interval=0) == 5
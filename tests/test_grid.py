@@ -0,0 +1,31 @@
+import numpy as np
+
+from witec.grid import ScanGrid, nearest_index
+
+
+def test_scan_grid_matches_line_by_line_loop():
+    grid = ScanGrid(points_per_line=4, lines=3, width=8.0, height=3.0)
+    loop = np.array([(x, y) for y in range(3) for x in range(4)])
+    assert grid.shape == (3, 4) and len(grid) == 12
+    np.testing.assert_array_equal(grid.indices, loop)
+    np.testing.assert_allclose(grid.values, loop * (2.0, 1.0))
+    assert grid.extent == (0.0, 6.0, 2.0, 0.0)
+    for index, (x, y) in enumerate(grid.values):
+        assert grid.index(x, y) == index
+        assert grid.position(index) == (x, y)
+    np.testing.assert_array_equal(grid.index([1.1, 5.2], [1.4, 0.0]), [5, 3])
+
+
+def test_nearest_index():
+    axis = np.array([500.0, 501.0, 502.5, 504.0])
+    assert nearest_index(axis, 501.4) == 1
+    assert nearest_index(axis, 501.75) == 1  # halfway resolves low
+    np.testing.assert_array_equal(nearest_index(axis, [0, 503.5, 1e3]), [0, 3, 3])
+    np.testing.assert_array_equal(nearest_index(axis[::-1], [0, 501.4]), [3, 2])
+    assert nearest_index([7.0], 3.0) == 0
+
+
+def test_scan_grid_from_wip(wip_pair):
+    grid = ScanGrid.from_wip(wip_pair.with_suffix(".WIP"))
+    assert grid.shape == (3, 4) and grid.unit == "m"
+    np.testing.assert_allclose(grid.x, [0, 5e-6, 10e-6, 15e-6])
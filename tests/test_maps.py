@@ -0,0 +1,36 @@
+import numpy as np
+
+from witec.maps import BandMap, band_maps
+
+
+def _cube():
+    rng = np.random.default_rng(0)
+    axis = np.linspace(600.0, 700.0, 51)
+    cube = rng.integers(0, 1000, size=(4, 5, len(axis)))
+    return cube, axis
+
+
+def test_band_map_matches_direct_sum():
+    cube, axis = _cube()
+    keep = (axis >= 620) & (axis <= 651)
+    assert np.array_equal(BandMap(cube, axis).image(620, 651), cube[..., keep].sum(-1))
+
+
+def test_band_map_accepts_reversed_window():
+    cube, axis = _cube()
+    bands = BandMap(cube, axis)
+    assert np.array_equal(bands.image(651, 620), bands.image(620, 651))
+
+
+def test_band_map_descending_axis():
+    cube, axis = _cube()
+    keep = (axis >= 620) & (axis <= 651)
+    image = BandMap(cube[..., ::-1], axis[::-1]).image(620, 651)
+    assert np.array_equal(image, cube[..., keep].sum(-1))
+
+
+def test_band_maps_stacks_windows():
+    cube, axis = _cube()
+    images = band_maps(cube, axis, [(600, 700), (640, 660)])
+    assert images.shape == (2, 4, 5)
+    assert np.array_equal(images[0], cube.sum(-1))
@@ -0,0 +1,41 @@
+from witec.project import Witec, bulk_info_streams, info_streams
+from witec.utils import metadata_from_wip, metadata_from_wips
+from tests.conftest import INFO_RTF, write_wip
+
+
+def test_info_streams_matches_full_extraction(wip_pair):
+    wip = wip_pair.with_suffix(".WIP")
+    assert info_streams(wip) == {"Data 1": Witec(wip).info()}
+
+
+def test_info_streams_reads_every_data_object(tmp_path):
+    notes = b"{\\rtf1\\ansi Sample notes:\\tab flake 3\\par }"
+    wip = write_wip(
+        tmp_path / "project.WIP",
+        {"Data 1": INFO_RTF, "Data 2": bytes(2**20), "Data 3": notes},
+    )
+    streams = info_streams(wip)
+    assert list(streams) == ["Data 1", "Data 3"]
+    assert streams["Data 3"] == "Sample notes:\tflake 3\n"
+    metadata = metadata_from_wip(wip)
+    assert metadata["Data 1"]["Points per Line"] == "4"
+    assert metadata["Data 3"] == {"Information": "Sample notes:flake 3"}
+
+
+def test_bulk_info_streams_matches_info_streams(tmp_path):
+    notes = b"{\\rtf1\\ansi Sample notes:\\tab flake 3\\par }"
+    projects = [
+        write_wip(tmp_path / f"project{i}.WIP", {f"Data {j}": notes for j in range(i)})
+        for i in range(1, 4)
+    ]
+    projects.append(write_wip(tmp_path / "info.WIP", {"Data 1": INFO_RTF}))
+    broken = tmp_path / "broken.WIP"
+    broken.write_bytes(b"WIT_PR06" + bytes(10))
+    malformed = write_wip(tmp_path / "malformed.WIP", {"Data 1": b"{\\rtf1 x}}"})
+
+    for processes in (1, 2):
+        streams = bulk_info_streams(projects + [broken, malformed], processes)
+        assert streams == {wip: info_streams(wip) for wip in projects}
+    empty = write_wip(tmp_path / "empty.WIP", {"Data 1": b"{\\rtf1 }"})
+    metadata = metadata_from_wips(projects[-1:] + [empty], processes=1)
+    assert metadata == {projects[-1]: metadata_from_wip(projects[-1])}
@@ -0,0 +1,60 @@
+import os
+
+import numpy as np
+import pytest
+
+from witec.pyramid import TilePyramid, pool, sidecar_path
+from tests.conftest import write_spe
+
+
+def test_pool_handles_odd_edges():
+    image = np.arange(15).reshape(3, 5)
+    np.testing.assert_allclose(pool(image, "mean"), [[3, 5, 6.5], [10.5, 12.5, 14]])
+    np.testing.assert_array_equal(pool(image, "max"), [[6, 8, 9], [11, 13, 14]])
+    with pytest.raises(ValueError):
+        pool(image, "median")
+
+
+def test_tile_pyramid_levels_and_cache(tmp_path):
+    rng = np.random.default_rng(1)
+    frames = rng.integers(0, 2000, size=(35, 1, 20))
+    spe = write_spe(tmp_path / "sample_loc_id_map_20230615-1324_1.SPE", frames)
+    # Pixels lie at 650.1, 650.2, ..., so the window holds pixels 4 to 8
+    image = frames[:, 0, 4:9].sum(axis=1).reshape(5, 7)
+
+    with TilePyramid(spe, points_per_line=7, tile=2) as pyramid:
+        means = pyramid.levels(650.45, 650.95)
+        assert [level.shape for level in means] == [(5, 7), (3, 4), (2, 2)]
+        np.testing.assert_array_equal(means[0][()], image)
+        np.testing.assert_allclose(means[1][()], pool(image, "mean"))
+        maxima = pyramid.levels(650.95, 650.45, "max")
+        np.testing.assert_array_equal(maxima[2][()], pool(pool(image, "max"), "max"))
+        assert pyramid.level_for(650.45, 650.95, 4) == 1
+        np.testing.assert_allclose(pyramid.overview(650.45, 650.95, 3), means[2][()])
+        np.testing.assert_array_equal(
+            pyramid.region(650.45, 650.95, 0, slice(1, 3), slice(4, 7)), image[1:3, 4:7]
+        )
+    assert sidecar_path(spe).exists()
+
+    with TilePyramid(spe, points_per_line=7, tile=2) as pyramid:
+        assert "650.45-650.95" in pyramid.h5
+    stat = spe.stat()
+    os.utime(spe, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    with TilePyramid(spe, points_per_line=7, tile=2) as pyramid:
+        assert "650.45-650.95" not in pyramid.h5
+
+
+def test_tile_pyramid_keeps_close_windows_apart(tmp_path):
+    frames = np.arange(6 * 1 * 20).reshape(6, 1, 20)
+    spe = write_spe(tmp_path / "sample_loc_id_map_20230615-1324_1.SPE", frames)
+    with TilePyramid(spe, points_per_line=3, tile=2) as pyramid:
+        # Both round to 650.3 but only the first includes the pixel at 650.3
+        wide = pyramid.levels(650.2999, 650.45)[0][()]
+        narrow = pyramid.levels(650.3001, 650.45)[0][()]
+    np.testing.assert_array_equal(wide, frames[:, 0, 2:4].sum(axis=1).reshape(2, 3))
+    np.testing.assert_array_equal(narrow, frames[:, 0, 3].reshape(2, 3))
+
+
+def test_tile_pyramid_reads_geometry_from_wip(tmp_path, wip_pair):
+    with TilePyramid(wip_pair.with_suffix(".SPE")) as pyramid:
+        assert pyramid.levels(650, 652)[0].shape == (3, 4)
@@ -0,0 +1,89 @@
+import h5py
+import numpy as np
+import pytest
+
+from witec.cube import Cube, spe_frames
+from witec.grid import ScanGrid
+from witec.scan import ScanFrames, scan_view
+from witec.spe import SPE
+from witec.winspec import Header, SpeFile
+from tests.conftest import write_spe
+
+
+def _serpentine(frames, points_per_line):
+    lines = frames.reshape(-1, points_per_line, *frames.shape[1:]).copy()
+    lines[1::2] = lines[1::2, ::-1]
+    return lines
+
+
+def test_scan_view_raster_is_a_view(spe_map):
+    path, _ = spe_map
+    spe = SpeFile(path)
+    for mmap in (False, True):
+        cube = spe.cube(4, mmap=mmap)
+        assert isinstance(cube, np.ndarray) and cube.shape == (3, 4, 20, 1)
+        assert np.shares_memory(cube, spe.data) != mmap
+        np.testing.assert_array_equal(cube, spe.data.reshape(3, 4, 20, 1))
+    assert SPE(str(path)).cube(4, lines=2).shape == (2, 4, 20, 1)
+    with pytest.raises(ValueError):
+        spe.cube(4, lines=4)
+
+
+def test_scan_view_serpentine(spe_map):
+    path, _ = spe_map
+    spe = SpeFile(path)
+    expected = _serpentine(spe.data, 4)
+    cube = spe.cube(4, serpentine=True, mmap=True)
+    assert isinstance(cube, ScanFrames) and cube.shape == expected.shape
+    np.testing.assert_array_equal(np.asarray(cube), expected)
+    np.testing.assert_array_equal(cube[1], expected[1])
+    np.testing.assert_array_equal(cube[1:, 2], expected[1:, 2])
+    np.testing.assert_array_equal(
+        cube[:, [3, 0], 5:9, 0], expected[:, [3, 0]][..., 5:9, 0]
+    )
+    assert cube[1, 0, 7, 0] == expected[1, 0, 7, 0]
+
+    grid = ScanGrid(4, 3, serpentine=True)
+    frame = grid.index(1, 1)
+    assert frame == 6 and grid.position(frame) == (1, 1)
+    np.testing.assert_array_equal(grid.indices[4:8], [[3, 1], [2, 1], [1, 1], [0, 1]])
+
+    spectra = Cube.from_spe(path, points_per_line=4, serpentine=True)
+    np.testing.assert_array_equal(spectra.compute(), expected.sum(axis=3))
+
+
+def test_scan_view_of_hdf5_frames(tmp_path):
+    frames = np.arange(7 * 2 * 3).reshape(7, 2, 3)
+    with h5py.File(tmp_path / "frames.hdf5", "w") as h5:
+        h5["data"] = frames
+        cube = scan_view(h5["data"], points_per_line=3, serpentine=True)
+        assert cube.shape == (2, 3, 2, 3)
+        np.testing.assert_array_equal(
+            cube[:, :, 1], _serpentine(frames[:6], 3)[:, :, 1]
+        )
+        raster = scan_view(h5["data"], points_per_line=3)
+        np.testing.assert_array_equal(raster[1, ::2], frames[[3, 5]])
+
+
+def test_scan_frames_expands_ellipsis_like_numpy():
+    frames = np.arange(6 * 4).reshape(6, 4)
+    cube = scan_view(frames, 3, serpentine=True)
+    expected = _serpentine(frames, 3)
+    for key in [(..., 0), (1, ...), (..., 2, 1), (0, ..., slice(1, 3)), ...]:
+        np.testing.assert_array_equal(cube[key], expected[key])
+    for key in [(None, 0), (..., ...), (0, 0, 0, 0)]:
+        with pytest.raises(IndexError):
+            cube[key]
+
+
+def test_memory_maps_share_the_orientation_of_data(tmp_path):
+    path = write_spe(tmp_path / "reversed.SPE", np.arange(6 * 2 * 5).reshape(6, 2, 5))
+    raw = bytearray(path.read_bytes())
+    field = Header.geometric
+    raw[field.offset : field.offset + field.size] = (2).to_bytes(field.size, "little")
+    path.write_bytes(raw)
+    spe = SpeFile(path)
+    assert spe.reversed
+    np.testing.assert_array_equal(spe.cube(3, mmap=True), spe.cube(3))
+    _, frames = spe_frames(path)
+    np.testing.assert_array_equal(frames.transpose(0, 2, 1), spe.data)
@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from tests.conftest import write_spe
+from witec.search import BallTree, SpectrumIndex, normalize
+
+
+def _correlations(data, spectrum):
+    spectra = data.reshape(-1, data.shape[-1])
+    return np.array([np.corrcoef(row, spectrum)[0, 1] for row in spectra])
+
+
+def test_ball_tree_matches_brute_force():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((500, 6))
+    tree = BallTree(vectors, leaf_size=8)
+    assert sorted(tree.order) == list(range(500))
+    for vector in rng.standard_normal((10, 6)):
+        distances = np.linalg.norm(vectors - vector, axis=1)
+        rows, found = tree.query(vector, k=7)
+        np.testing.assert_array_equal(rows, np.argsort(distances)[:7])
+        np.testing.assert_allclose(found, np.sort(distances)[:7])
+        rows, found = tree.query_radius(vector, 2.0)
+        np.testing.assert_array_equal(rows, np.argsort(distances)[: len(rows)])
+        assert len(rows) == np.sum(distances <= 2.0)
+
+
+def test_query_returns_most_correlated_spectra():
+    rng = np.random.default_rng(1)
+    data = rng.random((8, 9, 30))
+    index = SpectrumIndex.from_cube(data, n_components=None, name="map")
+    spectrum = data[3, 4] + 0.1 * rng.random(30)
+    correlations = _correlations(data, spectrum)
+    hits = index.query(spectrum, k=5)
+    best = np.argsort(correlations)[::-1][:5]
+    assert [(hit.line, hit.point) for hit in hits] == [divmod(i, 9) for i in best]
+    assert hits[0].file == "map"
+    np.testing.assert_allclose(
+        [hit.correlation for hit in hits], correlations[best], rtol=1e-5
+    )
+    within = index.within(spectrum, correlation=correlations[best[2]] - 1e-6)
+    assert [(hit.line, hit.point) for hit in within] == [
+        (hit.line, hit.point) for hit in hits[:3]
+    ]
+
+
+def test_reduced_index_finds_same_band():
+    axis = np.linspace(600, 700, 60)
+    bands = np.exp(-((axis[None] - [[620], [650], [680]]) ** 2) / 20)
+    labels = np.arange(36).reshape(6, 6) % 3
+    rng = np.random.default_rng(2)
+    data = 100 * bands[labels] + rng.random((6, 6, 60))
+    index = SpectrumIndex.from_cube(data, n_components=4)
+    assert index.vectors.shape == (36, 4)
+    hits = index.similar_to(2, 1, k=12)
+    assert (hits[0].line, hits[0].point) == (2, 1)
+    assert {labels[hit.line, hit.point] for hit in hits} == {labels[2, 1]}
+    assert min(hit.correlation for hit in hits) > 0.9
+
+
+def test_index_spans_spe_files(tmp_path, spe_map):
+    path, frames = spe_map
+    other = write_spe(tmp_path / "other.SPE", frames[::-1])
+    index = SpectrumIndex.from_spe([path, other], points_per_line=4, n_components=3)
+    assert len(index) == 24
+    hits = index.query(frames[0, 0], k=2)
+    assert {(hit.file, hit.line, hit.point) for hit in hits} == {
+        (str(path), 0, 0),
+        (str(other), 2, 3),
+    }
+    with pytest.raises(ValueError):
+        index.similar_to(0, 0)
+
+    index.save(tmp_path / "archive.npz")
+    loaded = SpectrumIndex.load(tmp_path / "archive.npz")
+    assert loaded.files == index.files
+    assert loaded.query(frames[0, 0], k=2) == hits
+
+
+@pytest.mark.parametrize("n_components", [None, 3])
+def test_flat_spectra_are_left_out(n_components):
+    rng = np.random.default_rng(3)
+    data = rng.random((4, 5, 12))
+    data[1, 2] = 0
+    data[3, 0] = 0.1
+    index = SpectrumIndex.from_cube(data, n_components=n_components)
+    assert len(index) == 18
+    hits = index.query(rng.random(12), k=18)
+    assert {(1, 2), (3, 0)}.isdisjoint((hit.line, hit.point) for hit in hits)
+    with pytest.raises(ValueError):
+        index.query(np.full(12, 7.0))
+    with pytest.raises(KeyError):
+        index.similar_to(1, 2)
+
+
+def test_normalize_leaves_flat_spectra_at_zero():
+    spectra = normalize([[1.0, 2.0, 3.0], [5.0, 5.0, 5.0]])
+    np.testing.assert_allclose(np.linalg.norm(spectra, axis=1), [1, 0])
+    # The mean of these is not exact, but they are still flat
+    assert not normalize(np.full(1340, 1234.567)).any()
+    np.testing.assert_allclose(spectra.sum(axis=1), 0, atol=1e-12)
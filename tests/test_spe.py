@@ -0,0 +1,47 @@
+from datetime import date
+
+import numpy as np
+
+from witec.convert import convert
+from witec.fitting import fit_map, lorentzian
+from witec.maps import BandMap
+from witec.spe import SPE, HDF5SPE
+from witec.winspec import SpeFile
+from tests.conftest import write_spe
+
+
+def test_hdf5_backend_matches_spe_file(tmp_path):
+    frames = np.arange(6 * 2 * 5).reshape(6, 2, 5)
+    spe = write_spe(tmp_path / "sample_loc_id_map_20230615-1324_1.SPE", frames)
+    expected = SpeFile(spe)
+    with SPE(convert(spe)) as archived:
+        assert isinstance(archived, HDF5SPE)
+        assert archived.data.shape == expected.data.shape
+        assert np.array_equal(archived.data[2:4], expected.data[2:4])
+        assert np.array_equal(archived.spectra[3], expected.data[3].sum(axis=1))
+        assert np.array_equal(np.asarray(archived.spectra), SPE(spe).spectra)
+        assert np.allclose(archived.axis, expected.xaxis)
+        assert archived.date == date(1999, 12, 31)
+        assert archived.exposure == 0.5
+        assert archived.header["xcalibration"]["polynom_coeff"][:2] == [650.0, 0.1]
+        assert archived.metadata["Experiment"]["meas-type"] == "map"
+
+
+def test_hdf5_spectra_reshape_for_fit_map_and_band_map(tmp_path):
+    lines, points_per_line = 3, 4
+    # The calibration polynomial counts pixels from 1
+    x = 650 + 0.1 * np.arange(1, 201)
+    centers = np.linspace(659, 661, lines * points_per_line)
+    frames = 100 + lorentzian(x, 1000, centers[:, None], 2.0)[:, None]
+    spe = write_spe(tmp_path / "sample_loc_id_map_20230615-1324_1.SPE", frames, 0)
+    expected = SPE(spe).spectra.reshape(lines, points_per_line, -1)
+    with SPE(convert(spe)) as archived:
+        spectra = archived.spectra.reshape(lines, points_per_line, -1)
+        assert isinstance(spectra, np.ndarray)
+        assert np.array_equal(spectra, expected)
+        assert np.allclose(archived.axis, x)
+        maps = fit_map(spectra, archived.axis, centers=[660], processes=1)
+        bands = BandMap(spectra, archived.axis)
+    assert maps["success"].all()
+    assert np.allclose(maps["center_0"], centers.reshape(lines, -1), atol=1e-3)
+    assert np.allclose(bands.image(655, 665), BandMap(expected, x).image(655, 665))
@@ -0,0 +1,52 @@
+import pytest
+
+from witec.text_tools import striprtf
+from tests.conftest import INFO_RTF
+
+# RTF snippets and the text the original character-by-character striprtf
+# produced for them
+CORPUS = [
+    (
+        INFO_RTF,
+        "Spectrum Information\nIntegration Time:\t0.5 s\nPoints per Line:\t4\n"
+        "Lines per Image:\t3\nScan Width [µm]:\t20.000\n\x00",
+    ),
+    (
+        b"{\\rtf1\\uc1 Temp 4\\u8451?, \\uc2\\u-3913\\'a1\\'a2x {\\uc0\\u945}b}",
+        "Temp 4℃, \uf0b7x αb",
+    ),
+    (b"{\\rtf1\\uc3\\u8364 ab\r\ncdef}", "€def"),
+    (b"{\\rtf1 \\'c5ngstr\\'f6m \\'b5m}", "Ångström µm"),
+    (
+        b"{\\rtf1{\\fonttbl{\\f0\\fswiss Arial;}}{\\*\\generator Riched20;}"
+        b"{\\info{\\author x}}Text}",
+        "Text",
+    ),
+    (
+        b"{\\rtf1 Before{\\pict\\pngblip\\picw10 "
+        + b"89504e470d0a1a0a" * 64
+        + b"}After}",
+        "BeforeAfter",
+    ),
+    (
+        b"{\\rtf1\\trowd\\cellx100\\cellx200\\intbl Laser\\cell 532 nm\\cell\\row\n"
+        b"\\trowd\\intbl Power\\cell 1.5\\cell\\row}",
+        "Laser532 nmPower1.5",
+    ),
+    (
+        b"{\\rtf1 a\\tab b\\line c\\emdash d\\~e\\{f\\}g\\\\h"
+        b"\\ldblquote q\\rdblquote\\bullet\\sect}",
+        "a\tb\nc—d\xa0e{f}g\\h\x81Cq”•\n\n",
+    ),
+    ("{\\rtf1 Probe µm\\par café}".encode(), "Probe µm\ncafé"),
+]
+
+
+@pytest.mark.parametrize("rtf, text", CORPUS)
+def test_striprtf_corpus(rtf, text):
+    assert striprtf(rtf) == text
+
+
+def test_striprtf_skips_embedded_picture_in_bulk():
+    picture = b"{\\pict\\pngblip " + b"89504e470d0a1a0a" * 2**16 + b"}"
+    assert striprtf(b"{\\rtf1 Map" + picture + b"\\par}") == "Map\n"
@@ -1,11 +1,23 @@
 import numbers
+import os
+
+import pandas as pd
+import pytest
 
 from witec.utils import (
+    assemble_directory,
+    export_metadata,
+    typed_metadata,
+    flatten_metadata,
     metadata_from_name,
+    metadata_from_names,
     metadata_from_spe,
     metadata_from_wip,
     metadata_from_yaml,
+    merged_yaml,
+    parse_wip_text,
     assemble_metadata,
+    unflatten_metadata,
 )
 
 # Directory Tests
@@ -410,3 +422,180 @@ def test_metadata_from_name_file_includes_double_underscores():
     )
     metadata = metadata_from_name(filename_with_double_underscores)
     assert metadata["datetime"] == "1999-12-31T00:00:00-06:00"
+
+
+# Bulk parsing tests
+
+
+def _strptime_reference(s_date):
+    """The original per-call strptime loop over conventions/dates.yaml."""
+    import pathlib
+    from datetime import datetime
+
+    import yaml
+
+    import witec.utils
+
+    dates = pathlib.Path(witec.utils.__file__).parent / "conventions/dates.yaml"
+    with open(dates, "r", encoding="utf-8") as stream:
+        date_patterns = yaml.safe_load(stream)
+    for pattern in date_patterns:
+        try:
+            date = datetime.strptime(s_date, pattern).replace(microsecond=0)
+            if date.utcoffset():
+                return date.isoformat()
+            return date.astimezone().isoformat()
+        except ValueError:
+            pass
+
+
+def test_metadata_from_name_datetime_matches_strptime():
+    datestrings = [
+        "19991231",
+        "1999-12-31",
+        "19991231-0723",
+        "1999-12-31T07:23",
+        "19991231-072346-05:00",
+        "1999-12-31 07:23:46+05:00",
+        "1999-12-31T072346+0530",
+        "20230615T212839Z",
+        "20230615-1328+00:00",
+        "1999-7-4-7-5",
+        "19990230",
+        "2023-11-05-01-30",
+        "2023-03-12-02-30",
+        "1999-12-31-07:23:46-0500",
+        "notadate",
+    ]
+    for datestring in datestrings:
+        filename = f"sample_loc_id_meas-type_{datestring}_measurement-number.ext"
+        metadata = metadata_from_name(filename)
+        assert metadata["datetime"] == _strptime_reference(datestring), datestring
+
+
+def test_metadata_from_names_matches_metadata_from_name():
+    filenames = [
+        "hBN-10_loc1A_flake01_conf-r_532nm_080mW_f-ND10A_obj-50x_20230615-1324_1.SPE",
+        "Si-pillars_loc2B-2-7_nozzle_exts-r_405nm_obj-50x_20230527-1712_2.WIP",
+        "sample_loc_id_meas-type_LED-UV_genericfield_1999-12-31_measurement-number",
+        "nested/directory/sample_loc_id_meas-type_0s_19991231-072346+05:00_3.ext",
+    ]
+    assert metadata_from_names(filenames) == [
+        metadata_from_name(filename) for filename in filenames
+    ]
+
+
+def test_metadata_from_name_accepts_path_objects(tmp_path):
+    filename = tmp_path / "sample_loc_id_meas-type_19991231_measurement-number.ext"
+    metadata = metadata_from_name(filename)
+    assert metadata["measurement number"] == "measurement-number"
+
+
+# Directory tests
+
+
+def test_flatten_metadata_expands_nested_values():
+    metadata = {"WIP": {"Data 1": {"Information": "text"}}, "User": [{"Name": "A"}]}
+    assert flatten_metadata(metadata) == {
+        "WIP.Data 1.Information": "text",
+        "User.0.Name": "A",
+    }
+    assert unflatten_metadata(flatten_metadata(metadata)) == metadata
+
+
+def test_assemble_directory_has_one_row_per_pair(wip_pair, monkeypatch):
+    (wip_pair.parent / "unpaired.SPE").write_bytes(b"")
+    # A single process runs in-process, without starting a pool
+    monkeypatch.setattr("witec.utils.ProcessPoolExecutor", None)
+    metadata = assemble_directory(wip_pair.parent, processes=1)
+    assert metadata["basename"].tolist() == [str(wip_pair)]
+    assert metadata.loc[0, "Experiment.sample"] == "sample"
+    assert metadata.loc[0, "WIP.Data 1.Integration Time"] == "0.5 s"
+    assert metadata.loc[0, "SPE.xdim"] == 20
+
+
+# WIP tests
+
+
+def test_parse_wip_text_keeps_string_fields():
+    text = "Spectrum Information\nIntegration Time:\t0.5 s\nStart Time: 13:24:05\n"
+    assert parse_wip_text(text + "Notes:\t\n") == {
+        "Information": "Spectrum Information",
+        "Integration Time": "0.5 s",
+        "Start Time": " 13:24:05",
+    }
+    with pytest.raises(ValueError):
+        parse_wip_text("")
+
+
+# YAML Tests
+
+
+def test_metadata_from_yaml_is_cached_until_modified(tmp_path):
+    settings = tmp_path / "settings.yaml"
+    settings.write_text("User:\n  - Name: A\n")
+    first = metadata_from_yaml(settings)
+    first["User"][0]["Name"] = "changed"
+    assert metadata_from_yaml(settings) == {"User": [{"Name": "A"}]}
+    stat = settings.stat()
+    settings.write_text("User:\n  - Name: B\n")
+    os.utime(settings, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert metadata_from_yaml(settings) == {"User": [{"Name": "B"}]}
+
+
+def test_merged_yaml_is_immutable_and_last_file_wins(tmp_path):
+    first = tmp_path / "first.yaml"
+    first.write_text("User: A\nSample: MoS2\n")
+    second = tmp_path / "second.yaml"
+    second.write_text("User: B\n")
+    merged = merged_yaml(first, second)
+    assert dict(merged) == {"User": "B", "Sample": "MoS2"}
+    assert merged_yaml(first, second) is merged
+    with pytest.raises(TypeError):
+        merged["User"] = "C"
+
+
+# Export Tests
+
+
+def test_export_metadata_parquet_has_typed_columns(wip_pair, tmp_path):
+    metadata = assemble_directory(wip_pair.parent, processes=1)
+    export_metadata(metadata, tmp_path / "metadata.parquet")
+    frame = pd.read_parquet(tmp_path / "metadata.parquet")
+    assert frame["SPE.exp_sec"].dtype == "float64"
+    assert frame["SPE.DetTemperature"].tolist() == [-70.0]
+    assert frame["SPE.date"][0] == pd.Timestamp("1999-12-31", tz="UTC")
+    assert frame["Experiment.datetime"].dt.tz is not None
+    assert "SPE.xcalibration.polynom_coeff.1" in frame
+    assert "SPE.ROIinfblk.0.startx" in frame
+
+
+def test_typed_metadata_keeps_dates_in_other_formats():
+    metadata = [
+        {"SPE": {"date": "31Dec1999"}, "User": {"date": "Dec 31, 1999"}},
+        {"SPE": {"date": "01Jan2000"}, "User": {"date": "2000/01/01"}},
+    ]
+    frame = typed_metadata(metadata)
+    assert frame["SPE.date"].tolist() == [
+        pd.Timestamp("1999-12-31", tz="UTC"),
+        pd.Timestamp("2000-01-01", tz="UTC"),
+    ]
+    assert frame["User.date"].tolist() == ["Dec 31, 1999", "2000/01/01"]
+    frame = typed_metadata([{"SPE": {"date": "31Dec1999", "exp_sec": "n/a"}}, {}])
+    assert frame["SPE.date"].tolist()[0] == pd.Timestamp("1999-12-31", tz="UTC")
+    assert frame["SPE.exp_sec"].tolist()[0] == "n/a"
+    bad = typed_metadata([{"SPE": {"date": "sometime in 1999"}}])
+    assert bad["SPE.date"].tolist() == ["sometime in 1999"]
+
+
+def test_export_metadata_from_headers_to_csv(spe_map, tmp_path):
+    spe, _ = spe_map
+    header = metadata_from_spe(spe)
+    frame = export_metadata([header, header], tmp_path / "headers.csv")
+    assert len(frame) == 2
+    assert pd.read_csv(tmp_path / "headers.csv")["SpecCenterWlNm"].tolist() == [
+        700.0,
+        700.0,
+    ]
+    with pytest.raises(ValueError):
+        export_metadata(header, tmp_path / "headers.json")
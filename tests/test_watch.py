@@ -0,0 +1,29 @@
+import numpy as np
+
+from witec.watch import Watcher
+from tests.conftest import INFO_RTF, write_spe, write_wip
+
+
+def test_watcher_waits_for_files_to_settle(tmp_path):
+    calls = []
+    watcher = Watcher(tmp_path, callback=lambda *args: calls.append(args), settle=1)
+    basename = tmp_path / "sample_loc_id_map_20230615-1324_1"
+    spe = basename.with_suffix(".SPE")
+    write_spe(spe, np.zeros((2, 1, 8)))
+    watcher.poll()
+    with open(spe, "ab") as stream:
+        stream.write(bytes(16))  # the instrument is still writing
+    watcher.poll()
+    write_wip(basename.with_suffix(".WIP"), {"Data 1": INFO_RTF})
+    watcher.poll()
+    assert calls == []
+    watcher.poll()
+    assert calls == [(str(basename), [".SPE", ".WIP"])]
+    watcher.poll()
+    assert len(calls) == 1
+
+
+def test_watcher_ignores_existing_files_by_default(wip_pair):
+    assert Watcher(wip_pair.parent, settle=0).poll() == {}
+    metadata = Watcher(wip_pair.parent, settle=0, existing=True).poll()
+    assert metadata[str(wip_pair)]["Experiment"]["sample"] == "sample"
@@ -0,0 +1,57 @@
+from witec.project import info_streams
+import witec.wip_info
+from witec.wip_info import parse_info, typed_info, typed_value
+
+
+def test_parse_info_types_values(wip_pair):
+    text = info_streams(wip_pair.with_suffix(".WIP"))["Data 1"]
+    assert parse_info(text) == {
+        "Information": "Spectrum Information",
+        "Integration Time (s)": 0.5,
+        "Points per Line": 4,
+        "Lines per Image": 3,
+        "Scan Width (m)": 2e-05,
+    }
+
+
+def test_typed_info_units_dates_and_coordinates():
+    info = typed_info(
+        {
+            "Start Date": "Thursday, June 15, 2023",
+            "Start Time": "1:24:07 PM",
+            "Excitation Wavelength [nm]": "532.123",
+            "Sample Location X [µm]": "-123.4",
+            "Position": "(1.5, -2, 3e1) µm",
+            "Gamma [°]": "0.000",
+            "Grating": "600 g/mm BLZ=500nm",
+            "Objective": "Zeiss 100x",
+        }
+    )
+    assert info == {
+        "Start Date": "2023-06-15",
+        "Start Time": "13:24:07",
+        "Start Datetime": "2023-06-15T13:24:07",
+        "Excitation Wavelength (m)": 5.32123e-07,
+        "Sample Location X (m)": -0.0001234,
+        "Position (m)": (1.5e-06, -2e-06, 3e-05),
+        "Gamma (°)": 0.0,
+        "Grating": "600 g/mm BLZ=500nm",
+        "Objective": "Zeiss 100x",
+    }
+
+
+def test_parse_info_caches_by_content(monkeypatch):
+    text = "Spectrum Information\nIntegration Time:\t2 ms\n"
+    first = parse_info(text)
+    monkeypatch.setattr(witec.wip_info, "typed_info", None)
+    assert (
+        parse_info(str(text))
+        == first
+        == {
+            "Information": "Spectrum Information",
+            "Integration Time (s)": 0.002,
+        }
+    )
+    first["Integration Time (s)"] = 0
+    assert parse_info(text)["Integration Time (s)"] == 0.002
+    assert typed_value("Lines per Image", " 12") == ("Lines per Image", 12)
@@ -0,0 +1,246 @@
+"""Command line interface to the witec tools.
+
+    $ python -m witec convert data/sample_loc_id_map_20230615-1324_1.SPE
+    $ python -m witec convert data/*.WIP -o converted --yaml settings/user.yaml
+    $ python -m witec batch data -o converted --processes 8
+    $ python -m witec watch data --convert -o converted
+    $ python -m witec rechunk converted/*.hdf5 --access images
+    $ python -m witec follow data/sample_loc_id_map_20230615-1324_1.SPE
+    $ python -m witec dedupe data --action hardlink
+
+Run `python -m witec <command> --help` for the options of each command.
+"""
+
+import argparse
+import logging
+import pathlib
+import sys
+
+from witec.convert import convert, convert_directory, rechunk
+from witec.dedupe import MANIFEST, dedupe, rsync_excludes
+from witec.follow import SpeFollower
+from witec.watch import Watcher
+
+log = logging.getLogger("witec")
+
+
+def _output_path(basename, output):
+    """Place the converted file in `output` if it names a directory."""
+    if output is None:
+        return None
+    return pathlib.Path(output, pathlib.Path(basename).with_suffix(".hdf5").name)
+
+
+def _compression(args):
+    if args.compression == "none":
+        return {"compression": None}
+    return {"compression": args.compression, "compression_opts": args.level}
+
+
+def _conversion(args):
+    return {"access": args.access, **_compression(args)}
+
+
+def _convert(args):
+    basenames = dict.fromkeys(
+        (
+            pathlib.Path(path).with_suffix("")
+            if pathlib.Path(path).suffix.upper() in (".SPE", ".WIP")
+            else pathlib.Path(path)
+        )
+        for path in args.paths
+    )
+    if args.output is not None:
+        pathlib.Path(args.output).mkdir(parents=True, exist_ok=True)
+    failed = 0
+    for basename in basenames:
+        try:
+            convert(
+                basename,
+                _output_path(basename, args.output),
+                args.yaml,
+                **_conversion(args),
+            )
+        except Exception as error:  # pylint: disable=broad-except
+            log.error("Could not convert %s: %s", basename, error)
+            failed += 1
+    return 1 if failed else 0
+
+
+def _batch(args):
+    summary = convert_directory(
+        args.directory,
+        args.output,
+        args.yaml,
+        processes=args.processes,
+        **_conversion(args),
+    )
+    log.info("Batch conversion finished: %s", summary)
+    return 1 if summary["failed"] else 0
+
+
+def _rechunk(args):
+    for filename in args.files:
+        rechunk(filename, args.access, **_compression(args))
+    return 0
+
+
+def _follow(args):
+    follower = SpeFollower(
+        args.file,
+        args.output,
+        args.points_per_line,
+        **_compression(args),
+    )
+    follower.run(interval=args.interval, idle=args.idle)
+    return 0
+
+
+def _dedupe(args):
+    groups = dedupe(args.directory, args.action, processes=args.processes)
+    for kept, *copies in groups:
+        print(kept)
+        for copy in copies:
+            print(f"  {copy}")
+    if args.excludes is not None:
+        manifest = pathlib.Path(args.directory, MANIFEST)
+        patterns = rsync_excludes(manifest, args.directory)
+        pathlib.Path(args.excludes).write_text(
+            "".join(pattern + "\n" for pattern in patterns), encoding="utf-8"
+        )
+    return 0
+
+
+def _watch(args):
+    callback = None
+    if args.convert:
+        if args.output is not None:
+            pathlib.Path(args.output).mkdir(parents=True, exist_ok=True)
+
+        def callback(basename, suffixes):
+            if set(suffixes) != {".SPE", ".WIP"}:
+                log.info("Waiting for the rest of %s", basename)
+                return None
+            return convert(
+                basename,
+                _output_path(basename, args.output),
+                args.yaml,
+                **_conversion(args),
+            )
+
+    watcher = Watcher(
+        args.directory,
+        callback=callback,
+        interval=args.interval,
+        settle=args.settle,
+        existing=args.existing,
+    )
+    watcher.run()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m witec", description=__doc__)
+    parser.add_argument("-v", "--verbose", action="store_true", help="log details")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_conversion_options(command):
+        command.add_argument("-o", "--output", help="directory for .hdf5 files")
+        command.add_argument(
+            "--yaml",
+            action="append",
+            default=[],
+            help="supplemental yaml file, may be repeated",
+        )
+        add_storage_options(command)
+
+    def add_storage_options(command):
+        command.add_argument(
+            "--compression", choices=["gzip", "lzf", "none"], default="gzip"
+        )
+        command.add_argument("--level", type=int, default=1, help="gzip level")
+        command.add_argument(
+            "--access",
+            choices=["balanced", "spectra", "images"],
+            default="balanced",
+            help="expected reads of the frames, used to choose chunk shapes",
+        )
+
+    convert_parser = commands.add_parser(
+        "convert", help="convert WIP/SPE pairs to HDF5"
+    )
+    convert_parser.add_argument(
+        "paths", nargs="+", help=".SPE/.WIP files or their shared basenames"
+    )
+    add_conversion_options(convert_parser)
+    convert_parser.set_defaults(func=_convert)
+
+    batch_parser = commands.add_parser(
+        "batch", help="convert every pair of a directory tree, resumably"
+    )
+    batch_parser.add_argument("directory", help="directory tree to convert")
+    batch_parser.add_argument("-j", "--processes", type=int, help="worker processes")
+    add_conversion_options(batch_parser)
+    batch_parser.set_defaults(func=_batch)
+
+    rechunk_parser = commands.add_parser(
+        "rechunk", help="rewrite converted frames for a new access pattern"
+    )
+    rechunk_parser.add_argument("files", nargs="+", help="converted .hdf5 files")
+    add_storage_options(rechunk_parser)
+    rechunk_parser.set_defaults(func=_rechunk)
+
+    follow_parser = commands.add_parser(
+        "follow", help="mirror a growing .SPE file into HDF5 during acquisition"
+    )
+    follow_parser.add_argument("file", help=".SPE file being acquired")
+    follow_parser.add_argument("-o", "--output", help="HDF5 file to write")
+    follow_parser.add_argument("--points-per-line", type=int)
+    follow_parser.add_argument("--interval", type=float, default=1.0)
+    follow_parser.add_argument(
+        "--idle", type=int, default=60, help="polls without new frames before exit"
+    )
+    follow_parser.add_argument(
+        "--compression", choices=["gzip", "lzf", "none"], default="gzip"
+    )
+    follow_parser.add_argument("--level", type=int, default=1, help="gzip level")
+    follow_parser.set_defaults(func=_follow)
+
+    dedupe_parser = commands.add_parser(
+        "dedupe", help="find and remove duplicate .SPE/.WIP files"
+    )
+    dedupe_parser.add_argument("directory", help="directory tree to deduplicate")
+    dedupe_parser.add_argument(
+        "--action", choices=["report", "hardlink", "manifest"], default="report"
+    )
+    dedupe_parser.add_argument("-j", "--processes", type=int, help="worker processes")
+    dedupe_parser.add_argument(
+        "--excludes", help="write the recorded copies as an rsync --exclude-from file"
+    )
+    dedupe_parser.set_defaults(func=_dedupe)
+
+    watch_parser = commands.add_parser(
+        "watch", help="process acquisitions as they are written"
+    )
+    watch_parser.add_argument("directory", help="directory tree to poll")
+    watch_parser.add_argument("--interval", type=float, default=5.0)
+    watch_parser.add_argument("--settle", type=int, default=2)
+    watch_parser.add_argument(
+        "--existing", action="store_true", help="also process files already present"
+    )
+    watch_parser.add_argument(
+        "--convert", action="store_true", help="convert each finished pair"
+    )
+    add_conversion_options(watch_parser)
+    watch_parser.set_defaults(func=_watch)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
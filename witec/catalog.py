@@ -0,0 +1,458 @@
+"""This module keeps a persistent catalog of the acquisitions in a data
+directory.
+
+Every acquisition, identified by the basename its .WIP and .SPE files
+share, gets one row in a local SQLite file. The row holds the fields
+parsed by metadata_from_name alongside the full SPE header and WIP
+information text. The catalog remembers the size and modification time
+of every file it has read, so refreshing it after a day of acquisitions
+only re-parses files that are new or have changed.
+
+>>> from witec.catalog import Catalog
+
+>>> with Catalog("data/catalog.sqlite") as catalog:
+...     summary = catalog.refresh("data")
+>>> summary
+{'scanned': 51234, 'indexed': 12, 'removed': 0}
+
+Indexed queries then replace globbing and opening every file.
+
+>>> from witec.catalog import find
+>>> june = ("2023-06-01", "2023-07-01")
+>>> rows = find(sample="MoS2", wavelength=532e-9, date_range=june)
+>>> [row["basename"] for row in rows]
+['data/MoS2_A_01_spectra_20230615-1324_1', ...]
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import datetime
+import json
+import logging
+import os
+import pathlib
+import sqlite3
+
+from witec.utils import (
+    as_builtin,
+    metadata_from_name,
+    metadata_from_spe,
+    metadata_from_wip,
+    metadata_from_wips,
+)
+from witec.wip_info import typed_info
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CATALOG = pathlib.Path("data", "catalog.sqlite")
+
+# File types that belong to an acquisition
+SUFFIXES = (".SPE", ".WIP")
+
+# Columns of the acquisitions table, and where each value comes from
+NAME_COLUMNS = {
+    "sample": "sample",
+    "location": "location",
+    "identifier": "identifier",
+    "meas_type": "meas-type",
+    "datetime": "datetime",
+    "measurement_number": "measurement number",
+}
+SETTINGS_COLUMNS = {
+    "wavelength": "wavelength (m)",
+    "set_power": "set power (W)",
+    "exposure": "exposure time (s)",
+    "excitation_source": "excitation source",
+    "objective": "objective",
+    "filter": "filter",
+}
+SPE_COLUMNS = ["exp_sec", "SpecCenterWlNm", "DetTemperature", "NumFrames", "xdim"]
+# Typed WIP info fields, from the first data object that records them
+WIP_COLUMNS = {
+    "integration_time": "Integration Time (s)",
+    "points_per_line": "Points per Line",
+    "lines_per_image": "Lines per Image",
+    "scan_width": "Scan Width (m)",
+    "scan_height": "Scan Height (m)",
+}
+
+# Bump whenever SCHEMA changes; older catalogs are rebuilt on open
+SCHEMA_VERSION = 3
+
+# Columns find() filters with an index
+INDEXED_COLUMNS = [
+    "sample",
+    "location",
+    "identifier",
+    "meas_type",
+    "timestamp",
+    "wavelength",
+    "set_power",
+    "exposure",
+    "excitation_source",
+    "objective",
+    "filter",
+    *WIP_COLUMNS,
+]
+
+# Relative tolerance when matching a single value of a numeric column
+RTOL = 1e-6
+
+# Columns find() accepts as criteria
+_FIND_COLUMNS = {*NAME_COLUMNS, *SETTINGS_COLUMNS, *WIP_COLUMNS}
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    basename TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_basename ON files (basename);
+CREATE TABLE IF NOT EXISTS acquisitions (
+    basename TEXT PRIMARY KEY,
+    has_spe INTEGER NOT NULL,
+    has_wip INTEGER NOT NULL,
+    {", ".join(f"{column} TEXT" for column in NAME_COLUMNS)},
+    timestamp REAL,
+    wavelength REAL,
+    set_power REAL,
+    exposure REAL,
+    excitation_source TEXT,
+    objective TEXT,
+    filter TEXT,
+    {", ".join(f"{column} REAL" for column in SPE_COLUMNS)},
+    {", ".join(f"{column} REAL" for column in WIP_COLUMNS)},
+    name_json TEXT,
+    spe_json TEXT,
+    wip_json TEXT,
+    error TEXT
+);
+""" + "".join(
+    f"CREATE INDEX IF NOT EXISTS acquisitions_{column} ON acquisitions ({column});\n"
+    for column in INDEXED_COLUMNS
+)
+
+
+def scan(directory):
+    """Stat every acquisition file in a directory tree.
+
+    Returns
+    -------
+    stats : dict
+        Maps each file path to its (size, mtime_ns).
+    """
+    stats = {}
+    pending = [os.fspath(directory)]
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                elif os.path.splitext(entry.name)[1] in SUFFIXES:
+                    stat = entry.stat()
+                    stats[entry.path] = (stat.st_size, stat.st_mtime_ns)
+    return stats
+
+
+def index_acquisition(basename, suffixes, wip=None):
+    """Extract the catalog row of one acquisition.
+
+    Parameters
+    ----------
+    basename : str
+        Path to the acquisition without extension.
+    suffixes : iterable of str
+        Which of SUFFIXES exist for this basename.
+    wip : dict (optional)
+        The metadata_from_wip of the .WIP file, if already extracted.
+
+    Returns
+    -------
+    row : dict
+        Values for the columns of the acquisitions table. Parsing errors
+        are recorded in the "error" column rather than raised.
+    """
+    row = {"basename": basename, "has_spe": ".SPE" in suffixes}
+    row["has_wip"] = ".WIP" in suffixes
+    errors = []
+    try:
+        name = metadata_from_name(basename)
+        for column, key in NAME_COLUMNS.items():
+            row[column] = name[key]
+        if name["datetime"] is None:
+            row["timestamp"] = None
+        else:
+            acquired = datetime.datetime.fromisoformat(name["datetime"])
+            row["timestamp"] = acquired.timestamp()
+        for column, key in SETTINGS_COLUMNS.items():
+            row[column] = name["source-settings"].get(key)
+        row["name_json"] = json.dumps(name)
+    except (ValueError, TypeError, IndexError) as error:
+        errors.append(f"name: {error}")
+    if row["has_spe"]:
+        try:
+            header = as_builtin(metadata_from_spe(basename + ".SPE"))
+            for column in SPE_COLUMNS:
+                row[column] = header[column]
+            row["spe_json"] = json.dumps(header)
+        except (OSError, ValueError) as error:
+            errors.append(f"SPE: {error}")
+    if row["has_wip"]:
+        try:
+            if wip is None:
+                wip = metadata_from_wip(basename + ".WIP")
+            row["wip_json"] = json.dumps(wip)
+            row.update(_wip_columns(wip))
+        except Exception as error:  # pylint: disable=broad-except
+            errors.append(f"WIP: {type(error).__name__}: {error}")
+    row["error"] = "; ".join(errors) or None
+    return row
+
+
+class Catalog:
+    """A SQLite catalog with one row per acquisition.
+
+    Parameters
+    ----------
+    path : str (optional)
+        Location of the SQLite file, created if necessary. Defaults to
+        DEFAULT_CATALOG.
+    """
+
+    def __init__(self, path=DEFAULT_CATALOG):
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.row_factory = sqlite3.Row
+        (version,) = self.connection.execute("PRAGMA user_version").fetchone()
+        if version != SCHEMA_VERSION:
+            # The catalog only caches what is on disk, so rebuild it
+            self.connection.executescript(
+                "DROP TABLE IF EXISTS files; DROP TABLE IF EXISTS acquisitions;"
+            )
+        self.connection.executescript(SCHEMA)
+        self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        (count,) = self.connection.execute("SELECT COUNT(*) FROM acquisitions")
+        return count[0]
+
+    def close(self):
+        self.connection.close()
+
+    def _known_files(self):
+        rows = self.connection.execute("SELECT path, size, mtime_ns FROM files")
+        return {path: (size, mtime_ns) for path, size, mtime_ns in rows}
+
+    def refresh(self, directory, processes=None):
+        """Bring the catalog up to date with a data directory.
+
+        Only acquisitions with a file that is new, removed, or whose size
+        or modification time changed since the last refresh are parsed.
+        Paths are stored resolved with os.path.realpath.
+
+        Parameters
+        ----------
+        directory : str
+            Root of the tree holding .WIP and .SPE files.
+        processes : int (optional)
+            Number of worker processes used to parse changed acquisitions.
+            A value of 1 parses in the calling process.
+
+        Returns
+        -------
+        summary : dict
+            Number of files scanned, acquisitions (re)indexed, and
+            acquisitions removed.
+        """
+        # Spell every path one way, however the directory was given
+        directory = os.path.realpath(directory)
+        known = self._known_files()
+        prefix = os.path.join(directory, "")
+        known = {path: stat for path, stat in known.items() if path.startswith(prefix)}
+        current = scan(directory)
+        changed = {path for path, stat in current.items() if known.get(path) != stat}
+        deleted = set(known) - set(current)
+        affected = {os.path.splitext(path)[0] for path in changed | deleted}
+
+        suffixes = {}
+        for path in current:
+            basename, suffix = os.path.splitext(path)
+            if basename in affected:
+                suffixes.setdefault(basename, set()).add(suffix)
+        removed = affected - set(suffixes)
+        rows = self._index(sorted(suffixes.items()), processes)
+
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM files WHERE path = ?", [(path,) for path in deleted]
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                [
+                    (path, os.path.splitext(path)[0], *current[path])
+                    for path in sorted(changed)
+                ],
+            )
+            self.connection.executemany(
+                "DELETE FROM acquisitions WHERE basename = ?",
+                [(basename,) for basename in removed],
+            )
+            for row in rows:
+                columns = ", ".join(row)
+                marks = ", ".join("?" * len(row))
+                self.connection.execute(
+                    f"INSERT OR REPLACE INTO acquisitions ({columns}) VALUES ({marks})",
+                    list(row.values()),
+                )
+        summary = {
+            "scanned": len(current),
+            "indexed": len(rows),
+            "removed": len(removed),
+        }
+        log.info("Refreshed %s: %s", self.path, summary)
+        return summary
+
+    def _index(self, acquisitions, processes):
+        if processes == 1 or len(acquisitions) < 2:
+            return [index_acquisition(*item) for item in acquisitions]
+        basenames, suffixes = zip(*acquisitions)
+        # Info streams dominate, so strip them stream by stream in one pool
+        wips = metadata_from_wips(
+            [basename + ".WIP" for basename, found in acquisitions if ".WIP" in found],
+            processes,
+        )
+        wips = [wips.get(basename + ".WIP") for basename in basenames]
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            return list(
+                pool.map(index_acquisition, basenames, suffixes, wips, chunksize=16)
+            )
+
+    def get(self, basename):
+        """Return the stored metadata of one acquisition as a dictionary."""
+        row = self.connection.execute(
+            "SELECT * FROM acquisitions WHERE basename = ?",
+            (os.path.realpath(basename),),
+        ).fetchone()
+        if row is None:
+            raise KeyError(basename)
+        return _decode(row)
+
+    def find(
+        self, sample=None, meas_type=None, date_range=None, wavelength=None, **fields
+    ):
+        """Return the acquisitions matching every given criterion.
+
+        Parameters
+        ----------
+        sample, meas_type : str or list of str (optional)
+            Match any of the given values exactly.
+        date_range : tuple (optional)
+            (start, end) as datetime, date or ISO 8601 strings, either of
+            which may be None. The start is inclusive and the end
+            exclusive. Naive values are taken in local time and a date
+            end, or a date-only string, includes that whole day.
+        wavelength : float or tuple (optional)
+            Excitation wavelength in meters, as a single value or an
+            inclusive (low, high) range.
+        **fields
+            Any other column of the acquisitions table, e.g. location,
+            objective, set_power or integration_time, matched like sample
+            or, for numeric columns, wavelength.
+
+        Returns
+        -------
+        rows : list of dict
+            Matching acquisitions in chronological order, decoded like
+            Catalog.get.
+        """
+        fields.update(sample=sample, meas_type=meas_type, wavelength=wavelength)
+        clauses, parameters = [], []
+        for column, value in fields.items():
+            if value is None:
+                continue
+            if column not in _FIND_COLUMNS:
+                raise TypeError(f"find() got an unknown column {column!r}")
+            clause, values = _match(column, value)
+            clauses.append(clause)
+            parameters.extend(values)
+        if date_range is not None:
+            start, end = date_range
+            if start is not None:
+                clauses.append("timestamp >= ?")
+                parameters.append(_timestamp(start))
+            if end is not None:
+                clauses.append("timestamp < ?")
+                parameters.append(_timestamp(end, end=True))
+        where = " AND ".join(clauses) or "1"
+        rows = self.connection.execute(
+            f"SELECT * FROM acquisitions WHERE {where} ORDER BY timestamp, basename",
+            parameters,
+        )
+        return [_decode(row) for row in rows]
+
+
+def _wip_columns(wip):
+    """Numeric WIP_COLUMNS values of a metadata_from_wip dict."""
+    columns = {}
+    for fields in wip.values():
+        info = typed_info(fields)
+        for column, key in WIP_COLUMNS.items():
+            value = info.get(key)
+            if isinstance(value, (int, float)) and column not in columns:
+                columns[column] = value
+    return columns
+
+
+def _decode(row):
+    metadata = dict(row)
+    for key in ["name_json", "spe_json", "wip_json"]:
+        if metadata[key] is not None:
+            metadata[key] = json.loads(metadata[key])
+    return metadata
+
+
+def _match(column, value):
+    """Build the WHERE clause matching a column against a query value."""
+    numeric = column in ["wavelength", "set_power", "exposure", *WIP_COLUMNS]
+    if numeric and isinstance(value, (tuple, list)):
+        low, high = sorted(value)
+        return f"{column} BETWEEN ? AND ?", [low, high]
+    if numeric:
+        tolerance = abs(value) * RTOL
+        return f"{column} BETWEEN ? AND ?", [value - tolerance, value + tolerance]
+    if isinstance(value, (tuple, list, set, frozenset)):
+        values = list(value)
+        return f"{column} IN ({', '.join('?' * len(values))})", values
+    return f"{column} = ?", [value]
+
+
+def _timestamp(value, end=False):
+    """Convert a datetime, date or ISO 8601 string to a POSIX timestamp."""
+    if isinstance(value, str):
+        # Date-only strings cover the whole day, like date objects
+        try:
+            value = datetime.date.fromisoformat(value)
+        except ValueError:
+            value = datetime.datetime.fromisoformat(value)
+    if not isinstance(value, datetime.datetime):
+        if end:
+            value += datetime.timedelta(days=1)
+        value = datetime.datetime.combine(value, datetime.time())
+    return value.timestamp()
+
+
+def find(catalog=DEFAULT_CATALOG, **criteria):
+    """Query a catalog file without managing the connection.
+
+    Takes the same criteria as Catalog.find. The catalog is not
+    refreshed, so call Catalog.refresh after new acquisitions.
+    """
+    with Catalog(catalog) as opened:
+        return opened.find(**criteria)
@@ -0,0 +1,619 @@
+"""This module converts WITec acquisitions into HDF5 files.
+
+One .hdf5 file holds everything a similarly named .SPE and .WIP pair
+records:
+
+    /spe/data           frames of shape (NumFrames, xdim, ydim), oriented
+                        like SpeFile.data
+    /spe/wavelength     the calibrated x axis
+    /wip/...            the WIT tag tree of the project, with trees as
+                        groups and data blocks as datasets
+
+The flattened output of assemble_metadata is stored as attributes of the
+root group, except for the SPE header, which is stored as attributes of
+/spe. Frames and data blocks are streamed from disk one block at a time
+into chunked, compressed datasets, so a conversion never holds a whole
+map in memory.
+
+>>> from witec.convert import convert
+
+>>> convert("data/sample_loc_id_map_20230615-1324_1")
+PosixPath('data/sample_loc_id_map_20230615-1324_1.hdf5')
+
+The same is available from the command line:
+
+    $ python -m witec convert data/sample_loc_id_map_20230615-1324_1.SPE
+"""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import datetime
+import functools
+import hashlib
+import json
+import logging
+import math
+import os
+import pathlib
+import re
+
+import h5py
+import numpy as np
+
+from witec.cube import CHUNK_BYTES, spe_frames
+import witec.project
+from witec.utils import (
+    as_builtin,
+    assemble_metadata,
+    find_pairs,
+    flatten_metadata,
+    metadata_from_name,
+    metadata_from_wip,
+    metadata_from_yaml,
+)
+
+log = logging.getLogger(__name__)
+
+# Target size of one compressed HDF5 chunk
+H5_CHUNK_BYTES = 2**20
+
+# Default name of the manifest convert_directory keeps in its output
+MANIFEST = "manifest.jsonl"
+
+# Name of the file convert and rechunk write before moving it into place
+_PARTIAL = re.compile(r"\..+\.(\d+)\.partial")
+
+
+def convert(
+    basename,
+    output=None,
+    yaml=(),
+    compression="gzip",
+    compression_opts=1,
+    access="balanced",
+):
+    """Convert a WIP/SPE pair, or either file alone, into one HDF5 file.
+
+    Parameters
+    ----------
+    basename : str
+        Path to the acquisition, with or without a .SPE/.WIP extension.
+    output : str (optional)
+        Path of the HDF5 file. Defaults to the basename with .hdf5.
+    yaml : list of str (optional)
+        Supplemental yaml files, as in assemble_metadata.
+    compression, compression_opts : (optional)
+        HDF5 filter and its setting for the datasets. gzip at level 1
+        is readable by any HDF5 tool; "lzf" compresses about three times
+        faster but needs h5py to read, and None writes at disk speed.
+    access : {"balanced", "spectra", "images"} (optional)
+        Expected reads of the frames, used to choose their chunk shape.
+
+    Returns
+    -------
+    output : pathlib.Path
+        The HDF5 file written.
+    """
+    basename = pathlib.Path(basename)
+    if basename.suffix.upper() in (".SPE", ".WIP"):
+        basename = basename.with_suffix("")
+    spe, wip = basename.with_suffix(".SPE"), basename.with_suffix(".WIP")
+    if not spe.exists() and not wip.exists():
+        raise FileNotFoundError(f"No .SPE or .WIP file for {basename}")
+    if output is None:
+        output = basename.with_suffix(".hdf5")
+    output = pathlib.Path(output)
+    filters = dataset_filters(compression, compression_opts)
+
+    # Write next to the output and rename, so it is never seen half written
+    partial = output.with_name(f".{output.name}.{os.getpid()}.partial")
+    try:
+        with h5py.File(partial, "w") as h5:
+            metadata = _metadata(basename, yaml)
+            write_attrs(h5, metadata)
+            if spe.exists():
+                points_per_line, _ = scan_geometry(metadata)
+                group = h5.create_group("spe")
+                write_spe(group, spe, points_per_line, access, **filters)
+            if wip.exists():
+                write_wip(h5.create_group("wip"), wip, **filters)
+        os.replace(partial, output)
+    finally:
+        partial.unlink(missing_ok=True)
+    log.info("Converted %s to %s", basename, output)
+    return output
+
+
+def dataset_filters(compression, compression_opts):
+    """Keyword arguments of create_dataset for a compression setting."""
+    if compression is None:
+        return {}
+    if compression == "lzf":
+        return {"compression": "lzf"}
+    return {"compression": compression, "compression_opts": compression_opts}
+
+
+def _metadata(basename, yaml):
+    """Assemble all metadata of a pair, or what is available for one file."""
+    spe, wip = basename.with_suffix(".SPE"), basename.with_suffix(".WIP")
+    if spe.exists() and wip.exists():
+        metadata = assemble_metadata(basename, *yaml)
+        # The header is stored on /spe instead
+        del metadata["SPE"]
+        return metadata
+    metadata = {}
+    if wip.exists():
+        metadata["WIP"] = metadata_from_wip(wip)
+    metadata["Experiment"] = metadata_from_name(basename)
+    for file in yaml:
+        metadata.update(metadata_from_yaml(file))
+    return metadata
+
+
+def write_attrs(node, metadata):
+    """Store flattened metadata as HDF5 attributes."""
+    for key, value in flatten_metadata(metadata).items():
+        if value is None:
+            continue
+        if not isinstance(value, (str, bool, int, float, np.generic)):
+            value = str(value)
+        if isinstance(value, str):
+            # HDF5 strings cannot hold the padding of fixed-width fields
+            value = value.replace("\x00", "")
+        node.attrs[key] = value
+
+
+def chunk_shape(shape, itemsize, points_per_line=None, access="balanced"):
+    """Choose HDF5 chunks for frames of shape (NumFrames, xdim, ydim).
+
+    A spectrum (one frame, all pixels) reads every chunk along the
+    pixels, and a band image (all frames, a few pixels) every chunk along
+    the frames. Chunks of about H5_CHUNK_BYTES are split between the two
+    axes so both access patterns read only a few of them.
+
+    Parameters
+    ----------
+    shape : tuple
+        (NumFrames, xdim, ydim) of the dataset.
+    itemsize : int
+        Bytes per value.
+    points_per_line : int (optional)
+        Scan points per line. Chunks then hold whole scan lines, so that
+        rectangular regions of a map also read few chunks.
+    access : {"balanced", "spectra", "images"} (optional)
+        Favor both patterns, whole spectra, or band images.
+
+    Returns
+    -------
+    chunks : tuple or None
+        The chunk shape, or None when the data fits in a single chunk and
+        is better stored contiguously.
+    """
+    nframes, xdim, ydim = shape
+    budget = max(1, H5_CHUNK_BYTES // (itemsize * ydim))
+    if nframes * xdim <= budget:
+        return None
+    if access == "spectra":
+        pixels = xdim
+    elif access == "images":
+        pixels = max(1, min(xdim, budget // nframes))
+    elif access == "balanced":
+        # Split the pixels into about as many chunks as the frames
+        splits = max(1.0, math.sqrt(nframes * xdim / budget))
+        pixels = min(xdim, math.ceil(xdim / min(splits, xdim)))
+    else:
+        raise ValueError(f"Unknown access pattern {access!r}")
+    frames = max(1, budget // pixels)
+    if points_per_line and frames >= points_per_line:
+        frames -= frames % points_per_line
+    return (min(frames, nframes), pixels, ydim)
+
+
+def write_spe(group, filename, points_per_line=None, access="balanced", **filters):
+    """Stream the frames and header of an SPE file into an HDF5 group.
+
+    Chunks are chosen by chunk_shape from the frame geometry and, when
+    known, the points per scan line.
+    """
+    spe, frames = spe_frames(filename)
+    nframes, ydim, xdim = frames.shape
+    shape = (nframes, xdim, ydim)
+    chunks = chunk_shape(shape, frames.dtype.itemsize, points_per_line, access)
+    data = group.create_dataset(
+        "data",
+        shape=shape,
+        dtype=frames.dtype,
+        chunks=chunks,
+        # Small datasets are stored contiguously, which cannot be filtered
+        shuffle=chunks is not None and bool(filters),
+        **(filters if chunks is not None else {}),
+    )
+    if points_per_line:
+        data.attrs["points_per_line"] = points_per_line
+    _copy_frames(frames, data)
+    group.create_dataset("wavelength", data=spe.xaxis)
+    group["wavelength"].attrs["label"] = spe.xaxis_label.rstrip("\x00")
+    write_attrs(group, as_builtin(spe.header))
+    return data
+
+
+def _copy_frames(frames, data):
+    """Copy (frames, ydim, xdim) into a (frames, xdim, ydim) dataset.
+
+    Blocks span whole chunk rows, so each chunk is compressed only once.
+    """
+    nframes = frames.shape[0]
+    frame_bytes = max(1, frames[:1].nbytes)
+    step = data.chunks[0] if data.chunks else 1
+    block = max(1, CHUNK_BYTES // (frame_bytes * step)) * step
+    for start in range(0, nframes, block):
+        stop = min(start + block, nframes)
+        data[start:stop] = np.ascontiguousarray(frames[start:stop].transpose(0, 2, 1))
+
+
+def rechunk(
+    filename,
+    access="balanced",
+    dataset="spe/data",
+    output=None,
+    compression="gzip",
+    compression_opts=1,
+):
+    """Rewrite the frames of a converted file with chunks for a new access.
+
+    Every other object of the file is copied unchanged. The result is
+    written beside the output and renamed into place, so `filename` may
+    be rechunked in place.
+
+    Parameters
+    ----------
+    filename : str
+        HDF5 file written by convert.
+    access : {"balanced", "spectra", "images"} (optional)
+        Access pattern passed to chunk_shape.
+    dataset : str (optional)
+        Path of the (NumFrames, xdim, ydim) dataset to rechunk.
+    output : str (optional)
+        Path of the rechunked file. Defaults to replacing `filename`.
+    compression, compression_opts : (optional)
+        HDF5 filter for the rechunked dataset, as in convert.
+
+    Returns
+    -------
+    output : pathlib.Path
+        The rechunked file.
+    """
+    output = pathlib.Path(filename if output is None else output)
+    filters = dataset_filters(compression, compression_opts)
+    partial = output.with_name(f".{output.name}.{os.getpid()}.partial")
+    try:
+        with h5py.File(filename, "r") as src, h5py.File(partial, "w") as dst:
+            source = src[dataset]
+            _copy_except(src, dst, source.name)
+            points_per_line = source.attrs.get("points_per_line")
+            chunks = chunk_shape(
+                source.shape, source.dtype.itemsize, points_per_line, access
+            )
+            data = dst.create_dataset(
+                source.name,
+                shape=source.shape,
+                dtype=source.dtype,
+                chunks=chunks,
+                shuffle=chunks is not None and bool(filters),
+                **(filters if chunks is not None else {}),
+            )
+            data.attrs.update(source.attrs)
+            # Write whole chunk rows so each chunk is compressed once
+            step = data.chunks[0] if data.chunks else 1
+            frame_bytes = max(1, math.prod(source.shape[1:]) * source.dtype.itemsize)
+            block = max(1, CHUNK_BYTES // (frame_bytes * step)) * step
+            for start in range(0, source.shape[0], block):
+                data[start : start + block] = source[start : start + block]
+        os.replace(partial, output)
+    finally:
+        partial.unlink(missing_ok=True)
+    log.info("Rechunked %s of %s as %s", dataset, output, chunks)
+    return output
+
+
+def _copy_except(src, dst, skip):
+    """Copy a group's attributes and members, leaving out one object."""
+    dst.attrs.update(src.attrs)
+    for name, item in src.items():
+        if item.name == skip:
+            continue
+        if isinstance(item, h5py.Group) and skip.startswith(item.name + "/"):
+            _copy_except(item, dst.create_group(name), skip)
+        else:
+            src.copy(item, dst, name=name)
+
+
+def scan_geometry(metadata):
+    """Find the points per line and lines of a map in WIP metadata.
+
+    Returns
+    -------
+    geometry : tuple
+        (points_per_line, lines), with None for values not recorded.
+    """
+    geometry = {"Points per Line": None, "Lines per Image": None}
+    for info in metadata.get("WIP", {}).values():
+        for key in geometry:
+            try:
+                geometry[key] = geometry[key] or int(info[key].strip())
+            except (KeyError, ValueError, TypeError, AttributeError):
+                continue
+    return tuple(geometry.values())
+
+
+def write_wip(group, filename, **filters):
+    """Mirror the WIT tag tree of a project into an HDF5 group.
+
+    Trees become groups and every other tag a dataset of its numpy type,
+    copied from the file block by block. Strings (data type 9) are stored
+    as a list of strings.
+    """
+    with open(filename, "rb") as raw:
+        end = raw.seek(0, 2)
+        _write_tags(group, raw, 8, end, filters)
+
+
+def _write_tags(group, raw, start, end, filters):
+    for name, dtype, data_start, data_end in witec.project.iter_tags(raw, start, end):
+        # "/" separates HDF5 paths and "." is the group itself
+        name = name.replace("/", "_") or "_"
+        name = "_" if name == "." else name
+        if name in group:
+            # Witec keeps the last of repeated names, so do the same
+            del group[name]
+        if dtype == 0:
+            _write_tags(group.create_group(name), raw, data_start, data_end, filters)
+        elif dtype == 9:
+            raw.seek(data_start)
+            group[name] = _read_strings(raw.read(data_end - data_start))
+        else:
+            _copy_block(group, name, raw, data_start, data_end, dtype, filters)
+
+
+def _read_strings(payload):
+    strings = []
+    while payload:
+        length = int.from_bytes(payload[:4], "little")
+        string = payload[4 : 4 + length].decode("windows-1252")
+        strings.append(string.replace("\x00", ""))
+        payload = payload[4 + length :]
+    return strings
+
+
+def _copy_block(group, name, raw, start, end, dtype, filters):
+    """Copy one data block into a dataset without reading it all at once."""
+    dtype = np.dtype(witec.project.NUMPY_DTYPES.get(dtype, "u1"))
+    size = end - start
+    if size % dtype.itemsize:
+        dtype = np.dtype("u1")
+    count = size // dtype.itemsize
+    if size < H5_CHUNK_BYTES:
+        raw.seek(start)
+        group.create_dataset(name, data=np.frombuffer(raw.read(size), dtype=dtype))
+        return
+    data = group.create_dataset(
+        name,
+        shape=(count,),
+        dtype=dtype,
+        chunks=(H5_CHUNK_BYTES // dtype.itemsize,),
+        shuffle=bool(filters),
+        **filters,
+    )
+    block = CHUNK_BYTES // dtype.itemsize
+    raw.seek(start)
+    for first in range(0, count, block):
+        items = min(block, count - first)
+        data[first : first + items] = np.frombuffer(
+            raw.read(items * dtype.itemsize), dtype=dtype
+        )
+
+
+def source_state(path, digest=True):
+    """Describe a source file by size, mtime and, optionally, SHA-256."""
+    stat = os.stat(path)
+    state = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if digest:
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as stream:
+            while block := stream.read(CHUNK_BYTES):
+                sha256.update(block)
+        state["sha256"] = sha256.hexdigest()
+    return state
+
+
+def read_manifest(path):
+    """Load the latest manifest entry of every converted acquisition.
+
+    The manifest is a JSON lines file appended to after every
+    conversion, so the last entry of a basename wins and a line cut
+    short by an interruption is ignored.
+    """
+    entries = {}
+    try:
+        with open(path, "r", encoding="utf-8") as stream:
+            for line in stream:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    log.warning("Ignoring incomplete manifest line in %s", path)
+                    continue
+                entries[entry["basename"]] = entry
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def _up_to_date(entry, sources, output):
+    """Whether a manifest entry still matches the sources by size and mtime."""
+    if entry is None or not output.exists():
+        return False
+    for suffix, path in sources.items():
+        recorded = entry["sources"].get(suffix, {})
+        state = source_state(path, digest=False)
+        if any(recorded.get(key) != state[key] for key in ("size", "mtime_ns")):
+            return False
+    return True
+
+
+def _convert_entry(basename, relative, output, entry, yaml, kwargs):
+    """Convert one acquisition in a worker unless its content is unchanged.
+
+    Returns the new manifest entry and whether a conversion was needed.
+    """
+    sources = {suffix: basename.with_suffix(suffix) for suffix in (".SPE", ".WIP")}
+    states = {suffix: source_state(path) for suffix, path in sources.items()}
+    converted = True
+    if entry is not None and output.exists():
+        # Touched or copied sources keep their content and hash
+        recorded = {
+            suffix: state.get("sha256") for suffix, state in entry["sources"].items()
+        }
+        converted = recorded != {
+            suffix: state["sha256"] for suffix, state in states.items()
+        }
+    if converted:
+        output.parent.mkdir(parents=True, exist_ok=True)
+        convert(basename, output, yaml, **kwargs)
+    entry = {
+        "basename": relative,
+        "output": os.fspath(output),
+        "sources": states,
+        "converted": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }
+    return entry, converted
+
+
+def _journal(path):
+    """Open a manifest for appending, after any line cut short."""
+    journal = open(path, "a+b")
+    if journal.tell() > 0:
+        journal.seek(journal.tell() - 1)
+        if journal.read(1) != b"\n":
+            journal.write(b"\n")
+    return journal
+
+
+def _running(pid):
+    """Whether a process with this id exists, assuming it does off POSIX."""
+    if os.name != "posix":
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _remove_stale_partials(output_dir):
+    """Remove the partial outputs of killed conversions under output_dir."""
+    for path in output_dir.rglob(".*.partial"):
+        match = _PARTIAL.fullmatch(path.name)
+        if match is None or _running(int(match[1])):
+            continue
+        log.info("Removing %s, left by an interrupted conversion", path)
+        try:
+            path.unlink()
+        except OSError as error:
+            log.warning("Could not remove %s: %s", path, error)
+
+
+def convert_directory(
+    directory,
+    output_dir=None,
+    yaml=(),
+    processes=None,
+    manifest=None,
+    progress=None,
+    **kwargs,
+):
+    """Convert every WIP/SPE pair of a directory tree, resumably.
+
+    Each finished conversion is appended to a manifest of the size,
+    mtime and SHA-256 of its sources. Later runs skip pairs whose sources
+    still match, by size and mtime first and by hash when only those
+    changed, so an interrupted run resumes where it stopped. Outputs are
+    written atomically by convert, and partial outputs of a killed run
+    are removed.
+
+    Parameters
+    ----------
+    directory : str
+        Root of the tree holding the .WIP and .SPE files.
+    output_dir : str (optional)
+        Root of the converted tree, mirroring the layout of `directory`.
+        Defaults to writing each .hdf5 file next to its sources.
+    yaml : list of str (optional)
+        Supplemental yaml files, as in assemble_metadata.
+    processes : int (optional)
+        Number of worker processes. Defaults to the number of CPUs. A
+        value of 1 converts in the calling process.
+    manifest : str (optional)
+        Path of the manifest. Defaults to MANIFEST in `output_dir`.
+    progress : callable (optional)
+        Called as progress(done, total, basename) after each pair.
+    **kwargs
+        Compression options passed on to convert.
+
+    Returns
+    -------
+    summary : dict
+        Number of pairs converted, skipped as up to date, and failed.
+    """
+    directory = pathlib.Path(directory)
+    output_dir = directory if output_dir is None else pathlib.Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = output_dir / MANIFEST if manifest is None else pathlib.Path(manifest)
+    entries = read_manifest(manifest)
+    _remove_stale_partials(output_dir)
+
+    summary = {"converted": 0, "skipped": 0, "failed": 0}
+    pending = []
+    for basename in find_pairs(directory):
+        relative = basename.relative_to(directory).as_posix()
+        output = (output_dir / relative).with_suffix(".hdf5")
+        sources = {suffix: basename.with_suffix(suffix) for suffix in (".SPE", ".WIP")}
+        if _up_to_date(entries.get(relative), sources, output):
+            summary["skipped"] += 1
+        else:
+            pending.append((basename, relative, output))
+    total = len(pending)
+    log.info("%d pairs up to date, %d to check", summary["skipped"], total)
+
+    tasks = [
+        (basename, relative, output, entries.get(relative), tuple(yaml), kwargs)
+        for basename, relative, output in pending
+    ]
+
+    def finish(journal, done, relative, result):
+        try:
+            entry, converted = result()
+        except Exception as error:  # pylint: disable=broad-except
+            log.error("Could not convert %s: %s", relative, error)
+            summary["failed"] += 1
+        else:
+            journal.write(json.dumps(entry).encode() + b"\n")
+            journal.flush()
+            os.fsync(journal.fileno())
+            summary["converted" if converted else "skipped"] += 1
+        log.info("Checked %d/%d: %s", done, total, relative)
+        if progress is not None:
+            progress(done, total, relative)
+
+    with _journal(manifest) as journal:
+        if processes == 1:
+            for done, task in enumerate(tasks, start=1):
+                finish(journal, done, task[1], functools.partial(_convert_entry, *task))
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                futures = {
+                    pool.submit(_convert_entry, *task): task[1] for task in tasks
+                }
+                for done, future in enumerate(as_completed(futures), start=1):
+                    finish(journal, done, futures[future], future.result)
+    return summary
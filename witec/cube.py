@@ -0,0 +1,343 @@
+"""This module provides a lazily evaluated hyperspectral cube.
+
+A spectral map of `lines` x `points_per_line` spectra quickly outgrows
+memory when each spectrum spans the full width of the CCD. Cube wraps a
+memory-mapped .SPE file or an HDF5 dataset and only reads data when it
+is asked for a result. Slicing, by index or by coordinate, returns
+another Cube, and reductions (sum, mean, max, argmax) read the selection
+one block of scan lines at a time in a thread pool.
+
+>>> from witec.cube import Cube
+
+>>> cube = Cube.from_spe("path/to/map.SPE", points_per_line=200)
+>>> window = cube.sel(wavelength=(690, 697))
+>>> image = window.sum(axis=2)  # (lines, points) integrated intensity
+>>> spectrum = cube[10:20, 10:20].mean(axis=(0, 1))
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+import h5py
+import numpy as np
+
+from witec.scan import scan_view
+import witec.winspec
+
+# Aim for blocks of roughly this many bytes when reducing a cube
+CHUNK_BYTES = 64 * 2**20
+
+
+class _BinnedFrames:
+    """Present raw SPE frames of shape (lines, points, ydim, xdim) as a
+    (lines, points, xdim) cube by summing the CCD rows on read."""
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.shape = frames.shape[:2] + frames.shape[3:]
+        self.dtype = np.sum(np.zeros(1, dtype=frames.dtype)).dtype
+
+    def __getitem__(self, key):
+        lines, points, pixels = key
+        return self.frames[lines, points, :, pixels].sum(axis=2)
+
+
+def spe_frames(filename):
+    """Memory-map the frames of an SPE file as an array of (frames, ydim, xdim)."""
+    spe = witec.winspec.SpeFile(filename)
+    return spe, spe.memmap()
+
+
+def _normalize_axes(axis):
+    if axis is None:
+        return None
+    axes = (axis,) if np.ndim(axis) == 0 else tuple(axis)
+    return tuple(sorted(a % 3 for a in axes))
+
+
+class Cube:
+    """A lazily evaluated (lines, points, pixels) hyperspectral cube.
+
+    Parameters
+    ----------
+    source : array-like
+        Any 3D object that supports numpy basic slicing and exposes
+        `shape` and `dtype`, e.g. numpy.memmap or h5py.Dataset.
+    wavelength : array (optional)
+        Spectral axis of length pixels. Defaults to the pixel index.
+    x, y : array (optional)
+        Scan coordinates of the points and lines. Default to indices.
+    workers : int (optional)
+        Threads used by reductions. Defaults to the number of CPUs.
+    chunk_lines : int (optional)
+        Scan lines read per block. Defaults to roughly CHUNK_BYTES.
+    """
+
+    def __init__(
+        self, source, wavelength=None, x=None, y=None, workers=None, chunk_lines=None
+    ):
+        if len(source.shape) != 3:
+            raise ValueError(f"Cube source must be 3D, got shape {source.shape}")
+        lines, points, pixels = source.shape
+        self.source = source
+        self._selection = tuple(slice(0, n, 1) for n in source.shape)
+        self.wavelength = np.asarray(
+            np.arange(pixels) if wavelength is None else wavelength
+        )
+        self.x = np.asarray(np.arange(points) if x is None else x)
+        self.y = np.asarray(np.arange(lines) if y is None else y)
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_lines = chunk_lines
+        self.file = None
+
+    @classmethod
+    def from_spe(
+        cls, filename, points_per_line, lines=None, serpentine=False, **kwargs
+    ):
+        """Memory-map a spectral map stored in a WinSpec .SPE file.
+
+        Frames are assumed to be stored line by line, with odd lines
+        reversed if serpentine is set. Rows of the CCD are summed on read
+        when the ROI spans more than one row.
+        """
+        spe, frames = spe_frames(filename)
+        nframes = frames.shape[0]
+        if lines is not None and lines * points_per_line > nframes:
+            raise ValueError(
+                f"{filename} holds {nframes} frames, fewer than "
+                f"{lines} lines x {points_per_line} points"
+            )
+        if frames.shape[1] == 1:
+            source = scan_view(frames[:, 0, :], points_per_line, lines, serpentine)
+        else:
+            source = _BinnedFrames(
+                scan_view(frames, points_per_line, lines, serpentine)
+            )
+        kwargs.setdefault("wavelength", spe.xaxis)
+        return cls(source, **kwargs)
+
+    @classmethod
+    def from_hdf5(cls, filename, dataset, **kwargs):
+        """Open a (lines, points, pixels) dataset of an HDF5 file.
+
+        Coordinates stored as attributes named "wavelength", "x" and "y"
+        on the dataset are used unless given explicitly. The cube keeps
+        the file open until it is closed, e.g. by a with statement:
+
+        >>> with Cube.from_hdf5("map.hdf5", "spectra") as cube:
+        ...     image = cube.sum(axis=2)
+        """
+        handle = h5py.File(filename, "r")
+        try:
+            source = handle[dataset]
+            for name in ["wavelength", "x", "y"]:
+                if name in source.attrs:
+                    kwargs.setdefault(name, source.attrs[name])
+            cube = cls(source, **kwargs)
+        except Exception:
+            handle.close()
+            raise
+        cube.file = handle
+        return cube
+
+    def __repr__(self):
+        return f"Cube(shape={self.shape}, dtype={self.dtype})"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Close the file opened by from_hdf5, shared with derived cubes."""
+        if self.file is not None:
+            self.file.close()
+
+    @property
+    def shape(self):
+        return tuple(len(range(s.start, s.stop, s.step)) for s in self._selection)
+
+    @property
+    def dtype(self):
+        return np.dtype(self.source.dtype)
+
+    @property
+    def nbytes(self):
+        return int(np.prod(self.shape)) * self.dtype.itemsize
+
+    def _derive(self, selection, y, x, wavelength):
+        cube = object.__new__(type(self))
+        cube.__dict__.update(self.__dict__)
+        cube._selection = selection
+        cube.y, cube.x, cube.wavelength = y, x, wavelength
+        return cube
+
+    def __getitem__(self, key):
+        """Select a sub-cube by index. Integers keep their dimension."""
+        if not isinstance(key, tuple):
+            key = (key,)
+        if len(key) > 3:
+            raise IndexError(f"Cube has 3 dimensions, got {len(key)} indices")
+        key = key + (slice(None),) * (3 - len(key))
+        selection, local = [], []
+        for k, current, n in zip(key, self._selection, self.shape):
+            if isinstance(k, (int, np.integer)):
+                k = int(k) + n if k < 0 else int(k)
+                if not 0 <= k < n:
+                    raise IndexError(f"Index {k} out of range for length {n}")
+                k = slice(k, k + 1)
+            if not isinstance(k, slice):
+                raise TypeError("Cube only supports integer and slice indices")
+            start, stop, step = k.indices(n)
+            if step < 1:
+                raise ValueError("Cube slices must have a positive step")
+            stop = max(start, stop)
+            local.append(slice(start, stop, step))
+            selection.append(
+                slice(
+                    current.start + start * current.step,
+                    current.start + stop * current.step,
+                    current.step * step,
+                )
+            )
+        y, x, wavelength = (
+            coords[sub] for coords, sub in zip((self.y, self.x, self.wavelength), local)
+        )
+        return self._derive(tuple(selection), y, x, wavelength)
+
+    def sel(self, y=None, x=None, wavelength=None):
+        """Select a sub-cube by (low, high) coordinate ranges, inclusive."""
+        key = []
+        for coords, bounds in zip(
+            (self.y, self.x, self.wavelength), (y, x, wavelength)
+        ):
+            if bounds is None:
+                key.append(slice(None))
+                continue
+            low, high = sorted(bounds)
+            descending = len(coords) > 1 and coords[0] > coords[-1]
+            ordered = coords[::-1] if descending else coords
+            first = np.searchsorted(ordered, low, side="left")
+            last = np.searchsorted(ordered, high, side="right")
+            if descending:
+                first, last = len(coords) - last, len(coords) - first
+            key.append(slice(int(first), int(last)))
+        return self[tuple(key)]
+
+    def _read(self, lines):
+        """Read the selection restricted to a slice of its own lines."""
+        start, stop, _ = lines.indices(self.shape[0])
+        ysel = self._selection[0]
+        selection = (
+            slice(
+                ysel.start + start * ysel.step, ysel.start + stop * ysel.step, ysel.step
+            ),
+        ) + self._selection[1:]
+        return np.asarray(self.source[selection])
+
+    def _blocks(self):
+        lines = self.shape[0]
+        chunk = self.chunk_lines
+        if chunk is None:
+            line_bytes = max(1, self.shape[1] * self.shape[2] * self.dtype.itemsize)
+            chunk = max(1, CHUNK_BYTES // line_bytes)
+        return [
+            slice(start, min(start + chunk, lines)) for start in range(0, lines, chunk)
+        ]
+
+    def blocks(self):
+        """Yield (lines, data) for each block of scan lines, in order.
+
+        `lines` is the slice of this cube's lines that `data`, an
+        in-memory array, holds. Only one block is read at a time.
+        """
+        for block in self._blocks():
+            yield block, self._read(block)
+
+    def _map(self, func):
+        blocks = self._blocks()
+        if self.workers == 1 or len(blocks) == 1:
+            return [func(block) for block in blocks]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return list(pool.map(func, blocks))
+
+    def compute(self):
+        """Read the selection into memory as a numpy array."""
+        if self.shape[0] == 0:
+            return np.empty(self.shape, dtype=self.dtype)
+        return np.concatenate(self._map(self._read), axis=0)
+
+    def __array__(self, dtype=None, copy=None):
+        data = self.compute()
+        return data if dtype is None else data.astype(dtype)
+
+    def _reduce(self, name, axis):
+        """Reduce each block of lines, then combine the partial results."""
+        axes = _normalize_axes(axis)
+        if name == "argmax":
+            return self._argmax(axes)
+        func = np.sum if name == "mean" else getattr(np, name)
+        if axes is not None and 0 not in axes:
+            results = self._map(lambda block: func(self._read(block), axis=axes))
+            result = np.concatenate(results, axis=0)
+        else:
+            results = self._map(
+                lambda block: func(self._read(block), axis=axes, keepdims=True)
+            )
+            result = func(np.concatenate(results, axis=0), axis=0)
+            if axes is None:
+                result = result.reshape(())
+            else:
+                result = np.squeeze(result, axis=tuple(a - 1 for a in axes if a))
+        if name == "mean":
+            count = np.prod([self.shape[a] for a in (axes or (0, 1, 2))])
+            result = result / count
+        return result[()]
+
+    def _argmax(self, axes):
+        if axes is not None and len(axes) > 1:
+            raise ValueError("argmax reduces a single axis or the whole cube")
+        if axes is not None and axes != (0,):
+            results = self._map(
+                lambda block: np.argmax(self._read(block), axis=axes[0])
+            )
+            return np.concatenate(results, axis=0)
+        line_size = self.shape[1] * self.shape[2]
+
+        def block_argmax(block):
+            data = self._read(block)
+            if axes is None:
+                index = int(np.argmax(data))
+                return data.flat[index], index + block.start * line_size
+            index = np.argmax(data, axis=0)
+            value = np.take_along_axis(data, index[None], axis=0)[0]
+            return value, index + block.start
+
+        results = self._map(block_argmax)
+        best_value, best_index = results[0]
+        for value, index in results[1:]:
+            # Strictly greater keeps the first occurrence, like numpy
+            better = value > best_value
+            best_value = np.where(better, value, best_value)
+            best_index = np.where(better, index, best_index)
+        return np.asarray(best_index)[()]
+
+    def sum(self, axis=None):
+        """Sum over one or more axes, reading the cube block by block."""
+        return self._reduce("sum", axis)
+
+    def mean(self, axis=None):
+        """Average over one or more axes, reading the cube block by block."""
+        return self._reduce("mean", axis)
+
+    def max(self, axis=None):
+        """Maximum over one or more axes, reading the cube block by block."""
+        return self._reduce("max", axis)
+
+    def argmax(self, axis=None):
+        """Index of the maximum along one axis, or flat index over the cube.
+
+        Matches numpy.argmax, including returning the first occurrence.
+        """
+        return self._reduce("argmax", axis)
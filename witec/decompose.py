@@ -0,0 +1,190 @@
+"""This module decomposes hyperspectral maps that do not fit in memory.
+
+A map of 10^5-10^6 spectra is too large for a full SVD, but the number
+of spectral pixels is small. Both decompositions here read a Cube one
+block of scan lines at a time and only keep matrices of the size of
+the spectral axis, the component count, and the score maps in memory.
+
+pca is a randomized SVD of the mean-centered spectra, with a few power
+iterations; each iteration is one pass over the cube. nmf factorizes
+the spectra into non-negative component spectra and abundances with
+multiplicative updates, one pass per iteration.
+
+>>> from witec.cube import Cube
+>>> from witec.decompose import nmf, pca
+
+>>> cube = Cube.from_spe("path/to/map.SPE", points_per_line=500)
+>>> result = pca(cube, n_components=8)
+>>> result.components.shape, result.scores.shape
+((8, 1340), (lines, 500, 8))
+>>> plt.plot(result.axis, result.components[0])
+>>> denoised = result.reconstruct()[10, 20]  # spectrum from 8 components
+"""
+
+from dataclasses import dataclass
+import logging
+from typing import Optional
+
+import numpy as np
+
+from witec.cube import Cube
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class Decomposition:
+    """Component spectra and score maps of a hyperspectral map.
+
+    components : array of shape (n_components, pixels)
+    scores : array of shape (lines, points, n_components)
+    axis : array of shape (pixels,), the spectral axis of the cube
+    mean : array of shape (pixels,), subtracted before PCA, else zeros
+    explained_variance : array of shape (n_components,), for PCA only
+    """
+
+    components: np.ndarray
+    scores: np.ndarray
+    axis: np.ndarray
+    mean: np.ndarray
+    explained_variance: Optional[np.ndarray] = None
+
+    def reconstruct(self, lines=slice(None), points=slice(None)):
+        """Rebuild the spectra of a region from the components alone."""
+        return self.mean + self.scores[lines, points] @ self.components
+
+
+def _as_cube(cube):
+    return cube if isinstance(cube, Cube) else Cube(np.asarray(cube))
+
+
+def _spectra(data):
+    return data.reshape(-1, data.shape[-1]).astype(np.float64)
+
+
+def _gram_product(cube, basis):
+    """Return (X^T X basis, sum of spectra, count) in one pass over the cube."""
+    product = np.zeros_like(basis)
+    total = np.zeros(basis.shape[0])
+    count = 0
+    for _, data in cube.blocks():
+        spectra = _spectra(data)
+        product += spectra.T @ (spectra @ basis)
+        total += spectra.sum(axis=0)
+        count += len(spectra)
+    return product, total, count
+
+
+def pca(cube, n_components=10, oversample=10, power_iterations=2, seed=None):
+    """Principal components of a cube by out-of-core randomized SVD.
+
+    Parameters
+    ----------
+    cube : Cube or array
+        Spectra of shape (lines, points, pixels). Arrays are wrapped in
+        a Cube.
+    n_components : int (optional)
+        Number of components to keep.
+    oversample : int (optional)
+        Extra random directions used to find the range of the spectra.
+    power_iterations : int (optional)
+        Extra passes that sharpen the range for slowly decaying spectra.
+    seed : int (optional)
+        Seed of the random directions.
+
+    Returns
+    -------
+    result : Decomposition
+        Unit-norm components ordered by explained variance, and the
+        scores of the mean-centered spectra.
+    """
+    cube = _as_cube(cube)
+    pixels = cube.shape[2]
+    rank = min(n_components + oversample, pixels)
+    basis = np.random.default_rng(seed).standard_normal((pixels, rank))
+    # Centering is applied to each product as X^T X - n mean mean^T
+    for _ in range(power_iterations + 1):
+        product, total, count = _gram_product(cube, basis)
+        mean = total / count
+        product -= count * np.outer(mean, mean @ basis)
+        basis, _ = np.linalg.qr(product)
+    product, _, _ = _gram_product(cube, basis)
+    product -= count * np.outer(mean, mean @ basis)
+    # Eigenvectors of the covariance projected onto the found range
+    values, vectors = np.linalg.eigh(basis.T @ product)
+    order = np.argsort(values)[::-1][:n_components]
+    components = (basis @ vectors[:, order]).T
+    explained = np.clip(values[order], 0, None) / max(count - 1, 1)
+
+    scores = np.empty(cube.shape[:2] + (len(components),))
+    for lines, data in cube.blocks():
+        centered = _spectra(data) - mean
+        scores[lines] = (centered @ components.T).reshape(
+            data.shape[:2] + (len(components),)
+        )
+    log.info("PCA of %s spectra kept %d components", count, len(components))
+    return Decomposition(components, scores, cube.wavelength, mean, explained)
+
+
+def nmf(cube, n_components=5, iterations=200, tol=1e-4, seed=None):
+    """Non-negative matrix factorization of a cube, out of core.
+
+    Minimizes the squared error of spectra ~ scores @ components with
+    Lee and Seung's multiplicative updates. Negative counts, e.g. after
+    background subtraction, are clipped to zero.
+
+    Parameters
+    ----------
+    cube : Cube or array
+        Spectra of shape (lines, points, pixels). Arrays are wrapped in
+        a Cube.
+    n_components : int (optional)
+        Number of components.
+    iterations : int (optional)
+        Maximum number of passes over the cube.
+    tol : float (optional)
+        Stop once the relative decrease of the error in a pass is
+        smaller than this.
+    seed : int (optional)
+        Seed of the random initialization.
+
+    Returns
+    -------
+    result : Decomposition
+        Components scaled to unit maximum, and non-negative scores.
+    """
+    cube = _as_cube(cube)
+    rng = np.random.default_rng(seed)
+    lines, points, pixels = cube.shape
+    # Start at the scale of the data, so neither factor dominates
+    scale = np.sqrt(max(float(cube.mean()), 1e-12) / n_components)
+    components = scale * rng.random((n_components, pixels))
+    scores = scale * rng.random((lines, points, n_components))
+    eps = np.finfo(float).eps
+    previous = np.inf
+    for iteration in range(iterations):
+        numerator = np.zeros_like(components)
+        gram = np.zeros((n_components, n_components))
+        error = 0.0
+        outer = components @ components.T
+        for block, data in cube.blocks():
+            spectra = np.clip(_spectra(data), 0, None)
+            weights = scores[block].reshape(-1, n_components)
+            weights *= (spectra @ components.T) / (weights @ outer + eps)
+            scores[block] = weights.reshape(data.shape[:2] + (n_components,))
+            numerator += weights.T @ spectra
+            gram += weights.T @ weights
+            error += np.sum((spectra - weights @ components) ** 2)
+        components *= numerator / (gram @ components + eps)
+        if error >= previous * (1 - tol):
+            break
+        previous = error
+    log.info("NMF stopped after %d passes", iteration + 1)
+    peak = components.max(axis=1, keepdims=True)
+    peak[peak == 0] = 1
+    return Decomposition(
+        components / peak,
+        scores * peak[:, 0],
+        cube.wavelength,
+        np.zeros(pixels),
+    )
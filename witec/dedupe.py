@@ -0,0 +1,316 @@
+"""This module finds and removes duplicate acquisitions in the data archive.
+
+`make data` syncs several network folders into data/, and the same
+acquisition often arrives more than once under different names. Files
+are identified by content: a SHA-256 of the whole file, and for .SPE
+files a second digest computed with the header fields that only hold
+file paths blanked out, so that copies saved under another name still
+match. Both digests are computed in one streaming pass per file, in a
+process pool, and cached by path, size and mtime so later runs only
+read new or changed files.
+
+Byte-identical duplicates can be replaced by hardlinks. Copies that
+differ only in those header fields can instead be removed and recorded
+in a manifest together with their original header, from which restore
+rebuilds them exactly.
+
+Hardlinked copies share the kept file's mtime and removed copies are
+gone, so a later `rsync -a` would transfer both again. Every copy is
+therefore also recorded in the manifest, and rsync_excludes turns it
+into patterns for rsync --exclude-from:
+
+>>> from witec.dedupe import dedupe, rsync_excludes
+
+>>> groups = dedupe("data")  # report only
+>>> dedupe("data", action="hardlink")
+>>> rsync_excludes("data/duplicates.jsonl", "data")
+['/folder/sync/a_1.SPE']
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import base64
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import re
+
+import witec.winspec
+
+log = logging.getLogger(__name__)
+
+# Stream files through the hash in blocks of this many bytes
+BLOCK_BYTES = 8 * 2**20
+
+SUFFIXES = (".SPE", ".WIP")
+
+# SPE header fields that only hold paths to other files
+FILENAME_FIELDS = (
+    "PulseFileName",
+    "AbsorbFileName",
+    "FlatField",
+    "background",
+    "blemish",
+)
+
+CACHE = ".dedupe_cache.json"
+MANIFEST = "duplicates.jsonl"
+
+_HEADER_BYTES = 4100
+
+
+def _masked_header(header):
+    """Blank the FILENAME_FIELDS of raw SPE header bytes."""
+    masked = bytearray(header)
+    for name in FILENAME_FIELDS:
+        field = getattr(witec.winspec.Header, name)
+        masked[field.offset : field.offset + field.size] = bytes(field.size)
+    return bytes(masked)
+
+
+def content_hash(path):
+    """Hash a file in one streaming pass.
+
+    Returns
+    -------
+    digests : dict
+        "exact", the SHA-256 of the file, and "content", which for .SPE
+        files ignores FILENAME_FIELDS and otherwise equals "exact".
+    """
+    exact = hashlib.sha256()
+    content = hashlib.sha256() if path.endswith(".SPE") else None
+    with open(path, "rb") as stream:
+        if content is not None:
+            header = stream.read(_HEADER_BYTES)
+            exact.update(header)
+            content.update(_masked_header(header))
+        while block := stream.read(BLOCK_BYTES):
+            exact.update(block)
+            if content is not None:
+                content.update(block)
+    exact = exact.hexdigest()
+    return {
+        "exact": exact,
+        "content": exact if content is None else content.hexdigest(),
+    }
+
+
+def _stat_files(directory):
+    files = {}
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if os.path.splitext(name)[1] in SUFFIXES:
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                files[path] = stat
+    return files
+
+
+def _load_cache(path):
+    try:
+        with open(path, "r", encoding="utf-8") as stream:
+            return json.load(stream)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save_cache(path, cache):
+    partial = f"{path}.partial"
+    with open(partial, "w", encoding="utf-8") as stream:
+        json.dump(cache, stream)
+    os.replace(partial, path)
+
+
+def hash_directory(directory, processes=None, cache=None):
+    """Hash every .SPE and .WIP file of a tree, reusing cached digests.
+
+    Parameters
+    ----------
+    directory : str
+        Root of the tree to hash.
+    processes : int (optional)
+        Number of worker processes. Defaults to the number of CPUs.
+    cache : str (optional)
+        JSON file of digests keyed by path, size and mtime. Defaults to
+        CACHE in `directory`.
+
+    Returns
+    -------
+    digests : dict
+        Maps each path to its content_hash and os.stat result.
+    """
+    cache = os.path.join(directory, CACHE) if cache is None else cache
+    cached = _load_cache(cache)
+    files = _stat_files(directory)
+    digests, pending = {}, []
+    for path, stat in files.items():
+        entry = cached.get(path)
+        unchanged = entry and entry["size"] == stat.st_size
+        if unchanged and entry["mtime_ns"] == stat.st_mtime_ns:
+            digests[path] = entry
+        else:
+            pending.append(path)
+    log.info("Hashing %d of %d files", len(pending), len(files))
+    if pending:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            for path, digest in zip(pending, pool.map(content_hash, pending)):
+                stat = files[path]
+                digest.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+                digests[path] = digest
+    _save_cache(cache, digests)
+    return {path: (digests[path], files[path]) for path in files}
+
+
+def find_duplicates(directory, processes=None, cache=None):
+    """Group files of a tree by content.
+
+    Returns
+    -------
+    groups : list of list of str
+        Paths sharing a suffix and content digest, oldest first, for
+        every group with more than one distinct file. Hardlinks to the
+        same inode count as one file.
+    """
+    return _group(hash_directory(directory, processes, cache))
+
+
+def _group(digests):
+    groups = {}
+    for path, (digest, stat) in digests.items():
+        key = (os.path.splitext(path)[1], digest["content"])
+        groups.setdefault(key, []).append((stat.st_mtime_ns, path, stat))
+    duplicates = []
+    for members in groups.values():
+        inodes = {(stat.st_dev, stat.st_ino) for _, _, stat in members}
+        if len(inodes) > 1:
+            duplicates.append([path for _, path, _ in sorted(members)])
+    return sorted(duplicates)
+
+
+def dedupe(directory, action="report", processes=None, cache=None, manifest=None):
+    """Find duplicate acquisitions and optionally remove the copies.
+
+    The oldest file of each group is kept.
+
+    Parameters
+    ----------
+    directory : str
+        Root of the tree to deduplicate.
+    action : {"report", "hardlink", "manifest"} (optional)
+        Only report groups; replace byte-identical copies with hardlinks
+        to the kept file; or also remove copies that differ in
+        FILENAME_FIELDS. Every replaced or removed copy is recorded in
+        the manifest.
+    processes, cache : (optional)
+        As in hash_directory.
+    manifest : str (optional)
+        JSON lines file of removed copies. Defaults to MANIFEST in
+        `directory`.
+
+    Returns
+    -------
+    groups : list of list of str
+        The duplicate groups found, as in find_duplicates.
+    """
+    if action not in ("report", "hardlink", "manifest"):
+        raise ValueError(f"Unknown dedupe action {action!r}")
+    digests = hash_directory(directory, processes, cache)
+    groups = _group(digests)
+    manifest = os.path.join(directory, MANIFEST) if manifest is None else manifest
+    saved = 0
+    for kept, *copies in groups:
+        for copy in copies:
+            log.info("%s duplicates %s", copy, kept)
+            if action == "report" or os.path.samefile(kept, copy):
+                continue
+            size = digests[copy][1].st_size
+            if digests[kept][0]["exact"] == digests[copy][0]["exact"]:
+                _hardlink(kept, copy)
+                _record(manifest, kept, copy, hardlink=True)
+                saved += size
+            elif action == "manifest":
+                _record(manifest, kept, copy)
+                os.remove(copy)
+                saved += size
+    log.info("Found %d duplicate groups, freed %d bytes", len(groups), saved)
+    return groups
+
+
+def _hardlink(target, path):
+    """Replace path by a hardlink to target, atomically."""
+    partial = f"{path}.partial"
+    os.link(target, partial)
+    os.replace(partial, path)
+
+
+def _record(manifest, kept, copy, hardlink=False):
+    """Append a copy, with the SPE header of a removed one, to the manifest."""
+    entry = {"path": copy, "duplicate_of": kept}
+    if hardlink:
+        entry["hardlink"] = True
+    elif copy.endswith(".SPE"):
+        with open(copy, "rb") as stream:
+            header = stream.read(_HEADER_BYTES)
+        entry["header"] = base64.b64encode(header).decode()
+    with open(manifest, "a", encoding="utf-8") as stream:
+        stream.write(json.dumps(entry) + "\n")
+
+
+def _entries(manifest):
+    with open(manifest, "r", encoding="utf-8") as stream:
+        return [json.loads(line) for line in stream if line.strip()]
+
+
+def rsync_excludes(manifest, directory):
+    """List the copies of a manifest as rsync exclude patterns.
+
+    Parameters
+    ----------
+    manifest : str
+        JSON lines file written by dedupe. A missing file has no copies.
+    directory : str
+        The rsync destination the copies were synced into, e.g. data.
+
+    Returns
+    -------
+    patterns : list of str
+        One pattern per copy, anchored at the top of the transfer, so
+        that `rsync --exclude-from` neither downloads removed copies
+        again nor overwrites hardlinks.
+    """
+    try:
+        entries = _entries(manifest)
+    except FileNotFoundError:
+        return []
+    patterns = []
+    for entry in entries:
+        relative = os.path.relpath(entry["path"], directory).replace(os.sep, "/")
+        pattern = "/" + re.sub(r"([*?\[\\])", r"\\\1", relative)
+        if pattern not in patterns:
+            patterns.append(pattern)
+    return patterns
+
+
+def restore(manifest):
+    """Recreate every copy removed into a manifest.
+
+    Returns
+    -------
+    restored : list of pathlib.Path
+    """
+    restored = []
+    for entry in _entries(manifest):
+        path = pathlib.Path(entry["path"])
+        if path.exists():
+            continue
+        partial = path.with_name(path.name + ".partial")
+        with open(entry["duplicate_of"], "rb") as source, open(partial, "wb") as out:
+            if "header" in entry:
+                out.write(base64.b64decode(entry["header"]))
+                source.seek(_HEADER_BYTES)
+            while block := source.read(BLOCK_BYTES):
+                out.write(block)
+        os.replace(partial, path)
+        restored.append(path)
+    return restored
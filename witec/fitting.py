@@ -0,0 +1,273 @@
+"""This module fits spectral peaks across every spectrum of a
+hyperspectral map.
+
+A map acquired with an external spectrometer is stored as a stack of
+frames in a single .SPE file, one spectrum per scan coordinate. Fitting
+each spectrum on its own with scipy.optimize is slow because every fit
+starts from the same crude guess. The fitting engine here walks the map
+in serpentine order so that each spectrum is seeded with the result of
+its spatial neighbour, and splits the walk into blocks that are fitted
+in parallel by a process pool.
+
+>>> from witec.spe import SPE
+>>> import witec.fitting as fitting
+
+>>> spe = SPE("path/to/map.SPE")
+>>> spectra = spe.spectra.reshape(lines, points_per_line, -1)
+>>> maps = fitting.fit_map(spectra, spe.axis, centers=[520.7], model="voigt")
+>>> maps["center_0"].shape
+(lines, points_per_line)
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+import numpy as np
+from scipy.optimize import least_squares
+from scipy.special import voigt_profile
+
+
+def lorentzian(x, amplitude, center, width):
+    """Lorentzian line shape with peak height `amplitude` and FWHM `width`."""
+    half = 0.5 * width
+    return amplitude * half**2 / ((x - center) ** 2 + half**2)
+
+
+def gaussian(x, amplitude, center, width):
+    """Gaussian line shape with peak height `amplitude` and FWHM `width`."""
+    return amplitude * np.exp(-4 * np.log(2) * (x - center) ** 2 / width**2)
+
+
+def voigt(x, amplitude, center, sigma, gamma):
+    """Voigt line shape with peak height `amplitude`.
+
+    `sigma` is the standard deviation of the Gaussian component and
+    `gamma` is the half-width at half-maximum of the Lorentzian
+    component, following scipy.special.voigt_profile.
+    """
+    return (
+        amplitude
+        * voigt_profile(x - center, sigma, gamma)
+        / voigt_profile(0, sigma, gamma)
+    )
+
+
+# Line shape and the names of its parameters, in call order
+MODELS = {
+    "lorentzian": (lorentzian, ("amplitude", "center", "width")),
+    "gaussian": (gaussian, ("amplitude", "center", "width")),
+    "voigt": (voigt, ("amplitude", "center", "sigma", "gamma")),
+}
+
+
+def parameter_names(model, npeaks):
+    """List the names of the fitted parameters for `npeaks` peaks.
+
+    Each peak contributes its line shape parameters suffixed by the peak
+    number, e.g. "center_0", followed by a shared constant "offset".
+    """
+    _, names = MODELS[model]
+    return [f"{name}_{i}" for i in range(npeaks) for name in names] + ["offset"]
+
+
+def multipeak(x, params, model="lorentzian"):
+    """Evaluate a sum of peaks on a constant offset.
+
+    Parameters
+    ----------
+    x : array
+        Spectral axis.
+    params : array
+        Flat parameter vector ordered as in parameter_names.
+    model : str
+        One of "lorentzian", "gaussian", or "voigt".
+    """
+    func, names = MODELS[model]
+    nparams = len(names)
+    npeaks = (len(params) - 1) // nparams
+    y = np.full(np.shape(x), params[-1], dtype=float)
+    for i in range(npeaks):
+        y += func(x, *params[i * nparams : (i + 1) * nparams])
+    return y
+
+
+def initial_guess(x, spectrum, centers, model="lorentzian", width=None):
+    """Estimate starting parameters from a spectrum and approximate centers.
+
+    Each center is moved to the strongest point of the spectrum within
+    one `width` of it. The offset is taken as the median of the spectrum
+    and each amplitude as the height above it at the moved center. The
+    default width spans ten spectral pixels.
+    """
+    x = np.asarray(x, dtype=float)
+    spectrum = np.asarray(spectrum, dtype=float)
+    if width is None:
+        width = 10 * np.abs(np.median(np.diff(x)))
+    offset = np.median(spectrum)
+    guess = []
+    for center in centers:
+        near = np.flatnonzero(np.abs(x - center) <= width)
+        if len(near):
+            peak = near[spectrum[near].argmax()]
+        else:
+            peak = np.abs(x - center).argmin()
+        center = x[peak]
+        height = max(spectrum[peak] - offset, 0.0)
+        if model == "voigt":
+            guess.extend([height, center, width / 4, width / 4])
+        else:
+            guess.extend([height, center, width])
+    guess.append(offset)
+    return np.array(guess)
+
+
+def _bounds(x, npeaks, model):
+    """Keep amplitudes and widths positive and centers on the axis."""
+    _, names = MODELS[model]
+    lower, upper = [], []
+    for _ in range(npeaks):
+        for name in names:
+            if name == "center":
+                lower.append(np.min(x))
+                upper.append(np.max(x))
+            else:
+                lower.append(0.0)
+                upper.append(np.inf)
+    lower.append(-np.inf)
+    upper.append(np.inf)
+    return np.array(lower), np.array(upper)
+
+
+def _residuals(params, x, y, model):
+    return multipeak(x, params, model) - y
+
+
+def _fit_block(x, spectra, centers, model, width):
+    """Fit a sequence of neighbouring spectra, seeding each fit with the last.
+
+    Returns the fitted parameters, the RMS residual and a success flag
+    for each spectrum. Failed fits are reported as NaN and the next
+    spectrum is seeded from its own initial_guess, as is the first.
+    """
+    lower, upper = _bounds(x, len(centers), model)
+    nparams = len(lower)
+    params = np.full((len(spectra), nparams), np.nan)
+    rms = np.full(len(spectra), np.nan)
+    success = np.zeros(len(spectra), dtype=bool)
+    seed = None
+    for i, y in enumerate(spectra):
+        if seed is None:
+            seed = initial_guess(x, y, centers, model=model, width=width)
+        p0 = np.clip(seed, lower, upper)
+        seed = None
+        try:
+            result = least_squares(
+                _residuals, p0, bounds=(lower, upper), args=(x, y, model)
+            )
+        except ValueError:
+            continue
+        if not result.success:
+            continue
+        params[i] = result.x
+        rms[i] = np.sqrt(np.mean(result.fun**2))
+        success[i] = True
+        seed = result.x
+    return params, rms, success
+
+
+def serpentine_order(lines, points_per_line):
+    """Return flat indices that visit a (lines, points) grid as a snake.
+
+    Even lines run left to right and odd lines right to left, so that
+    every consecutive pair of indices is a spatial neighbour.
+    """
+    order = np.arange(lines * points_per_line).reshape(lines, points_per_line)
+    order[1::2] = order[1::2, ::-1]
+    return order.ravel()
+
+
+def fit_map(
+    spectra,
+    axis,
+    centers,
+    model="lorentzian",
+    width=None,
+    window=None,
+    processes=None,
+    blocks=None,
+):
+    """Fit one or more peaks to every spectrum of a map.
+
+    Parameters
+    ----------
+    spectra : array
+        Spectra of shape (lines, points, pixels) for a 2D scan or
+        (n, pixels) for a series of acquisitions.
+    axis : array
+        Spectral axis of length pixels, e.g. SPE.axis.
+    centers : list of float
+        Approximate peak centers in units of `axis`; one peak is fitted
+        per entry.
+    model : str
+        Line shape, one of "lorentzian", "gaussian", or "voigt".
+    width : float (optional)
+        Starting FWHM of each peak in units of `axis`.
+    window : (float, float) (optional)
+        Only fit the part of the spectrum between these axis values.
+    processes : int (optional)
+        Number of worker processes. Defaults to the number of CPUs; a
+        value of 1 fits in the calling process.
+    blocks : int (optional)
+        Number of contiguous blocks the serpentine walk is split into.
+        Each block starts from a guess derived from its first spectrum.
+        Defaults to four blocks per worker.
+
+    Returns
+    -------
+    maps : dict
+        Parameter maps keyed by parameter_names, plus "rms" for the
+        residual and "success" for the fit status. Every map has the
+        spatial shape of `spectra`.
+    """
+    spectra = np.asarray(spectra)
+    x = np.asarray(axis, dtype=float)
+    shape = spectra.shape[:-1]
+    if window is not None:
+        keep = (x >= min(window)) & (x <= max(window))
+        x = x[keep]
+        spectra = spectra[..., keep]
+    flat = spectra.reshape(-1, spectra.shape[-1]).astype(float)
+    if len(shape) == 2:
+        order = serpentine_order(*shape)
+    else:
+        order = np.arange(len(flat))
+
+    processes = processes or os.cpu_count() or 1
+    blocks = blocks or (1 if processes == 1 else 4 * processes)
+    chunks = [chunk for chunk in np.array_split(order, blocks) if len(chunk)]
+
+    if processes == 1:
+        results = [
+            _fit_block(x, flat[chunk], centers, model, width) for chunk in chunks
+        ]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [
+                pool.submit(_fit_block, x, flat[chunk], centers, model, width)
+                for chunk in chunks
+            ]
+            results = [future.result() for future in futures]
+
+    names = parameter_names(model, len(centers))
+    params = np.empty((len(flat), len(names)))
+    rms = np.empty(len(flat))
+    success = np.empty(len(flat), dtype=bool)
+    for chunk, (block_params, block_rms, block_success) in zip(chunks, results):
+        params[chunk] = block_params
+        rms[chunk] = block_rms
+        success[chunk] = block_success
+
+    maps = {name: params[:, i].reshape(shape) for i, name in enumerate(names)}
+    maps["rms"] = rms.reshape(shape)
+    maps["success"] = success.reshape(shape)
+    return maps
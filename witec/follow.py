@@ -0,0 +1,179 @@
+"""This module mirrors an SPE file into HDF5 while WinSpec still writes it.
+
+During a long kinetic series or map, the .SPE file on the share grows by
+one frame of xdim * ydim values at a time. SpeFollower remembers how
+many frames it has already copied, reads only the frames completed past
+that offset on each poll, and appends them to a resizable HDF5 dataset.
+
+The HDF5 file is written in single-writer/multiple-reader (SWMR) mode,
+so previews and QC can read the frames collected so far while the
+acquisition continues:
+
+>>> from witec.follow import SpeFollower
+
+>>> follower = SpeFollower("data/sample_loc_id_map_20230615-1324_1.SPE")
+>>> follower.run(interval=1)  # until NumFrames arrive or the file goes idle
+
+and, in another process,
+
+>>> output = "data/sample_loc_id_map_20230615-1324_1.hdf5"
+>>> with h5py.File(output, "r", swmr=True) as h5:
+...     frames = h5["spe/data"]
+...     frames.refresh()
+...     latest = frames[-1]
+"""
+
+import logging
+import os
+import pathlib
+import time
+
+import h5py
+import numpy as np
+
+from witec.convert import H5_CHUNK_BYTES, chunk_shape, dataset_filters, write_attrs
+from witec.utils import as_builtin
+import witec.winspec
+
+log = logging.getLogger(__name__)
+
+# Size of the SPE header that precedes the frames
+HEADER_BYTES = 4100
+
+
+class SpeFollower:
+    """Append the completed frames of a growing SPE file to HDF5.
+
+    Parameters
+    ----------
+    filename : str
+        The .SPE file being acquired.
+    output : str (optional)
+        HDF5 file to create. Defaults to the SPE path with .hdf5.
+    points_per_line : int (optional)
+        Scan points per line, used to choose chunks as in convert.
+    compression, compression_opts : (optional)
+        HDF5 filter for the frames, as in convert.
+    """
+
+    def __init__(
+        self,
+        filename,
+        output=None,
+        points_per_line=None,
+        compression="gzip",
+        compression_opts=1,
+    ):
+        self.filename = pathlib.Path(filename)
+        self.output = pathlib.Path(
+            self.filename.with_suffix(".hdf5") if output is None else output
+        )
+        spe = witec.winspec.SpeFile(filename)
+        header = spe.header
+        self.expected = header.NumFrames
+        self.dtype = np.dtype(witec.winspec.SpeFile._datatype_map[header.datatype])
+        self.frame_shape = (header.ydim, header.xdim)
+        self.frame_bytes = header.xdim * header.ydim * self.dtype.itemsize
+        # Same orientation fix as SpeFile._read
+        self.flip = (spe.reversed is True) != (spe.adc == "100 KHz")
+        self.frames = 0
+
+        shape = (max(1, self.expected), header.xdim, header.ydim)
+        chunks = chunk_shape(shape, self.dtype.itemsize, points_per_line)
+        if chunks is None:
+            # Resizable datasets must be chunked, even when small
+            frames = max(1, H5_CHUNK_BYTES // self.frame_bytes)
+            chunks = (min(shape[0], frames),) + shape[1:]
+        filters = dataset_filters(compression, compression_opts)
+
+        self.h5 = h5py.File(self.output, "w", libver="latest")
+        group = self.h5.create_group("spe")
+        self.data = group.create_dataset(
+            "data",
+            shape=(0,) + shape[1:],
+            maxshape=(None,) + shape[1:],
+            dtype=self.dtype,
+            chunks=chunks,
+            shuffle=bool(filters),
+            **filters,
+        )
+        if points_per_line:
+            self.data.attrs["points_per_line"] = points_per_line
+        group.create_dataset("wavelength", data=spe.xaxis)
+        group["wavelength"].attrs["label"] = spe.xaxis_label.rstrip("\x00")
+        write_attrs(group, as_builtin(header))
+        # Attributes are fixed from here on, while readers may attach
+        self.h5.swmr_mode = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.h5.close()
+
+    @property
+    def complete(self):
+        """Whether all NumFrames announced by the header were copied."""
+        return self.expected > 0 and self.frames >= self.expected
+
+    def poll(self):
+        """Append the frames completed since the last poll.
+
+        Returns
+        -------
+        new : int
+            Number of frames appended.
+        """
+        size = os.stat(self.filename).st_size
+        available = max(0, size - HEADER_BYTES) // self.frame_bytes
+        if self.expected > 0:
+            available = min(available, self.expected)
+        new = available - self.frames
+        if new <= 0:
+            return 0
+        with open(self.filename, "rb") as raw:
+            raw.seek(HEADER_BYTES + self.frames * self.frame_bytes)
+            block = raw.read(new * self.frame_bytes)
+        frames = np.frombuffer(block, dtype=self.dtype).reshape(-1, *self.frame_shape)
+        if self.flip:
+            frames = frames[:, :, ::-1]
+        self.data.resize(available, axis=0)
+        self.data[self.frames : available] = frames.transpose(0, 2, 1)
+        self.data.flush()
+        self.frames = available
+        log.debug("Appended %d frames of %s", new, self.filename)
+        return new
+
+    def run(self, interval=1.0, idle=60):
+        """Poll until the acquisition is complete or stops growing.
+
+        Parameters
+        ----------
+        interval : float (optional)
+            Seconds between polls.
+        idle : int (optional)
+            Stop after this many polls without a new frame, for series
+            whose header does not announce NumFrames.
+
+        Returns
+        -------
+        frames : int
+            Number of frames copied.
+        """
+        quiet = 0
+        try:
+            while not self.complete and quiet < idle:
+                quiet = 0 if self.poll() else quiet + 1
+                if not self.complete:
+                    time.sleep(interval)
+        except KeyboardInterrupt:
+            log.info("Stopped following %s", self.filename)
+        finally:
+            self.close()
+        log.info(
+            "Copied %d frames of %s to %s", self.frames, self.filename, self.output
+        )
+        return self.frames
@@ -0,0 +1,175 @@
+"""This module maps the acquisitions of a spectral map to scan positions.
+
+A map of `lines` x `points_per_line` spectra is acquired line by line,
+so acquisition i sits at column i % points_per_line of row
+i // points_per_line. ScanGrid builds the coordinates of every
+acquisition at once with broadcasting, and looks positions up with
+binary searches over the sorted axes instead of scanning every
+acquisition, so a click on a 512 x 512 heatmap finds its spectrum in
+O(log n).
+
+>>> from witec.grid import ScanGrid
+
+>>> grid = ScanGrid(points_per_line=98, lines=98, width=98e-6, height=98e-6)
+>>> grid.values.shape  # (x, y) of every acquisition, in acquisition order
+(9604, 2)
+>>> index = grid.index(60e-6, 54e-6)  # acquisition nearest to a position
+>>> spectrum = spe.spectra[index]
+>>> ax.imshow(image.reshape(grid.shape), extent=grid.extent)
+"""
+
+import numpy as np
+
+from witec.utils import metadata_from_wip
+from witec.wip_info import typed_info
+
+
+def nearest_index(coords, values):
+    """Return the index of the coordinate closest to each value.
+
+    Parameters
+    ----------
+    coords : array
+        Sorted coordinates, ascending or descending, e.g. a spectral axis.
+    values : float or array
+        Values to look up.
+
+    Returns
+    -------
+    index : int or array of int
+        Positions in `coords`, found by binary search. Values halfway
+        between two coordinates resolve to the lower index.
+    """
+    coords = np.asarray(coords)
+    values = np.asarray(values)
+    if len(coords) < 2:
+        index = np.zeros(values.shape, dtype=np.intp)
+        return index[()] if index.ndim == 0 else index
+    if coords[0] > coords[-1]:
+        # Negating a descending axis keeps the indices of the original
+        coords, values = -coords, -values
+    right = np.clip(np.searchsorted(coords, values), 1, len(coords) - 1)
+    left = right - 1
+    closer_left = np.abs(values - coords[left]) <= np.abs(coords[right] - values)
+    index = np.where(closer_left, left, right)
+    return index[()] if index.ndim == 0 else index
+
+
+class ScanGrid:
+    """Scan coordinates of a spectral map acquired line by line.
+
+    Parameters
+    ----------
+    points_per_line, lines : int
+        Number of acquisitions along x in every line, and of lines.
+    width, height : float (optional)
+        Size of the scanned area. Default to the number of points and
+        lines, so that coordinates are indices.
+    unit : str (optional)
+        Unit of width and height, used for axis labels. Defaults to
+        "index" when neither is given.
+    serpentine : bool (optional)
+        Whether odd lines were acquired in reverse, as in scan_view.
+
+    Notes
+    -----
+    Acquisition (column, row) sits at (column * width / points_per_line,
+    row * height / lines), with row 0 at the top of an image.
+    """
+
+    def __init__(
+        self,
+        points_per_line,
+        lines,
+        width=None,
+        height=None,
+        unit=None,
+        serpentine=False,
+    ):
+        self.points_per_line = int(points_per_line)
+        self.lines = int(lines)
+        self.width = self.points_per_line if width is None else float(width)
+        self.height = self.lines if height is None else float(height)
+        if unit is None and width is None and height is None:
+            unit = "index"
+        self.unit = unit
+        self.serpentine = serpentine
+        self.x = np.arange(self.points_per_line) * self.width / self.points_per_line
+        self.y = np.arange(self.lines) * self.height / self.lines
+
+    @classmethod
+    def from_info(cls, info):
+        """Build the grid described by a typed_info dict."""
+        return cls(
+            info["Points per Line"],
+            info["Lines per Image"],
+            info.get("Scan Width (m)"),
+            info.get("Scan Height (m)"),
+            unit="m",
+        )
+
+    @classmethod
+    def from_wip(cls, filename):
+        """Build the grid of the first data object of a project that has one."""
+        for fields in metadata_from_wip(filename).values():
+            info = typed_info(fields)
+            if "Points per Line" in info and "Lines per Image" in info:
+                return cls.from_info(info)
+        raise KeyError(f"{filename} does not record a scan geometry")
+
+    def __repr__(self):
+        return (
+            f"ScanGrid(points_per_line={self.points_per_line}, lines={self.lines}, "
+            f"width={self.width}, height={self.height}, unit={self.unit!r})"
+        )
+
+    def __len__(self):
+        return self.points_per_line * self.lines
+
+    @property
+    def shape(self):
+        """(lines, points_per_line), the shape of a map image."""
+        return self.lines, self.points_per_line
+
+    @property
+    def indices(self):
+        """(column, row) of every acquisition, shape (len(self), 2)."""
+        rows, columns = np.meshgrid(
+            np.arange(self.lines), np.arange(self.points_per_line), indexing="ij"
+        )
+        if self.serpentine:
+            columns[1::2] = columns[1::2, ::-1]
+        return np.stack([columns.ravel(), rows.ravel()], axis=1)
+
+    @property
+    def values(self):
+        """(x, y) coordinates of every acquisition, shape (len(self), 2)."""
+        columns, rows = self.indices.T
+        return np.stack([self.x[columns], self.y[rows]], axis=1)
+
+    @property
+    def extent(self):
+        """(left, right, bottom, top) for matplotlib's imshow."""
+        return self.x[0], self.x[-1], self.y[-1], self.y[0]
+
+    def pixel(self, x, y):
+        """Return the (column, row) nearest to a position."""
+        return nearest_index(self.x, x), nearest_index(self.y, y)
+
+    def index(self, x, y):
+        """Return the acquisition nearest to a position.
+
+        x and y may be arrays, in which case an array of indices with
+        their broadcast shape is returned.
+        """
+        column, row = self.pixel(x, y)
+        if self.serpentine:
+            column = np.where(row % 2, self.points_per_line - 1 - column, column)
+        return (row * self.points_per_line + column)[()]
+
+    def position(self, index):
+        """Return the (x, y) coordinates of an acquisition index."""
+        row, column = np.divmod(index, self.points_per_line)
+        if self.serpentine:
+            column = np.where(row % 2, self.points_per_line - 1 - column, column)
+        return self.x[column], self.y[row]
@@ -0,0 +1,87 @@
+"""This module builds integrated-intensity images from spectral maps.
+
+Integrating the counts between two wavelengths at every pixel is the
+most common way to turn a hyperspectral map into an image. Summing the
+window again every time it changes scales with the window width, which
+makes dragging a window in a viewer sluggish. BandMap instead builds a
+cumulative-sum table along the spectral axis once per cube, after which
+any window is the difference of two planes of that table.
+
+>>> from witec.spe import SPE
+>>> from witec.maps import BandMap
+
+>>> spe = SPE("path/to/map.SPE")
+>>> cube = spe.spectra.reshape(lines, points_per_line, -1)
+>>> bands = BandMap(cube, spe.axis)
+>>> image = bands.image(690, 697)
+>>> images = bands.images([(690, 697), (700, 710)])
+"""
+
+import numpy as np
+
+
+class BandMap:
+    """Cumulative-sum table of a spectral cube for fast band integration.
+
+    Parameters
+    ----------
+    cube : array
+        Spectra with the spectral axis last, e.g. (lines, points, pixels).
+    axis : array
+        Spectral axis of length pixels, e.g. SPEAxis.values or SPE.axis.
+        A descending axis is handled by reversing it.
+    dtype : numpy dtype (optional)
+        Accumulator type of the table. Defaults to int64 for integer
+        data and float64 otherwise.
+
+    Notes
+    -----
+    The table is stored with the spectral axis first, so every window
+    lookup reads two contiguous image planes regardless of its width.
+    """
+
+    def __init__(self, cube, axis, dtype=None):
+        cube = np.asarray(cube)
+        axis = np.asarray(axis, dtype=float)
+        if cube.shape[-1] != len(axis):
+            raise ValueError(
+                f"Cube has {cube.shape[-1]} spectral pixels but axis has {len(axis)}"
+            )
+        if dtype is None:
+            dtype = np.int64 if np.issubdtype(cube.dtype, np.integer) else np.float64
+        spectral_first = np.moveaxis(cube, -1, 0)
+        if len(axis) > 1 and axis[0] > axis[-1]:
+            axis = axis[::-1]
+            spectral_first = spectral_first[::-1]
+        self.axis = axis
+        self.shape = cube.shape[:-1]
+        self._table = np.zeros((len(axis) + 1,) + self.shape, dtype=dtype)
+        np.cumsum(spectral_first, axis=0, dtype=dtype, out=self._table[1:])
+
+    def indices(self, start, end):
+        """Return the half-open pixel range [first, last) inside a window."""
+        low, high = sorted((start, end))
+        first = np.searchsorted(self.axis, low, side="left")
+        last = np.searchsorted(self.axis, high, side="right")
+        return int(first), int(last)
+
+    def image(self, start, end):
+        """Integrate counts between two axis values (inclusive) at every pixel."""
+        first, last = self.indices(start, end)
+        return self._table[last] - self._table[first]
+
+    def images(self, windows):
+        """Stack one integrated image per (start, end) window."""
+        ranges = np.array([self.indices(start, end) for start, end in windows])
+        if not len(ranges):
+            return np.empty((0,) + self.shape, dtype=self._table.dtype)
+        return self._table[ranges[:, 1]] - self._table[ranges[:, 0]]
+
+
+def band_maps(cube, axis, windows):
+    """Integrate a cube over several wavelength windows at once.
+
+    Convenience wrapper around BandMap for one-off use; keep a BandMap
+    around when the same cube is integrated repeatedly.
+    """
+    return BandMap(cube, axis).images(windows)
@@ -29,8 +29,10 @@ ref: https://github.com/ElsevierSoftwareX/SOFTX-D-20-00088/blob/15d72d95c9585ab7
 """
 import collections.abc
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, field
 import logging
+import re
 import struct
 
 import witec.text_tools
@@ -38,6 +40,22 @@ import witec.text_tools
 log = logging.getLogger()
 
 
+# Numpy equivalents of the numeric WIT tag data types
+NUMPY_DTYPES = {
+    1: "<u4",
+    2: "<f8",
+    3: "<f4",
+    4: "<i8",
+    5: "<i4",
+    6: "<u2",
+    7: "u1",
+    8: "?",
+}
+
+# Data objects, e.g. "Data 1", in the "WITec Project/Data" tree
+_DATA_NAME = re.compile(r"Data \d+")
+
+
 # ref: https://stackoverflow.com/a/32935278
 def map_nested_dicts_modify(dictionary, func):
     """Apply a function to all byte items of a dictionary, recursively."""
@@ -170,3 +188,147 @@ class Witec:
         if data is None:
             data = self.data[f"Data {num}"]
         return data["TDStream"]["StreamData"]
+
+
+def iter_tags(raw, start, end):
+    """Yield (name, dtype, start, end) of the tags between two offsets.
+
+    Only the tag headers are read; payloads are skipped with seek. `raw`
+    is a WIT file opened in binary mode, and the tags of the whole file
+    lie between offset 8, after the file type, and the end of the file.
+    """
+    position = start
+    while position < end:
+        raw.seek(position)
+        name_length = struct.unpack("<I", raw.read(4))[0]
+        name = raw.read(name_length).decode("windows-1252")
+        dtype, data_start, data_end = struct.unpack("<IQQ", raw.read(20))
+        yield name, dtype, data_start, data_end
+        position = data_end
+
+
+def _child(raw, start, end, name):
+    """Find the tree tag with the given name between two offsets."""
+    for tag, dtype, data_start, data_end in iter_tags(raw, start, end):
+        if tag == name and dtype == 0:
+            return data_start, data_end
+    return None
+
+
+def _stream_offsets(raw, file):
+    """Yield (name, start, end) of the StreamData of every data object."""
+    end = raw.seek(0, 2)
+    project = _child(raw, 8, end, "WITec Project")
+    data = project and _child(raw, *project, "Data")
+    if data is None:
+        raise KeyError(f"{file} has no WITec Project/Data tree")
+    for name, dtype, start, stop in iter_tags(raw, *data):
+        if dtype != 0 or not _DATA_NAME.fullmatch(name):
+            continue
+        stream = _child(raw, start, stop, "TDStream")
+        if stream is None:
+            continue
+        for tag, _, info_start, info_end in iter_tags(raw, *stream):
+            if tag == "StreamData":
+                yield name, info_start, info_end
+                break
+
+
+def _info_text(info):
+    """Plain text of a rich-text info stream, or None for other streams."""
+    if not info.startswith(b"{\\rtf"):
+        return None
+    text = witec.text_tools.striprtf(info)
+    # Drop the hidden b'\x00' at the end, as Witec does
+    return text[:-1] if text.endswith("\x00") else text
+
+
+def _read_info(file, start, end):
+    """Plain text of one info stream, run as a task of bulk_info_streams.
+
+    Returns None for streams that are not rich text, and False, after
+    logging the error, for streams that cannot be read or stripped.
+    """
+    try:
+        with open(file, "rb") as raw:
+            raw.seek(start)
+            return _info_text(raw.read(end - start))
+    except Exception as error:  # pylint: disable=broad-except
+        log.warning("Could not read an info stream of %s: %s", file, error)
+        return False
+
+
+def info_streams(file):
+    """Read the information text of every data object without the data.
+
+    Witec decodes the whole project, which scales with the size of the
+    stored spectra and images. This walks the tag headers by offset and
+    decodes only the Data N/TDStream/StreamData streams, so the cost
+    depends on the number of tags rather than the size of the file.
+
+    Parameters
+    ----------
+    file : str
+        Path to a WITec Project file, with .WIP extension.
+
+    Returns
+    -------
+    streams : dict
+        Plain text of each rich-text info stream, keyed by data name,
+        e.g. {"Data 1": "Spectrum Information..."}.
+    """
+    streams = {}
+    with open(file, "rb") as raw:
+        for name, start, end in list(_stream_offsets(raw, file)):
+            raw.seek(start)
+            text = _info_text(raw.read(end - start))
+            if text is not None:
+                streams[name] = text
+    return streams
+
+
+def bulk_info_streams(files, processes=None):
+    """Read the information text of many projects in a worker pool.
+
+    The tag headers of each project are walked in the calling process,
+    then every info stream is read and stripped of its rich-text
+    formatting as a separate task, so a single project with hundreds of
+    data objects is spread over the pool as well as many small ones.
+
+    Parameters
+    ----------
+    files : iterable of str
+        Paths to WITec Project files.
+    processes : int (optional)
+        Number of worker processes. Defaults to the number of CPUs. A
+        value of 1 reads in the calling process.
+
+    Returns
+    -------
+    streams : dict
+        The info_streams of each file, keyed by file. Projects whose tag
+        tree or any info stream cannot be read are logged and left out.
+    """
+    streams, tasks = {}, []
+    for file in files:
+        try:
+            with open(file, "rb") as raw:
+                offsets = list(_stream_offsets(raw, file))
+        except (OSError, KeyError, struct.error, UnicodeDecodeError) as error:
+            log.warning("Could not read info streams of %s: %s", file, error)
+            continue
+        streams[file] = {}
+        tasks.extend((file, name, start, end) for name, start, end in offsets)
+    files, names, starts, ends = zip(*tasks) if tasks else ((),) * 4
+    if processes == 1 or len(tasks) < 2:
+        texts = list(map(_read_info, files, starts, ends))
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            texts = list(pool.map(_read_info, files, starts, ends, chunksize=16))
+    failed = set()
+    for file, name, text in zip(files, names, texts):
+        if text is False:
+            failed.add(file)
+        elif text is not None:
+            streams[file][name] = text
+    return {file: text for file, text in streams.items() if file not in failed}
@@ -0,0 +1,218 @@
+"""This module caches multi-resolution band images of spectral maps.
+
+Plotting the integrated intensity of a 2048 x 2048 map means reading
+every spectrum of the map first. TilePyramid does that once per
+wavelength window and keeps the result in a sidecar HDF5 file next to
+the .SPE file: the full-resolution band image plus successively halved
+copies of it, pooled by mean and by max, down to a single tile. Every
+level is stored in square chunks of one tile, so a viewer can draw an
+overview from a small level immediately and read only the tiles of the
+visible region at full resolution.
+
+>>> from witec.pyramid import TilePyramid
+
+>>> with TilePyramid("data/sample_loc_id_map_20230615-1324_1.SPE") as pyramid:
+...     overview = pyramid.overview(690, 697, max_size=512)
+...     level = pyramid.level_for(690, 697, 1024)
+...     detail = pyramid.region(690, 697, 0, slice(0, 256), slice(512, 768))
+
+The sidecar is rebuilt when the .SPE file changes.
+"""
+
+import logging
+import os
+import pathlib
+
+import h5py
+import numpy as np
+
+from witec.convert import dataset_filters, scan_geometry
+from witec.cube import Cube
+from witec.utils import metadata_from_wip
+
+log = logging.getLogger(__name__)
+
+# Edge length of the square tiles each level is chunked into
+TILE = 256
+
+REDUCTIONS = ("mean", "max")
+
+
+def sidecar_path(filename):
+    """Where the pyramid of an .SPE file is cached."""
+    filename = pathlib.Path(filename)
+    return filename.with_name(filename.stem + ".pyramid.hdf5")
+
+
+def pool(image, reduction="mean"):
+    """Halve an image by pooling blocks of 2 x 2 pixels.
+
+    Odd edges are pooled over the pixels that exist. The result is
+    float64 for "mean" and keeps the image dtype for "max".
+    """
+    rows, columns = image.shape
+    padded_shape = (rows + rows % 2, columns + columns % 2)
+    if reduction == "mean":
+        padded = np.full(padded_shape, np.nan)
+        padded[:rows, :columns] = image
+        blocks = padded.reshape(padded_shape[0] // 2, 2, padded_shape[1] // 2, 2)
+        return np.nanmean(blocks, axis=(1, 3))
+    if reduction == "max":
+        if np.issubdtype(image.dtype, np.integer):
+            fill = np.iinfo(image.dtype).min
+        else:
+            fill = -np.inf
+        padded = np.full(padded_shape, fill, dtype=image.dtype)
+        padded[:rows, :columns] = image
+        blocks = padded.reshape(padded_shape[0] // 2, 2, padded_shape[1] // 2, 2)
+        return blocks.max(axis=(1, 3))
+    raise ValueError(f"Unknown reduction {reduction!r}")
+
+
+def build_levels(image, reduction="mean", tile=TILE):
+    """Halve an image repeatedly until it fits in one tile.
+
+    Returns
+    -------
+    levels : list of array
+        The image itself, then each pooled level, coarsest last.
+    """
+    levels = [np.asarray(image)]
+    while max(levels[-1].shape) > tile:
+        levels.append(pool(levels[-1], reduction))
+    return levels
+
+
+class TilePyramid:
+    """Cached band-image pyramids of a spectral map.
+
+    Parameters
+    ----------
+    filename : str
+        The .SPE file of the map.
+    points_per_line, lines : int (optional)
+        Geometry of the map. Default to the values recorded in the
+        similarly named .WIP file.
+    tile : int (optional)
+        Edge length of the stored chunks and of the coarsest level.
+    sidecar : str (optional)
+        HDF5 file holding the pyramids. Defaults to sidecar_path.
+    compression, compression_opts : (optional)
+        HDF5 filter of the stored levels, as in convert.
+    """
+
+    def __init__(
+        self,
+        filename,
+        points_per_line=None,
+        lines=None,
+        tile=TILE,
+        sidecar=None,
+        compression="gzip",
+        compression_opts=1,
+    ):
+        self.filename = pathlib.Path(filename)
+        if points_per_line is None:
+            wip = self.filename.with_suffix(".WIP")
+            points_per_line, recorded = scan_geometry({"WIP": metadata_from_wip(wip)})
+            lines = lines or recorded
+            if points_per_line is None:
+                raise ValueError(f"{wip} does not record the points per line")
+        self.cube = Cube.from_spe(self.filename, points_per_line, lines)
+        self.tile = tile
+        self.filters = dataset_filters(compression, compression_opts)
+        self.sidecar = pathlib.Path(sidecar or sidecar_path(self.filename))
+        self.h5 = h5py.File(self.sidecar, "a")
+        stat = os.stat(self.filename)
+        source = {
+            "source_size": stat.st_size,
+            "source_mtime_ns": stat.st_mtime_ns,
+            "shape": self.cube.shape[:2],
+            "tile": tile,
+        }
+        if any(
+            np.any(self.h5.attrs.get(key) != value) for key, value in source.items()
+        ):
+            log.debug("Starting pyramid cache %s", self.sidecar)
+            for name in list(self.h5):
+                del self.h5[name]
+            self.h5.attrs.update(source)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.h5.close()
+
+    @staticmethod
+    def _name(start, end):
+        # repr round-trips a float, so distinct windows never share a group
+        low, high = sorted((float(start), float(end)))
+        return f"{low!r}-{high!r}"
+
+    def levels(self, start, end, reduction="mean"):
+        """Return the stored levels of a window, building them if needed.
+
+        Parameters
+        ----------
+        start, end : float
+            Wavelength window, inclusive, integrated at every pixel.
+        reduction : {"mean", "max"} (optional)
+            How the halved levels pool their 2 x 2 blocks.
+
+        Returns
+        -------
+        levels : list of h5py.Dataset
+            Full resolution first, coarsest last. Datasets are read
+            lazily, e.g. levels[0][rows, columns].
+        """
+        if reduction not in REDUCTIONS:
+            raise ValueError(f"Unknown reduction {reduction!r}")
+        name = self._name(start, end)
+        if name not in self.h5:
+            self._build(name, start, end)
+        group = self.h5[name][reduction]
+        return [group[str(level)] for level in range(len(group))]
+
+    def _build(self, name, start, end):
+        log.info("Building %s pyramid of %s", name, self.filename)
+        image = self.cube.sel(wavelength=(start, end)).sum(axis=2)
+        band = self.h5.create_group(name)
+        for reduction in REDUCTIONS:
+            group = band.create_group(reduction)
+            for level, data in enumerate(build_levels(image, reduction, self.tile)):
+                if level == 0 and reduction != REDUCTIONS[0]:
+                    # The full-resolution image is shared, not copied
+                    group["0"] = band[REDUCTIONS[0]]["0"]
+                    continue
+                group.create_dataset(
+                    str(level),
+                    data=data,
+                    chunks=tuple(min(self.tile, n) for n in data.shape),
+                    **self.filters,
+                )
+        self.h5.flush()
+
+    def level_for(self, start, end, max_size, reduction="mean"):
+        """Index of the finest level no larger than max_size on either side."""
+        levels = self.levels(start, end, reduction)
+        for index, level in enumerate(levels):
+            if max(level.shape) <= max_size:
+                return index
+        return len(levels) - 1
+
+    def overview(self, start, end, max_size=TILE, reduction="mean"):
+        """Read the finest whole level that fits in max_size pixels."""
+        index = self.level_for(start, end, max_size, reduction)
+        return self.levels(start, end, reduction)[index][()]
+
+    def region(self, start, end, level, rows, columns, reduction="mean"):
+        """Read a region of one level, e.g. the visible part of a plot.
+
+        rows and columns are slices in the pixels of that level; only the
+        tiles they overlap are read from disk.
+        """
+        return self.levels(start, end, reduction)[level][rows, columns]
@@ -0,0 +1,136 @@
+"""This module arranges a stack of frames into the lines of a map scan.
+
+A map acquires points_per_line frames per line, so frame i belongs to
+line i // points_per_line. In a raster scan it sits at point
+i % points_per_line of that line. In a serpentine (snake) scan every
+odd line is acquired backwards, so it sits at the mirrored point.
+
+scan_view exposes frames as (lines, points_per_line, ...) without
+copying them. A raster scan of an in-memory or memory-mapped array is a
+plain reshape. Serpentine scans, and frames that cannot be reshaped
+such as h5py datasets, are wrapped in ScanFrames, which maps every
+(line, point) index to its frame with arithmetic and only reads the
+frames that are selected.
+
+>>> from witec.scan import scan_view
+
+>>> cube = scan_view(spe.data, points_per_line=200, serpentine=True)
+>>> line = cube[3]  # (points_per_line, xdim, ydim), in position order
+"""
+
+import numpy as np
+
+
+def _lines(frames, points_per_line, lines):
+    available = len(frames) // points_per_line
+    if lines is None:
+        return available
+    if lines * points_per_line > len(frames):
+        raise ValueError(
+            f"{len(frames)} frames are fewer than "
+            f"{lines} lines x {points_per_line} points"
+        )
+    return lines
+
+
+def scan_view(frames, points_per_line, lines=None, serpentine=False):
+    """View a stack of frames as (lines, points_per_line, ...) frames.
+
+    Parameters
+    ----------
+    frames : array-like
+        Frames in acquisition order along the first axis, e.g. SpeFile.data,
+        a numpy.memmap or an h5py.Dataset.
+    points_per_line : int
+        Number of frames acquired per line.
+    lines : int (optional)
+        Number of lines. Defaults to as many complete lines as there are
+        frames; frames past the last complete line are left out.
+    serpentine : bool (optional)
+        Whether odd lines were acquired in reverse.
+
+    Returns
+    -------
+    cube : numpy.ndarray or ScanFrames
+        A reshaped view of `frames` for raster numpy arrays, else a
+        ScanFrames. Neither copies the frames.
+    """
+    points_per_line = int(points_per_line)
+    lines = _lines(frames, points_per_line, lines)
+    if serpentine or not isinstance(frames, np.ndarray):
+        return ScanFrames(frames, points_per_line, lines, serpentine)
+    frames = frames[: lines * points_per_line]
+    return frames.reshape((lines, points_per_line) + frames.shape[1:])
+
+
+class ScanFrames:
+    """A lazy (lines, points_per_line, ...) view of frames in scan order.
+
+    Supports integer, slice and integer-array indices on the first two
+    axes, followed by any index of the frames themselves. An Ellipsis
+    expands as in numpy; None (numpy.newaxis) is not supported.
+    """
+
+    def __init__(self, frames, points_per_line, lines=None, serpentine=False):
+        self.frames = frames
+        self.points_per_line = int(points_per_line)
+        self.lines = _lines(frames, self.points_per_line, lines)
+        self.serpentine = serpentine
+        self.shape = (self.lines, self.points_per_line) + tuple(frames.shape[1:])
+        self.dtype = frames.dtype
+        self.ndim = len(self.shape)
+
+    def __repr__(self):
+        return f"ScanFrames(shape={self.shape}, serpentine={self.serpentine})"
+
+    def __len__(self):
+        return self.lines
+
+    def frame_index(self, line, point):
+        """Index into the frames of the given line(s) and point(s)."""
+        line, point = np.asarray(line), np.asarray(point)
+        if self.serpentine:
+            point = np.where(line % 2, self.points_per_line - 1 - point, point)
+        return line * self.points_per_line + point
+
+    def _expand(self, key):
+        """Spell a key out as one entry per axis, at least for the first two."""
+        if not isinstance(key, tuple):
+            key = (key,)
+        if any(k is None for k in key):
+            raise IndexError("ScanFrames does not support None (numpy.newaxis)")
+        ellipses = [i for i, k in enumerate(key) if k is Ellipsis]
+        if len(ellipses) > 1:
+            raise IndexError("an index can only have a single ellipsis ('...')")
+        if ellipses:
+            i = ellipses[0]
+            fill = (slice(None),) * (self.ndim - len(key) + 1)
+            key = key[:i] + fill + key[i + 1 :]
+        if len(key) > self.ndim:
+            raise IndexError(
+                f"too many indices: ScanFrames has {self.ndim} dimensions, "
+                f"got {len(key)}"
+            )
+        return key + (slice(None),) * max(0, 2 - len(key))
+
+    def __getitem__(self, key):
+        key = self._expand(key)
+        line_key, point_key, rest = key[0], key[1], key[2:]
+        lines = np.arange(self.lines)[line_key]
+        points = np.arange(self.points_per_line)[point_key]
+        index = self.frame_index(
+            np.reshape(lines, (-1, 1)), np.reshape(points, (1, -1))
+        )
+        # Read each frame once, in increasing order as h5py requires
+        unique, inverse = np.unique(index, return_inverse=True)
+        if len(unique):
+            data = np.asarray(self.frames[(unique,) + rest])
+        else:
+            data = np.asarray(self.frames[(slice(0, 0),) + rest])
+        data = data[inverse.reshape(index.shape)]
+        shape = np.shape(lines) + np.shape(points) + data.shape[2:]
+        return data.reshape(shape)
+
+    def __array__(self, dtype=None, copy=None):
+        data = self[:]
+        return data if dtype is None else data.astype(dtype)
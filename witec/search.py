@@ -0,0 +1,405 @@
+"""This module finds the spectra of one or many maps that look like a given one.
+
+Correlating a spectrum against every pixel of an archive means reading
+every spectrum each time. SpectrumIndex reads them once: each spectrum
+is mean-centered and scaled to unit norm, so that the Euclidean
+distance d between two of them gives their Pearson correlation as
+1 - d**2 / 2. The vectors are optionally reduced to a few principal
+components, which removes most of the noise and keeps the index small,
+and are then organized in a ball tree. A k-nearest-neighbour query only
+visits the few balls that can hold a closer spectrum.
+
+>>> from witec.search import SpectrumIndex
+
+>>> index = SpectrumIndex.from_spe(
+...     ["path/to/map_1.SPE", "path/to/map_2.SPE"], points_per_line=200
+... )
+>>> hits = index.query(spectrum, k=5)
+>>> hits[0]
+Hit(file='path/to/map_2.SPE', line=12, point=40, correlation=0.998)
+>>> similar = index.similar_to(12, 40, file="path/to/map_2.SPE", k=20)
+>>> index.save("archive.index.npz")
+
+Trees are most effective up to a few tens of dimensions, so keep
+n_components small when indexing full-width spectra.
+"""
+
+from dataclasses import dataclass
+import heapq
+import logging
+
+import numpy as np
+
+from witec.cube import Cube
+from witec.decompose import pca
+
+log = logging.getLogger(__name__)
+
+# Vectors kept together in each leaf of the ball tree
+LEAF_SIZE = 128
+
+# Spectra varying less than this, relative to their largest value, are flat
+FLAT_RTOL = 16 * np.finfo(float).eps
+
+
+@dataclass
+class Hit:
+    """One spectrum found by a query."""
+
+    file: str
+    line: int
+    point: int
+    correlation: float
+
+
+def normalize(spectra):
+    """Mean-center each spectrum along the last axis and scale it to unit norm.
+
+    Flat spectra, e.g. of dark, masked or saturated pixels, have no
+    direction and are returned as zeros.
+    """
+    spectra = np.asarray(spectra, dtype=np.float64)
+    centered = spectra - spectra.mean(axis=-1, keepdims=True)
+    norm = np.linalg.norm(centered, axis=-1, keepdims=True)
+    # Rounding leaves flat spectra a residue far below any real variation
+    scale = np.abs(spectra).max(axis=-1, keepdims=True, initial=0)
+    flat = norm <= FLAT_RTOL * np.sqrt(spectra.shape[-1]) * scale
+    return np.where(flat, 0, centered / np.where(flat, 1, norm))
+
+
+def _unit(vectors):
+    norm = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norm[norm == 0] = 1
+    return vectors / norm
+
+
+def _reduce(spectra, components, mean):
+    """Project normalized spectra onto components and scale them to unit norm."""
+    if components is None:
+        return spectra
+    return _unit((spectra - mean) @ components.T)
+
+
+class _Normalized:
+    """Present a cube with every spectrum normalized on read, as a Cube source."""
+
+    def __init__(self, cube):
+        self.cube = cube
+        self.shape = cube.shape
+        self.dtype = np.dtype(np.float64)
+
+    def __getitem__(self, key):
+        lines, points, pixels = key
+        return normalize(np.asarray(self.cube[lines, points]))[..., pixels]
+
+
+class BallTree:
+    """A ball tree over the rows of an array, for Euclidean k-NN queries.
+
+    Each node holds a contiguous range of `order`, the permutation of the
+    rows, and the center and radius of a ball containing them. Nodes are
+    split at the median of their widest dimension until they hold at most
+    leaf_size rows.
+    """
+
+    def __init__(self, vectors, leaf_size=LEAF_SIZE):
+        self.vectors = np.asarray(vectors)
+        self.leaf_size = leaf_size
+        self.order = np.arange(len(self.vectors))
+        self.start, self.end, self.children = [], [], []
+        centers, radii = [], []
+        stack = [(0, len(self.vectors), None)]
+        while stack:
+            start, end, parent = stack.pop()
+            node = len(self.start)
+            if parent is not None:
+                self.children[parent].append(node)
+            members = self.order[start:end]
+            points = self.vectors[members]
+            center = points.mean(axis=0) if len(points) else np.zeros(points.shape[1])
+            self.start.append(start)
+            self.end.append(end)
+            self.children.append([])
+            centers.append(center)
+            radii.append(np.sqrt(((points - center) ** 2).sum(axis=1).max(initial=0)))
+            if end - start <= leaf_size:
+                continue
+            widest = np.argmax(points.max(axis=0) - points.min(axis=0))
+            middle = (end - start) // 2
+            split = np.argpartition(points[:, widest], middle)
+            self.order[start:end] = members[split]
+            stack.append((start + middle, end, node))
+            stack.append((start, start + middle, node))
+        self.centers = np.array(centers).reshape(len(centers), -1)
+        self.radii = np.array(radii)
+
+    def _bounds(self, vector, nodes):
+        """Smallest distance from vector to any row inside each node's ball."""
+        distance = np.linalg.norm(self.centers[nodes] - vector, axis=-1)
+        return np.maximum(distance - self.radii[nodes], 0)
+
+    def _leaf(self, vector, node):
+        members = self.order[self.start[node] : self.end[node]]
+        return members, np.linalg.norm(self.vectors[members] - vector, axis=1)
+
+    def query(self, vector, k=1):
+        """Return (rows, distances) of the k rows closest to vector, closest first."""
+        k = min(k, len(self.vectors))
+        rows, distances = np.empty(0, dtype=np.intp), np.empty(0)
+        if k == 0:
+            return rows, distances
+        # Visit balls closest first and stop once none can hold a closer row
+        worst = np.inf
+        heap = [(0.0, 0)]
+        while heap:
+            bound, node = heapq.heappop(heap)
+            if bound >= worst:
+                break
+            children = self.children[node]
+            if children:
+                for child, bound in zip(children, self._bounds(vector, children)):
+                    if bound < worst:
+                        heapq.heappush(heap, (bound, child))
+                continue
+            members, found = self._leaf(vector, node)
+            closer = found < worst
+            if not closer.any():
+                continue
+            rows = np.concatenate([rows, members[closer]])
+            distances = np.concatenate([distances, found[closer]])
+            keep = np.argsort(distances, kind="stable")[:k]
+            rows, distances = rows[keep], distances[keep]
+            if len(distances) == k:
+                worst = distances[-1]
+        return rows, distances
+
+    def query_radius(self, vector, radius):
+        """Return (rows, distances) of every row within radius, closest first."""
+        rows, distances = [], []
+        stack = [0] if len(self.vectors) else []
+        while stack:
+            node = stack.pop()
+            children = self.children[node]
+            if children:
+                bounds = self._bounds(vector, children)
+                stack.extend(np.array(children)[bounds <= radius])
+                continue
+            members, found = self._leaf(vector, node)
+            inside = found <= radius
+            rows.append(members[inside])
+            distances.append(found[inside])
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.intp)
+        distances = np.concatenate(distances) if distances else np.empty(0)
+        order = np.argsort(distances, kind="stable")
+        return rows[order], distances[order]
+
+
+class SpectrumIndex:
+    """Nearest-spectrum search over the pixels of one or more maps.
+
+    Parameters
+    ----------
+    vectors : array of shape (n, dimensions)
+        Normalized, optionally reduced, spectra of every indexed pixel.
+    files : list of str
+        Names of the indexed maps.
+    pixels : int array of shape (n, 3)
+        (file, line, point) of every vector, with file an index of `files`.
+    components, mean : array (optional)
+        Principal components of shape (dimensions, spectral pixels) and
+        the mean they were computed around, used to reduce queries the
+        same way as the vectors. None if spectra are not reduced.
+    leaf_size : int (optional)
+        Vectors per leaf of the ball tree.
+
+    Notes
+    -----
+    Use from_cube or from_spe to build an index from spectra. Flat
+    spectra correlate with nothing and are left out of the index. With
+    components, the reported correlation is the cosine similarity of the
+    principal component scores, which follows the correlation of the
+    spectra but leaves out most of their noise.
+    """
+
+    def __init__(
+        self, vectors, files, pixels, components=None, mean=None, leaf_size=LEAF_SIZE
+    ):
+        self.vectors = np.asarray(vectors, dtype=np.float32)
+        self.files = [str(file) for file in files]
+        self.pixels = np.asarray(pixels, dtype=np.int64).reshape(-1, 3)
+        self.components = components
+        self.mean = mean
+        self.tree = BallTree(self.vectors, leaf_size)
+
+    def __repr__(self):
+        return (
+            f"SpectrumIndex(spectra={len(self)}, files={len(self.files)}, "
+            f"dimensions={self.vectors.shape[1]})"
+        )
+
+    def __len__(self):
+        return len(self.vectors)
+
+    @classmethod
+    def from_cube(cls, cube, n_components=16, name="", **kwargs):
+        """Index every spectrum of a Cube or (lines, points, pixels) array."""
+        return cls.from_cubes([cube], n_components, [name], **kwargs)
+
+    @classmethod
+    def from_spe(
+        cls,
+        filenames,
+        points_per_line,
+        lines=None,
+        n_components=16,
+        serpentine=False,
+        **kwargs,
+    ):
+        """Index the spectral maps stored in one or more .SPE files.
+
+        Every file is memory-mapped with Cube.from_spe and must hold maps
+        with the same points_per_line and spectral width.
+        """
+        if isinstance(filenames, (str, bytes)) or not np.iterable(filenames):
+            filenames = [filenames]
+        cubes = [
+            Cube.from_spe(filename, points_per_line, lines, serpentine)
+            for filename in filenames
+        ]
+        return cls.from_cubes(cubes, n_components, filenames, **kwargs)
+
+    @classmethod
+    def from_cubes(cls, cubes, n_components=16, names=None, seed=0, **kwargs):
+        """Index the spectra of several cubes of the same spectral width.
+
+        Parameters
+        ----------
+        cubes : list of Cube or array
+            Maps of shape (lines, points, pixels).
+        n_components : int or None (optional)
+            Principal components kept per spectrum. The components are
+            fitted to the normalized spectra of the first cube. None
+            indexes the full normalized spectra.
+        names : list of str (optional)
+            Names reported in hits. Default to the cube positions.
+        seed : int (optional)
+            Seed of the randomized PCA.
+        """
+        cubes = [cube if isinstance(cube, Cube) else Cube(cube) for cube in cubes]
+        names = list(range(len(cubes))) if names is None else list(names)
+        widths = {cube.shape[2] for cube in cubes}
+        if len(widths) > 1:
+            raise ValueError(f"Cubes differ in spectral width: {sorted(widths)}")
+        components = mean = None
+        if n_components is not None and n_components < cubes[0].shape[2]:
+            first = cubes[0]
+            result = pca(
+                Cube(_Normalized(first), chunk_lines=first.chunk_lines),
+                n_components,
+                seed=seed,
+            )
+            components, mean = result.components, result.mean
+        vectors, pixels, flat = [], [], 0
+        for number, cube in enumerate(cubes):
+            for block, data in cube.blocks():
+                spectra = normalize(data.reshape(-1, data.shape[-1]))
+                # Drop flat spectra before _reduce turns them into unit vectors
+                varying = spectra.any(axis=1)
+                flat += np.count_nonzero(~varying)
+                vectors.append(_reduce(spectra[varying], components, mean))
+                lines, points = np.meshgrid(
+                    np.arange(*block.indices(cube.shape[0])),
+                    np.arange(cube.shape[1]),
+                    indexing="ij",
+                )
+                pixels.append(
+                    np.stack(
+                        [np.full(lines.size, number), lines.ravel(), points.ravel()],
+                        axis=1,
+                    )[varying]
+                )
+        log.info(
+            "Indexing %d spectra of %d maps, leaving out %d flat spectra",
+            sum(map(len, vectors)),
+            len(cubes),
+            flat,
+        )
+        return cls(
+            np.concatenate(vectors), names, np.concatenate(pixels), components, mean
+        )
+
+    def save(self, filename):
+        """Store the index in a NumPy .npz file."""
+        arrays = {"vectors": self.vectors, "files": self.files, "pixels": self.pixels}
+        if self.components is not None:
+            arrays.update(components=self.components, mean=self.mean)
+        np.savez(filename, **arrays)
+
+    @classmethod
+    def load(cls, filename, leaf_size=LEAF_SIZE):
+        """Read an index stored by save."""
+        with np.load(filename) as stored:
+            return cls(
+                stored["vectors"],
+                stored["files"],
+                stored["pixels"],
+                stored["components"] if "components" in stored else None,
+                stored["mean"] if "mean" in stored else None,
+                leaf_size,
+            )
+
+    def vector(self, spectrum):
+        """Normalize and reduce a spectrum like the indexed ones."""
+        spectrum = normalize(spectrum)
+        if not spectrum.any():
+            raise ValueError("A flat spectrum is not correlated with any other")
+        return _reduce(spectrum[None], self.components, self.mean)[0]
+
+    def _hits(self, rows, distances):
+        return [
+            Hit(
+                self.files[file],
+                int(line),
+                int(point),
+                float(1 - distance**2 / 2),
+            )
+            for (file, line, point), distance in zip(self.pixels[rows], distances)
+        ]
+
+    def query(self, spectrum, k=10):
+        """Return the k indexed spectra most correlated with a spectrum.
+
+        Parameters
+        ----------
+        spectrum : array
+            A spectrum of the same width as the indexed ones.
+        k : int (optional)
+            Number of hits.
+
+        Returns
+        -------
+        hits : list of Hit
+            Most correlated first.
+        """
+        return self._hits(*self.tree.query(self.vector(spectrum), k))
+
+    def within(self, spectrum, correlation=0.9):
+        """Return every indexed spectrum at least this correlated with a spectrum."""
+        radius = np.sqrt(2 * (1 - correlation))
+        return self._hits(*self.tree.query_radius(self.vector(spectrum), radius))
+
+    def similar_to(self, line, point, file=None, k=10):
+        """Return the k spectra most like an indexed pixel, itself first.
+
+        file is the name of the map, and may be left out for a single map.
+        """
+        if file is None:
+            if len(self.files) > 1:
+                raise ValueError("Name the file of the pixel in a multi-map index")
+            number = 0
+        else:
+            number = self.files.index(str(file))
+        rows = np.flatnonzero((self.pixels == (number, line, point)).all(axis=1))
+        if not len(rows):
+            raise KeyError(f"{(file, line, point)} is not indexed, or is flat")
+        return self._hits(*self.tree.query(self.vectors[rows[0]], k))
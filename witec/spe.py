@@ -9,10 +9,16 @@ from typing import Optional
 import struct
 
 from dateutil import parser
+import h5py
 import numpy as np
 
+from witec.scan import scan_view
+from witec.utils import unflatten_metadata
 import witec.winspec
 
+# Files that SPE opens with the HDF5 backend, as written by witec.convert
+HDF5_SUFFIXES = (".hdf5", ".h5")
+
 
 # ref: https://stackoverflow.com/a/32935278
 def map_nested_dicts_modify(dictionary, func):
@@ -49,6 +55,12 @@ class SPE:
     file: str
     dtype: Optional[type] = np.int32
 
+    def __new__(cls, file, *args, **kwargs):
+        """Open converted .hdf5 files with HDF5SPE, keeping the same API."""
+        if cls is SPE and os.path.splitext(file)[1].lower() in HDF5_SUFFIXES:
+            cls = HDF5SPE
+        return super().__new__(cls)
+
     def __post_init__(self):
         self.contents = witec.winspec.SpeFile(self.file)
 
@@ -62,6 +74,19 @@ class SPE:
         # return np.sum(self.contents["data"], axis=1, dtype=self.dtype)
         return self.contents.data
 
+    @property
+    def spectra(self):
+        """Bin the CCD rows of every frame into a 2D array of shape (n, xdim)."""
+        return self.data.sum(axis=2)
+
+    def cube(self, points_per_line, lines=None, serpentine=False):
+        """View the frames of a map as (lines, points_per_line, xdim, ydim).
+
+        No frames are copied; see witec.scan.scan_view. Set serpentine
+        for maps whose odd lines were acquired in reverse.
+        """
+        return scan_view(self.data, points_per_line, lines, serpentine)
+
     @property
     def header(self):
         header = get_dict(self.contents.header)
@@ -197,6 +222,130 @@ class SPE:
         return inner(self)
 
 
+class _SummedRows:
+    """Lazily bin the CCD rows of (n, xdim, ydim) frames on slicing."""
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.shape = tuple(frames.shape[:2])
+        self.dtype = frames.dtype
+        self.ndim = 2
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        return self.frames[key + (slice(None),) * (2 - len(key))].sum(axis=-1)
+
+    def __array__(self, dtype=None, copy=None):
+        spectra = self[:]
+        return spectra if dtype is None else spectra.astype(dtype)
+
+    def reshape(self, *shape):
+        """Read and bin every frame, then reshape as numpy.ndarray.reshape."""
+        return np.asarray(self).reshape(*shape)
+
+
+@dataclass
+class HDF5SPE(SPE):
+    """Read a .hdf5 file written by witec.convert through the SPE API.
+
+    The file is opened lazily and `data` is the HDF5 dataset itself, so
+    slices such as `spe.data[10:20]` read only the chunks they touch.
+    SPE(file) returns an HDF5SPE when file ends in .hdf5 or .h5.
+
+    >>> spe = SPE("data/sample_loc_id_map_20230615-1324_1.hdf5")
+    >>> spectrum = spe.spectra[120]
+    >>> spe.axis, spe.date, spe.header["exp_sec"]
+    """
+
+    def __post_init__(self):
+        self.h5 = h5py.File(self.file, "r")
+        self.contents = self.h5["spe"]
+        self._header = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.h5.close()
+
+    @property
+    def data(self):
+        """Frames of shape (n, xdim, ydim) as a lazily read h5py.Dataset."""
+        return self.contents["data"]
+
+    @property
+    def spectra(self):
+        """Spectra of shape (n, xdim), binned from the CCD rows on read."""
+        return _SummedRows(self.data)
+
+    @property
+    def header(self):
+        if self._header is None:
+            self._header = unflatten_metadata(
+                {key: _from_attr(value) for key, value in self.contents.attrs.items()}
+            )
+        return self._header
+
+    @property
+    def metadata(self):
+        """Metadata from the filename, WIP file and yaml files."""
+        return unflatten_metadata(
+            {key: _from_attr(value) for key, value in self.h5.attrs.items()}
+        )
+
+    @property
+    def axis(self):
+        return self.contents["wavelength"][()]
+
+    @property
+    def igain(self):
+        return self.header["gain"]
+
+    @property
+    def exposure(self):
+        return self.header["exp_sec"]
+
+    @property
+    def spefname(self):
+        return os.path.splitext(self.file)[0] + ".SPE"
+
+    @property
+    def date(self):
+        return parser.parse(self.header["date"]).date()
+
+    @property
+    def chip_temp(self):
+        return self.header["DetTemperature"]
+
+    @property
+    def comments(self):
+        return "".join(self.header["Comments"])
+
+    @property
+    def accumulations(self):
+        return self.header["NumExpAccums"]
+
+    @property
+    def flatfield(self):
+        return self.header["FlatField"]
+
+    @property
+    def background(self):
+        return self.header["background"]
+
+
+def _from_attr(value):
+    """Convert numpy scalars read from HDF5 attributes to Python values."""
+    return value.item() if isinstance(value, np.generic) else value
+
+
 @dataclass
 class SPEAxis(dict):
     axis: dict
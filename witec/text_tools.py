@@ -1,387 +1,425 @@
 # See: https://stackoverflow.com/questions/188545/regular-expression-for-extracting-text-from-an-rtf-string
+r"""Plain text from the RTF info streams of WIP files.
+
+striprtf tokenizes the raw bytes with a single regular expression that is
+compiled once at import. Runs of plain text between control words come
+back as one token each, so embedded pictures and long tables are skipped
+or copied in bulk instead of one character at a time.
+
+>>> from witec.text_tools import striprtf
+
+>>> striprtf(rb"{\rtf1\ansi {\fonttbl{\f0 Arial;}}\f0 Sample 1\par}")
+'Sample 1\n'
+"""
 
 import re
 
+_CONTROL = (
+    r"\\([a-z]{1,32})(-?\d{1,10})?[ ]?|\\'([0-9a-f]{2})|\\([^a-z])|([{}])|[\r\n]+"
+)
+# Plain text runs, then a lone trailing backslash
+_TEXT = r"|([^\\{}\r\n]+)|(.)"
+_BYTES_PATTERN = re.compile((_CONTROL + _TEXT).encode(), re.I)
+_STR_PATTERN = re.compile(_CONTROL + _TEXT, re.I)
+
+# control words which specify a "destination".
+DESTINATIONS = frozenset(
+    (
+        "aftncn",
+        "aftnsep",
+        "aftnsepc",
+        "annotation",
+        "atnauthor",
+        "atndate",
+        "atnicn",
+        "atnid",
+        "atnparent",
+        "atnref",
+        "atntime",
+        "atrfend",
+        "atrfstart",
+        "author",
+        "background",
+        "bkmkend",
+        "bkmkstart",
+        "blipuid",
+        "buptim",
+        "category",
+        "colorschememapping",
+        "colortbl",
+        "comment",
+        "company",
+        "creatim",
+        "datafield",
+        "datastore",
+        "defchp",
+        "defpap",
+        "do",
+        "doccomm",
+        "docvar",
+        "dptxbxtext",
+        "ebcend",
+        "ebcstart",
+        "factoidname",
+        "falt",
+        "fchars",
+        "ffdeftext",
+        "ffentrymcr",
+        "ffexitmcr",
+        "ffformat",
+        "ffhelptext",
+        "ffl",
+        "ffname",
+        "ffstattext",
+        "field",
+        "file",
+        "filetbl",
+        "fldinst",
+        "fldrslt",
+        "fldtype",
+        "fname",
+        "fontemb",
+        "fontfile",
+        "fonttbl",
+        "footer",
+        "footerf",
+        "footerl",
+        "footerr",
+        "footnote",
+        "formfield",
+        "ftncn",
+        "ftnsep",
+        "ftnsepc",
+        "g",
+        "generator",
+        "gridtbl",
+        "header",
+        "headerf",
+        "headerl",
+        "headerr",
+        "hl",
+        "hlfr",
+        "hlinkbase",
+        "hlloc",
+        "hlsrc",
+        "hsv",
+        "htmltag",
+        "info",
+        "keycode",
+        "keywords",
+        "latentstyles",
+        "lchars",
+        "levelnumbers",
+        "leveltext",
+        "lfolevel",
+        "linkval",
+        "list",
+        "listlevel",
+        "listname",
+        "listoverride",
+        "listoverridetable",
+        "listpicture",
+        "liststylename",
+        "listtable",
+        "listtext",
+        "lsdlockedexcept",
+        "macc",
+        "maccPr",
+        "mailmerge",
+        "maln",
+        "malnScr",
+        "manager",
+        "margPr",
+        "mbar",
+        "mbarPr",
+        "mbaseJc",
+        "mbegChr",
+        "mborderBox",
+        "mborderBoxPr",
+        "mbox",
+        "mboxPr",
+        "mchr",
+        "mcount",
+        "mctrlPr",
+        "md",
+        "mdeg",
+        "mdegHide",
+        "mden",
+        "mdiff",
+        "mdPr",
+        "me",
+        "mendChr",
+        "meqArr",
+        "meqArrPr",
+        "mf",
+        "mfName",
+        "mfPr",
+        "mfunc",
+        "mfuncPr",
+        "mgroupChr",
+        "mgroupChrPr",
+        "mgrow",
+        "mhideBot",
+        "mhideLeft",
+        "mhideRight",
+        "mhideTop",
+        "mhtmltag",
+        "mlim",
+        "mlimloc",
+        "mlimlow",
+        "mlimlowPr",
+        "mlimupp",
+        "mlimuppPr",
+        "mm",
+        "mmaddfieldname",
+        "mmath",
+        "mmathPict",
+        "mmathPr",
+        "mmaxdist",
+        "mmc",
+        "mmcJc",
+        "mmconnectstr",
+        "mmconnectstrdata",
+        "mmcPr",
+        "mmcs",
+        "mmdatasource",
+        "mmheadersource",
+        "mmmailsubject",
+        "mmodso",
+        "mmodsofilter",
+        "mmodsofldmpdata",
+        "mmodsomappedname",
+        "mmodsoname",
+        "mmodsorecipdata",
+        "mmodsosort",
+        "mmodsosrc",
+        "mmodsotable",
+        "mmodsoudl",
+        "mmodsoudldata",
+        "mmodsouniquetag",
+        "mmPr",
+        "mmquery",
+        "mmr",
+        "mnary",
+        "mnaryPr",
+        "mnoBreak",
+        "mnum",
+        "mobjDist",
+        "moMath",
+        "moMathPara",
+        "moMathParaPr",
+        "mopEmu",
+        "mphant",
+        "mphantPr",
+        "mplcHide",
+        "mpos",
+        "mr",
+        "mrad",
+        "mradPr",
+        "mrPr",
+        "msepChr",
+        "mshow",
+        "mshp",
+        "msPre",
+        "msPrePr",
+        "msSub",
+        "msSubPr",
+        "msSubSup",
+        "msSubSupPr",
+        "msSup",
+        "msSupPr",
+        "mstrikeBLTR",
+        "mstrikeH",
+        "mstrikeTLBR",
+        "mstrikeV",
+        "msub",
+        "msubHide",
+        "msup",
+        "msupHide",
+        "mtransp",
+        "mtype",
+        "mvertJc",
+        "mvfmf",
+        "mvfml",
+        "mvtof",
+        "mvtol",
+        "mzeroAsc",
+        "mzeroDesc",
+        "mzeroWid",
+        "nesttableprops",
+        "nextfile",
+        "nonesttables",
+        "objalias",
+        "objclass",
+        "objdata",
+        "object",
+        "objname",
+        "objsect",
+        "objtime",
+        "oldcprops",
+        "oldpprops",
+        "oldsprops",
+        "oldtprops",
+        "oleclsid",
+        "operator",
+        "panose",
+        "password",
+        "passwordhash",
+        "pgp",
+        "pgptbl",
+        "picprop",
+        "pict",
+        "pn",
+        "pnseclvl",
+        "pntext",
+        "pntxta",
+        "pntxtb",
+        "printim",
+        "private",
+        "propname",
+        "protend",
+        "protstart",
+        "protusertbl",
+        "pxe",
+        "result",
+        "revtbl",
+        "revtim",
+        "rsidtbl",
+        "rxe",
+        "shp",
+        "shpgrp",
+        "shpinst",
+        "shppict",
+        "shprslt",
+        "shptxt",
+        "sn",
+        "sp",
+        "staticval",
+        "stylesheet",
+        "subject",
+        "sv",
+        "svb",
+        "tc",
+        "template",
+        "themedata",
+        "title",
+        "txe",
+        "ud",
+        "upr",
+        "userprops",
+        "wgrffmtfilter",
+        "windowcaption",
+        "writereservation",
+        "writereservhash",
+        "xe",
+        "xform",
+        "xmlattrname",
+        "xmlattrvalue",
+        "xmlclose",
+        "xmlname",
+        "xmlnstbl",
+        "xmlopen",
+    )
+)
+# Translation of some special characters.
+SPECIALCHARS = {
+    "par": "\n",
+    "sect": "\n\n",
+    "page": "\n\n",
+    "line": "\n",
+    "tab": "\t",
+    "emdash": "\u2014",
+    "endash": "\u2013",
+    "emspace": "\u2003",
+    "enspace": "\u2002",
+    "qmspace": "\u2005",
+    "bullet": "\u2022",
+    "lquote": "\u2018",
+    "rquote": "\u2019",
+    "ldblquote": "\201C",
+    "rdblquote": "\u201d",
+}
+
+# Token kinds, by the index of the last group matched (None for line breaks)
+_WORD, _WORD_ARG, _HEX, _CHAR, _BRACE, _RUN, _TCHAR = range(1, 8)
+
+# Control words by their ASCII bytes, resolved once instead of per token:
+# True for destinations, otherwise the replacement text
+_WORDS = {word.encode(): True for word in DESTINATIONS}
+_WORDS.update((word.encode(), value) for word, value in SPECIALCHARS.items())
+_WORDS.update((word.decode(), value) for word, value in list(_WORDS.items()))
+
 
 def striprtf(text):
     """Convert a binary string in rtf formatting to plain text."""
-    pattern = re.compile(
-        r"\\([a-z]{1,32})(-?\d{1,10})?[ ]?|\\'([0-9a-f]{2})|\\([^a-z])|([{}])|[\r\n]+|(.)",
-        re.I,
-    )
-    # control words which specify a "destination".
-    destinations = frozenset(
-        (
-            "aftncn",
-            "aftnsep",
-            "aftnsepc",
-            "annotation",
-            "atnauthor",
-            "atndate",
-            "atnicn",
-            "atnid",
-            "atnparent",
-            "atnref",
-            "atntime",
-            "atrfend",
-            "atrfstart",
-            "author",
-            "background",
-            "bkmkend",
-            "bkmkstart",
-            "blipuid",
-            "buptim",
-            "category",
-            "colorschememapping",
-            "colortbl",
-            "comment",
-            "company",
-            "creatim",
-            "datafield",
-            "datastore",
-            "defchp",
-            "defpap",
-            "do",
-            "doccomm",
-            "docvar",
-            "dptxbxtext",
-            "ebcend",
-            "ebcstart",
-            "factoidname",
-            "falt",
-            "fchars",
-            "ffdeftext",
-            "ffentrymcr",
-            "ffexitmcr",
-            "ffformat",
-            "ffhelptext",
-            "ffl",
-            "ffname",
-            "ffstattext",
-            "field",
-            "file",
-            "filetbl",
-            "fldinst",
-            "fldrslt",
-            "fldtype",
-            "fname",
-            "fontemb",
-            "fontfile",
-            "fonttbl",
-            "footer",
-            "footerf",
-            "footerl",
-            "footerr",
-            "footnote",
-            "formfield",
-            "ftncn",
-            "ftnsep",
-            "ftnsepc",
-            "g",
-            "generator",
-            "gridtbl",
-            "header",
-            "headerf",
-            "headerl",
-            "headerr",
-            "hl",
-            "hlfr",
-            "hlinkbase",
-            "hlloc",
-            "hlsrc",
-            "hsv",
-            "htmltag",
-            "info",
-            "keycode",
-            "keywords",
-            "latentstyles",
-            "lchars",
-            "levelnumbers",
-            "leveltext",
-            "lfolevel",
-            "linkval",
-            "list",
-            "listlevel",
-            "listname",
-            "listoverride",
-            "listoverridetable",
-            "listpicture",
-            "liststylename",
-            "listtable",
-            "listtext",
-            "lsdlockedexcept",
-            "macc",
-            "maccPr",
-            "mailmerge",
-            "maln",
-            "malnScr",
-            "manager",
-            "margPr",
-            "mbar",
-            "mbarPr",
-            "mbaseJc",
-            "mbegChr",
-            "mborderBox",
-            "mborderBoxPr",
-            "mbox",
-            "mboxPr",
-            "mchr",
-            "mcount",
-            "mctrlPr",
-            "md",
-            "mdeg",
-            "mdegHide",
-            "mden",
-            "mdiff",
-            "mdPr",
-            "me",
-            "mendChr",
-            "meqArr",
-            "meqArrPr",
-            "mf",
-            "mfName",
-            "mfPr",
-            "mfunc",
-            "mfuncPr",
-            "mgroupChr",
-            "mgroupChrPr",
-            "mgrow",
-            "mhideBot",
-            "mhideLeft",
-            "mhideRight",
-            "mhideTop",
-            "mhtmltag",
-            "mlim",
-            "mlimloc",
-            "mlimlow",
-            "mlimlowPr",
-            "mlimupp",
-            "mlimuppPr",
-            "mm",
-            "mmaddfieldname",
-            "mmath",
-            "mmathPict",
-            "mmathPr",
-            "mmaxdist",
-            "mmc",
-            "mmcJc",
-            "mmconnectstr",
-            "mmconnectstrdata",
-            "mmcPr",
-            "mmcs",
-            "mmdatasource",
-            "mmheadersource",
-            "mmmailsubject",
-            "mmodso",
-            "mmodsofilter",
-            "mmodsofldmpdata",
-            "mmodsomappedname",
-            "mmodsoname",
-            "mmodsorecipdata",
-            "mmodsosort",
-            "mmodsosrc",
-            "mmodsotable",
-            "mmodsoudl",
-            "mmodsoudldata",
-            "mmodsouniquetag",
-            "mmPr",
-            "mmquery",
-            "mmr",
-            "mnary",
-            "mnaryPr",
-            "mnoBreak",
-            "mnum",
-            "mobjDist",
-            "moMath",
-            "moMathPara",
-            "moMathParaPr",
-            "mopEmu",
-            "mphant",
-            "mphantPr",
-            "mplcHide",
-            "mpos",
-            "mr",
-            "mrad",
-            "mradPr",
-            "mrPr",
-            "msepChr",
-            "mshow",
-            "mshp",
-            "msPre",
-            "msPrePr",
-            "msSub",
-            "msSubPr",
-            "msSubSup",
-            "msSubSupPr",
-            "msSup",
-            "msSupPr",
-            "mstrikeBLTR",
-            "mstrikeH",
-            "mstrikeTLBR",
-            "mstrikeV",
-            "msub",
-            "msubHide",
-            "msup",
-            "msupHide",
-            "mtransp",
-            "mtype",
-            "mvertJc",
-            "mvfmf",
-            "mvfml",
-            "mvtof",
-            "mvtol",
-            "mzeroAsc",
-            "mzeroDesc",
-            "mzeroWid",
-            "nesttableprops",
-            "nextfile",
-            "nonesttables",
-            "objalias",
-            "objclass",
-            "objdata",
-            "object",
-            "objname",
-            "objsect",
-            "objtime",
-            "oldcprops",
-            "oldpprops",
-            "oldsprops",
-            "oldtprops",
-            "oleclsid",
-            "operator",
-            "panose",
-            "password",
-            "passwordhash",
-            "pgp",
-            "pgptbl",
-            "picprop",
-            "pict",
-            "pn",
-            "pnseclvl",
-            "pntext",
-            "pntxta",
-            "pntxtb",
-            "printim",
-            "private",
-            "propname",
-            "protend",
-            "protstart",
-            "protusertbl",
-            "pxe",
-            "result",
-            "revtbl",
-            "revtim",
-            "rsidtbl",
-            "rxe",
-            "shp",
-            "shpgrp",
-            "shpinst",
-            "shppict",
-            "shprslt",
-            "shptxt",
-            "sn",
-            "sp",
-            "staticval",
-            "stylesheet",
-            "subject",
-            "sv",
-            "svb",
-            "tc",
-            "template",
-            "themedata",
-            "title",
-            "txe",
-            "ud",
-            "upr",
-            "userprops",
-            "wgrffmtfilter",
-            "windowcaption",
-            "writereservation",
-            "writereservhash",
-            "xe",
-            "xform",
-            "xmlattrname",
-            "xmlattrvalue",
-            "xmlclose",
-            "xmlname",
-            "xmlnstbl",
-            "xmlopen",
-        )
-    )
-    # Translation of some special characters.
-    specialchars = {
-        "par": "\n",
-        "sect": "\n\n",
-        "page": "\n\n",
-        "line": "\n",
-        "tab": "\t",
-        "emdash": "\u2014",
-        "endash": "\u2013",
-        "emspace": "\u2003",
-        "enspace": "\u2002",
-        "qmspace": "\u2005",
-        "bullet": "\u2022",
-        "lquote": "\u2018",
-        "rquote": "\u2019",
-        "ldblquote": "\201C",
-        "rdblquote": "\u201D",
-    }
+    if text.isascii():
+        # One byte per character, so tokens can stay bytes until output
+        tokens = _BYTES_PATTERN.finditer(text)
+        decode = bytes.decode
+    else:
+        tokens = _STR_PATTERN.finditer(text.decode())
+        decode = str
     stack = []
     ignorable = False  # Whether this group (and all inside it) are "ignorable".
     ucskip = 1  # Number of ASCII characters to skip after a unicode character.
     curskip = 0  # Number of ASCII characters left to skip
     out = []  # Output buffer.
-    for match in pattern.finditer(text.decode()):
-        word, arg, hex, char, brace, tchar = match.groups()
-        if brace:
+    for match in tokens:
+        kind = match.lastindex
+        if kind == _RUN:
+            run = match[_RUN]
+            if curskip > 0:
+                skipped = min(curskip, len(run))
+                curskip -= skipped
+                run = run[skipped:]
+            if run and not ignorable:
+                out.append(decode(run))
+        elif kind is None:  # line breaks
+            pass
+        elif kind <= _WORD_ARG:  # \foo
+            curskip = 0
+            word = match[_WORD]
+            action = _WORDS.get(word)
+            if action is True:
+                ignorable = True
+            elif ignorable:
+                pass
+            elif action is not None:
+                out.append(action)
+            elif word == b"uc" or word == "uc":
+                ucskip = int(match[_WORD_ARG])
+            elif word == b"u" or word == "u":
+                c = int(match[_WORD_ARG])
+                if c < 0:
+                    c += 0x10000
+                out.append(chr(c))
+                curskip = ucskip
+        elif kind == _BRACE:
             curskip = 0
-            if brace == "{":
+            if match[_BRACE] in (b"{", "{"):
                 # Push state
                 stack.append((ucskip, ignorable))
-            elif brace == "}":
+            else:
                 # Pop state
                 ucskip, ignorable = stack.pop()
-        elif char:  # \x (not a letter)
+        elif kind == _HEX:  # \'xx
+            if curskip > 0:
+                curskip -= 1
+            elif not ignorable:
+                out.append(chr(int(match[_HEX], 16)))
+        elif kind == _CHAR:  # \x (not a letter)
             curskip = 0
+            char = decode(match[_CHAR])
             if char == "~":
                 if not ignorable:
-                    out.append("\xA0")
+                    out.append("\xa0")
             elif char in "{}\\":
                 if not ignorable:
                     out.append(char)
             elif char == "*":
                 ignorable = True
-        elif word:  # \foo
-            curskip = 0
-            if word in destinations:
-                ignorable = True
-            elif ignorable:
-                pass
-            elif word in specialchars:
-                out.append(specialchars[word])
-            elif word == "uc":
-                ucskip = int(arg)
-            elif word == "u":
-                c = int(arg)
-                if c < 0:
-                    c += 0x10000
-                if c > 127:
-                    out.append(chr(c))  # NOQA
-                else:
-                    out.append(chr(c))
-                curskip = ucskip
-        elif hex:  # \'xx
-            if curskip > 0:
-                curskip -= 1
-            elif not ignorable:
-                c = int(hex, 16)
-                if c > 127:
-                    out.append(chr(c))  # NOQA
-                else:
-                    out.append(chr(c))
-        elif tchar:
-            if curskip > 0:
-                curskip -= 1
-            elif not ignorable:
-                out.append(tchar)
+        elif curskip > 0:  # lone trailing backslash
+            curskip -= 1
+        elif not ignorable:
+            out.append(decode(match[_TCHAR]))
     return "".join(out)
@@ -21,16 +21,38 @@ this file and calling any necessary functions.
 >>> extracted_dict = utils.assemble_metadata(basename, *supplemental)
 """
 
-
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import ctypes
+from datetime import datetime, timedelta, timezone
+import functools
+import logging
+import os
 import pathlib
 import re
+from types import MappingProxyType
 
+import pandas as pd
 import yaml
 
-from witec.project import Witec
+from witec.project import bulk_info_streams, info_streams
 import witec.winspec
 
+log = logging.getLogger(__name__)
+
+# Typed columns of exported metadata. Floats are matched by the last key of
+# a column, dates by the keys of the whole column, as assemble_metadata or
+# metadata_from_name and metadata_from_spe alone write them
+FLOAT_FIELDS = ("exp_sec", "SpecCenterWlNm", "DetTemperature")
+DATE_FORMATS = {
+    ("Experiment", "datetime"): "ISO8601",
+    ("SPE", "date"): "%d%b%Y",
+    ("datetime",): "ISO8601",
+    ("date",): "%d%b%Y",
+}
+
+# Prefer the libyaml C loader, which parses an order of magnitude faster
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
 
 def metadata_from_name(filename):
     """Parse metadata from a structured filename into a dictionary.
@@ -48,10 +70,8 @@ def metadata_from_name(filename):
     fields : dict
         key: value pairs, where values are extracted from filename
     """
-    basename = pathlib.Path(filename).name
-    slug = pathlib.Path(basename).stem
-    fields_sep = slug.split("_")
-    fields_sep = [field for field in fields_sep if field != ""]
+    slug = _stem(filename)
+    fields_sep = [field for field in slug.split("_") if field != ""]
     sample, location, identifier, meas_type = fields_sep[0:4]
     measurement_number = fields_sep[-1]
     datestring = fields_sep[-2]
@@ -72,56 +92,190 @@ def metadata_from_name(filename):
     return fields
 
 
-# https://stackoverflow.com/questions/9507648/datetime-from-string-in-python-best-guessing-string-format
-def _assign_datetime(s_date):
+def metadata_from_names(filenames):
+    """Parse metadata from many structured filenames at once.
+
+    Parameters
+    ----------
+    filenames : iterable of str
+        A list, array, or other iterable of structured filenames as
+        described in metadata_from_name.
+
+    Returns
+    -------
+    fields : list of dict
+        One dictionary per filename, identical to metadata_from_name.
+
+    Notes
+    -----
+    Date patterns are compiled once per session, and settings and
+    datestrings that repeat across an archive are only parsed once, so
+    indexing an archive by name is dominated by splitting the filenames.
+    """
+    return [metadata_from_name(str(filename)) for filename in filenames]
+
+
+def _stem(filename):
+    """Return pathlib.PurePath(filename).stem without building a path."""
+    filename = os.fspath(filename)
+    name = filename.rpartition(os.sep)[2] if os.altsep is None else ""
+    if name in ("", "."):
+        return pathlib.PurePath(filename).stem
+    dot = name.rfind(".")
+    return name[:dot] if 0 < dot < len(name) - 1 else name
+
+
+# Regular expressions equivalent to the datetime.strptime directives used
+# in conventions/dates.yaml; see _strptime.TimeRE
+_DATE_DIRECTIVES = {
+    "Y": r"(?P<Y>\d\d\d\d)",
+    "m": r"(?P<m>1[0-2]|0[1-9]|[1-9])",
+    "d": r"(?P<d>3[0-1]|[1-2]\d|0[1-9]|[1-9]| [1-9])",
+    "H": r"(?P<H>2[0-3]|[0-1]\d|\d)",
+    "M": r"(?P<M>[0-5]\d|\d)",
+    "S": r"(?P<S>6[0-1]|[0-5]\d|\d)",
+    "z": r"(?P<z>[+-]\d\d:?[0-5]\d(:?[0-5]\d(\.\d{1,6})?)?|(?-i:Z))",
+}
+
+
+def _compile_date_pattern(pattern):
+    """Translate a strptime format into a compiled regular expression."""
+    pattern = re.sub(r"([\\.^$*+?\(\){}\[\]|])", r"\\\1", pattern)
+    pattern = re.sub(r"\s+", r"\\s+", pattern)
+    regex = re.sub(r"%(.)", lambda match: _DATE_DIRECTIVES[match.group(1)], pattern)
+    return re.compile(regex, re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=None)
+def _date_patterns():
+    """Load conventions/dates.yaml once and compile each date pattern."""
     dates = pathlib.Path(pathlib.Path(__file__).parent, "conventions/dates.yaml")
     with open(dates, "r", encoding="utf-8") as stream:
         date_patterns = yaml.safe_load(stream)
-    for pattern in date_patterns:
+    return tuple(_compile_date_pattern(pattern) for pattern in date_patterns)
+
+
+def _utcoffset(z):
+    """Convert a matched %z value to a timezone, as datetime.strptime does."""
+    if z == "Z":
+        return timezone.utc
+    if z[3] == ":":
+        z = z[:3] + z[4:]
+        if len(z) > 5:
+            if z[5] != ":":
+                raise ValueError(f"Inconsistent use of : in {z}")
+            z = z[:5] + z[6:]
+    seconds = int(z[1:3]) * 3600 + int(z[3:5]) * 60 + int(z[5:7] or 0)
+    fraction = int(z[8:] + "0" * (6 - len(z[8:])))
+    if z.startswith("-"):
+        seconds, fraction = -seconds, -fraction
+    return timezone(timedelta(seconds=seconds, microseconds=fraction))
+
+
+# https://stackoverflow.com/questions/9507648/datetime-from-string-in-python-best-guessing-string-format
+@functools.lru_cache(maxsize=2**16)
+def _assign_datetime(s_date):
+    for pattern in _date_patterns():
+        found = pattern.match(s_date)
+        # strptime rejects partial matches as "unconverted data remains"
+        if found is None or found.end() != len(s_date):
+            continue
+        values = found.groupdict()
         try:
-            date = datetime.strptime(s_date, pattern).replace(microsecond=0)
-            # If timezone is already present, don't overwrite it
-            if date.utcoffset():
-                return date.isoformat()
-            # Otherwise, assume local time zone
-            return date.astimezone().isoformat()
+            tzinfo = _utcoffset(values["z"]) if values.get("z") else None
+            date = datetime(
+                int(values["Y"]),
+                int(values["m"]),
+                int(values["d"]),
+                int(values.get("H") or 0),
+                int(values.get("M") or 0),
+                int(values.get("S") or 0),
+                tzinfo=tzinfo,
+            )
         except ValueError:
-            pass
+            continue
+        # If timezone is already present, don't overwrite it
+        if date.utcoffset():
+            return date.isoformat()
+        # Otherwise, assume local time zone
+        if date.tzinfo is None:
+            suffix = _local_offset(date.year, date.month, date.day, date.hour)
+            if suffix is not None:
+                return date.isoformat() + suffix
+        return date.astimezone().isoformat()
+
+
+@functools.lru_cache(maxsize=2**16)
+def _local_offset(year, month, day, hour):
+    """Return the local UTC offset shared by every minute of an hour.
+
+    The offset is returned as the suffix that datetime.isoformat appends,
+    or None if it changes within the hour or the hour falls in a DST gap,
+    in which case the caller converts the exact time instead.
+    """
+    naive_start = datetime(year, month, day, hour)
+    naive_end = datetime(year, month, day, hour, 59, 59)
+    start, end = naive_start.astimezone(), naive_end.astimezone()
+    if start.utcoffset() != end.utcoffset():
+        return None
+    if (start.replace(tzinfo=None), end.replace(tzinfo=None)) != (
+        naive_start,
+        naive_end,
+    ):
+        return None
+    return start.isoformat()[len(naive_start.isoformat()) :]
 
 
 def _assign_settings(source_settings):
+    return dict(_settings_from_fields(frozenset(source_settings)))
+
+
+@functools.lru_cache(maxsize=2**12)
+def _settings_from_fields(source_settings):
     settings = {}
     for field in source_settings:
-        try:
-            value, unit = _split_field_by_value(field)
-            if unit == "m":
-                settings["wavelength (m)"] = value
-            if unit == "W":
-                settings["excitation source"] = "laser"
-                settings["set power (W)"] = value
-            if unit == "s":
-                settings["exposure time (s)"] = value
-
-        except:
-            try:
-                value, name = _split_field_by_name(field)
-                if value == "obj":
-                    settings["objective"] = name
-                if value == "f":
-                    settings["filter"] = name
-                if value == "LED":
-                    settings["excitation source"] = value
-                    settings["LED details"] = name
-                else:
-                    settings[value] = name
-            except:
-                settings["other"] = field
-
-    return settings
+        settings.update(_setting_items(field))
+    return tuple(settings.items())
+
+
+@functools.lru_cache(maxsize=2**12)
+def _setting_items(field):
+    """Classify a single settings field into (key, value) pairs."""
+    try:
+        value, unit = _split_field_by_value(field)
+        items = []
+        if unit == "m":
+            items.append(("wavelength (m)", value))
+        if unit == "W":
+            items.append(("excitation source", "laser"))
+            items.append(("set power (W)", value))
+        if unit == "s":
+            items.append(("exposure time (s)", value))
+        return tuple(items)
+    except (IndexError, ValueError, NameError):
+        pass
+    try:
+        value, name = _split_field_by_name(field)
+    except IndexError:
+        return (("other", field),)
+    items = []
+    if value == "obj":
+        items.append(("objective", name))
+    if value == "f":
+        items.append(("filter", name))
+    if value == "LED":
+        items.append(("excitation source", value))
+        items.append(("LED details", name))
+    else:
+        items.append((value, name))
+    return tuple(items)
+
+
+_VALUE_UNIT = re.compile(r"(^\d*)(\D*$)")
 
 
 def _split_field_by_value(string):
-    value, unit = re.findall(("(^\d*)(\D*$)"), string)[0]
+    value, unit = _VALUE_UNIT.findall(string)[0]
     return _assign_value(value, unit)
 
 
@@ -167,20 +321,65 @@ def metadata_from_wip(filename):
     metadata_wip : dict
         Acqusition settings and user notes from a project.
     """
-    wip = Witec(filename)
-    metadata_wip = {}
-    data_keys = wip.data.keys()
-    for data_key in data_keys:
+    # Only the info streams are decoded, not the stored data
+    return _parse_info_streams(info_streams(filename))
+
+
+def metadata_from_wips(filenames, processes=None):
+    """Extract metadata from many Witec Project files concurrently.
+
+    Parameters
+    ----------
+    filenames : iterable of str
+        Paths to WitecProject files, with .WIP extension.
+    processes : int (optional)
+        Number of worker processes, as in project.bulk_info_streams.
+
+    Returns
+    -------
+    metadata : dict
+        The metadata_from_wip of each readable file, keyed by filename.
+        Files whose info text cannot be parsed are left out, so that
+        metadata_from_wip reports the error for that file alone.
+    """
+    metadata = {}
+    for filename, info in bulk_info_streams(filenames, processes).items():
         try:
-            data_text = wip.info(wip.data[data_key])
-            metadata_wip[data_key] = _parse_wiptextfile(data_text)
-        except TypeError:
-            continue
+            metadata[filename] = _parse_info_streams(info)
+        except Exception as error:  # pylint: disable=broad-except
+            log.warning("Skipping info text of %s: %r", filename, error)
+    return metadata
+
+
+def _parse_info_streams(streams):
+    metadata_wip = {}
+    for data_key, data_text in streams.items():
+        metadata_wip[data_key] = parse_wip_text(data_text)
     return metadata_wip
 
 
-def _parse_wiptextfile(wip_text):
+def parse_wip_text(wip_text):
+    """Split the information text of one WIP data object into fields.
+
+    Parameters
+    ----------
+    wip_text : str
+        Plain text of an info stream, as returned by project.info_streams.
+
+    Returns
+    -------
+    fields : dict
+        The first line under "Information", then the value of every
+        "key: value" line as a string. Empty values are left out.
+
+    Raises
+    ------
+    ValueError
+        If the text has no lines.
+    """
     lines = re.sub("\t", "", wip_text).splitlines()
+    if not lines:
+        raise ValueError("WIP information text is empty")
     wip_dict = {}
     wip_dict["Information"] = lines[0]
     for line in lines[1:]:
@@ -211,9 +410,67 @@ def metadata_from_spe(filename):
 
 def metadata_from_yaml(yaml_string):
     """Extract and categorize the data from a given yaml file into a dictionary"""
-    with open(yaml_string, "r", encoding="utf-8") as stream:
-        metadata_yaml = yaml.safe_load(stream)
-    return metadata_yaml
+    return _thaw(load_yaml(yaml_string))
+
+
+def load_yaml(filename):
+    """Parse a yaml file into an immutable view, cached by path and mtime.
+
+    The same supplemental files are read for every acquisition in a bulk
+    run, so each is only parsed again once it changes on disk. Mappings
+    are returned as read-only MappingProxyType and lists as tuples, so
+    the cached result cannot be modified by callers.
+    """
+    stat = os.stat(filename)
+    return _parse_yaml(os.fspath(filename), stat.st_mtime_ns, stat.st_size)
+
+
+def merged_yaml(*filenames):
+    """Merge yaml files left-to-right into an immutable view, cached.
+
+    If the same top-level key is present in multiple files, the value
+    from the last file wins, as in assemble_metadata.
+    """
+    keys = []
+    for filename in filenames:
+        stat = os.stat(filename)
+        keys.append((os.fspath(filename), stat.st_mtime_ns, stat.st_size))
+    return _merge_yaml(tuple(keys))
+
+
+@functools.lru_cache(maxsize=128)
+def _parse_yaml(filename, mtime_ns, size):
+    with open(filename, "r", encoding="utf-8") as stream:
+        return _freeze(yaml.load(stream, Loader=_YAML_LOADER))
+
+
+@functools.lru_cache(maxsize=128)
+def _merge_yaml(keys):
+    merged = {}
+    for key in keys:
+        merged.update(_parse_yaml(*key))
+    return MappingProxyType(merged)
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, set):
+        return frozenset(value)
+    return value
+
+
+def _thaw(value):
+    """Rebuild plain, mutable containers from a frozen view."""
+    if isinstance(value, MappingProxyType):
+        return {key: _thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+    if isinstance(value, frozenset):
+        return set(value)
+    return value
 
 
 def assemble_metadata(basename, *yaml):
@@ -249,6 +506,235 @@ def assemble_metadata(basename, *yaml):
     metadata["WIP"] = metadata_from_wip(pathlib.Path(basename).with_suffix(".WIP"))
     metadata["SPE"] = metadata_from_spe(pathlib.Path(basename).with_suffix(".SPE"))
     metadata["Experiment"] = metadata_from_name(basename)
-    for file in yaml:
-        metadata.update(metadata_from_yaml(file))
+    metadata.update(_thaw(merged_yaml(*yaml)))
     return metadata
+
+
+def find_pairs(directory):
+    """Find every basename with both a .WIP and a .SPE file in a directory tree.
+
+    Parameters
+    ----------
+    directory : str
+        Root of the tree to search, e.g. the synced data/ folder.
+
+    Returns
+    -------
+    basenames : list of pathlib.Path
+        Sorted paths without extension, suitable for assemble_metadata.
+    """
+    suffixes = {}
+    for root, _, files in os.walk(directory):
+        for file in files:
+            stem, suffix = os.path.splitext(file)
+            if suffix in (".WIP", ".SPE"):
+                suffixes.setdefault(os.path.join(root, stem), set()).add(suffix)
+    return sorted(
+        pathlib.Path(basename)
+        for basename, found in suffixes.items()
+        if found == {".WIP", ".SPE"}
+    )
+
+
+def as_builtin(value):
+    """Convert ctypes structures, arrays and bytes into plain Python values."""
+    if isinstance(value, ctypes.Structure):
+        return {
+            name: as_builtin(getattr(value, name))
+            for name, *_ in value._fields_
+            if not name.startswith("Spare_")
+        }
+    if isinstance(value, ctypes.Array):
+        return [as_builtin(item) for item in value]
+    if isinstance(value, bytes):
+        return value.decode("windows-1252")
+    return value
+
+
+def flatten_metadata(metadata, sep="."):
+    """Flatten nested metadata into a single-level dictionary.
+
+    Nested dictionaries, lists, and ctypes structures such as the SPE
+    header are expanded into one key per scalar value, joined by `sep`,
+    e.g. "SPE.xcalibration.polynom_coeff.0".
+    """
+    flat = {}
+
+    def inner(prefix, value):
+        value = as_builtin(value)
+        if isinstance(value, dict):
+            items = value.items()
+        elif isinstance(value, (list, tuple)):
+            items = enumerate(value)
+        else:
+            flat[prefix] = value
+            return
+        for key, item in items:
+            inner(f"{prefix}{sep}{key}" if prefix else str(key), item)
+
+    inner("", metadata)
+    return flat
+
+
+def unflatten_metadata(flat, sep="."):
+    """Rebuild nested metadata from the keys of flatten_metadata.
+
+    Levels whose keys are exactly 0, 1, ..., n-1 become lists again.
+    """
+    nested = {}
+    for key, value in flat.items():
+        *parents, name = str(key).split(sep)
+        level = nested
+        for parent in parents:
+            level = level.setdefault(parent, {})
+        level[name] = value
+
+    def inner(value):
+        if not isinstance(value, dict):
+            return value
+        items = {key: inner(item) for key, item in value.items()}
+        if items and sorted(items) == sorted(str(i) for i in range(len(items))):
+            return [items[str(i)] for i in range(len(items))]
+        return items
+
+    return inner(nested)
+
+
+def _assemble_row(basename, yaml):
+    """Assemble and flatten the metadata of one acquisition for a DataFrame."""
+    try:
+        row = flatten_metadata(assemble_metadata(basename, *yaml))
+    except Exception as error:  # pylint: disable=broad-except
+        log.warning("Could not assemble %s: %s", basename, error)
+        row = {"error": f"{type(error).__name__}: {error}"}
+    row["basename"] = str(basename)
+    return row
+
+
+def assemble_directory(directory, *yaml, processes=None, progress=None):
+    """Assemble metadata for every WIP/SPE pair in a directory tree.
+
+    Parameters
+    ----------
+    directory : str
+        Root of the tree to search for similarly named .WIP and .SPE files.
+    yaml: str (optional)
+        Path to additonal yaml file(s) applied to every acquisition, as in
+        assemble_metadata.
+    processes : int (optional)
+        Number of worker processes. Defaults to the number of CPUs.
+    progress : callable (optional)
+        Called as progress(done, total, basename) after each pair.
+
+    Returns
+    -------
+    metadata : pandas.DataFrame
+        One row per acquisition, with columns from flatten_metadata and a
+        "basename" column. Pairs that fail to parse keep their basename
+        and report the reason in an "error" column instead.
+    """
+    basenames = find_pairs(directory)
+    total = len(basenames)
+    rows = []
+
+    def collect(row):
+        rows.append(row)
+        log.info("Assembled %d/%d: %s", len(rows), total, row["basename"])
+        if progress is not None:
+            progress(len(rows), total, row["basename"])
+
+    if processes == 1:
+        for basename in basenames:
+            collect(_assemble_row(basename, yaml))
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [
+                pool.submit(_assemble_row, basename, yaml) for basename in basenames
+            ]
+            for future in as_completed(futures):
+                collect(future.result())
+    frame = pd.DataFrame(rows)
+    if frame.empty:
+        return frame
+    columns = ["basename"] + [
+        column for column in frame.columns if column != "basename"
+    ]
+    return frame[columns].sort_values("basename", ignore_index=True)
+
+
+def typed_metadata(metadata, sep="."):
+    """Give flattened metadata columns explicit types for export.
+
+    Parameters
+    ----------
+    metadata : pandas.DataFrame, dict, or list of dict
+        Output of assemble_directory, or nested metadata such as that of
+        assemble_metadata or metadata_from_spe, one dictionary per row.
+    sep : str (optional)
+        Separator of nested keys in the column names.
+
+    Returns
+    -------
+    frame : pandas.DataFrame
+        One column per scalar, e.g. "SPE.ROIinfblk.0.startx". Columns for
+        FLOAT_FIELDS are floats, DATE_FORMATS columns are timezone-aware
+        UTC datetimes, and columns mixing types are stored as strings. A
+        column with a value that does not convert keeps its values.
+    """
+    if isinstance(metadata, pd.DataFrame):
+        frame = metadata.copy()
+    else:
+        if isinstance(metadata, dict) or not isinstance(metadata, (list, tuple)):
+            metadata = [metadata]
+        frame = pd.DataFrame([flatten_metadata(item, sep) for item in metadata])
+    for column in frame.columns:
+        keys = tuple(str(column).split(sep))
+        values, converted = frame[column], None
+        if keys[-1] in FLOAT_FIELDS:
+            converted = pd.to_numeric(values, errors="coerce").astype("float64")
+        elif keys in DATE_FORMATS:
+            converted = pd.to_datetime(
+                values, format=DATE_FORMATS[keys], utc=True, errors="coerce"
+            )
+        if converted is not None and not _loses_values(column, values, converted):
+            frame[column] = converted
+        elif pd.api.types.infer_dtype(values, skipna=True).startswith("mixed"):
+            frame[column] = values.map(str, na_action="ignore")
+    return frame
+
+
+def _loses_values(column, values, converted):
+    """Whether a conversion turned any value of a column into a null."""
+    lost = converted.isna() & values.notna()
+    if lost.any():
+        log.warning(
+            "Keeping %s unconverted, %r does not convert", column, values[lost].iloc[0]
+        )
+    return bool(lost.any())
+
+
+def export_metadata(metadata, filename, sep="."):
+    """Write metadata to a columnar .csv or .parquet file.
+
+    Parameters
+    ----------
+    metadata : pandas.DataFrame, dict, or list of dict
+        Metadata as accepted by typed_metadata.
+    filename : str
+        Output path; the format is chosen by its extension.
+
+    Returns
+    -------
+    frame : pandas.DataFrame
+        The typed table that was written.
+    """
+    frame = typed_metadata(metadata, sep)
+    suffix = pathlib.Path(filename).suffix.lower()
+    if suffix == ".csv":
+        frame.to_csv(filename, index=False)
+    elif suffix in (".parquet", ".pq"):
+        frame.to_parquet(filename, index=False)
+    else:
+        raise ValueError(f"Cannot export metadata to {suffix!r}, use .csv or .parquet")
+    log.info("Exported %d rows to %s", len(frame), filename)
+    return frame
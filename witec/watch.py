@@ -0,0 +1,125 @@
+"""This module watches a data directory for new acquisitions.
+
+The synced data/ directory usually lives on a network mount, where
+filesystem event APIs are unreliable or missing. Watcher instead takes a
+snapshot of the size and modification time of every .SPE and .WIP file
+on each poll and diffs it against the previous one. New or changed
+files are held back until their size and modification time have stopped
+changing for a few polls, since the instrument may still be writing
+them, and are then handed to a callback one acquisition at a time.
+
+>>> from witec.watch import Watcher
+
+>>> watcher = Watcher("data", interval=10)
+>>> watcher.run()  # extracts metadata of each acquisition as it lands
+"""
+
+import logging
+import os
+import time
+
+from witec.catalog import scan
+from witec.utils import assemble_metadata
+
+log = logging.getLogger(__name__)
+
+
+def extract_metadata(basename, suffixes):
+    """Default Watcher callback: assemble the metadata of a finished pair.
+
+    Returns None until both the .WIP and .SPE file have arrived.
+    """
+    if set(suffixes) != {".SPE", ".WIP"}:
+        log.info("Waiting for the rest of %s", basename)
+        return None
+    metadata = assemble_metadata(basename)
+    log.info("Extracted metadata of %s", basename)
+    return metadata
+
+
+class Watcher:
+    """Poll a directory tree and report acquisitions once they are complete.
+
+    Parameters
+    ----------
+    directory : str
+        Root of the tree holding .WIP and .SPE files.
+    callback : callable (optional)
+        Called as callback(basename, suffixes) once every new or changed
+        file of an acquisition has settled. Defaults to extract_metadata.
+    interval : float (optional)
+        Seconds between polls in run().
+    settle : int (optional)
+        Number of consecutive polls a file's size and modification time
+        must stay unchanged before it is considered written.
+    existing : bool (optional)
+        Also report files already present when the watcher starts.
+        By default they are taken as the baseline and ignored.
+    """
+
+    def __init__(
+        self, directory, callback=None, interval=5.0, settle=2, existing=False
+    ):
+        self.directory = directory
+        self.callback = callback or extract_metadata
+        self.interval = interval
+        self.settle = settle
+        self._snapshot = {} if existing else scan(directory)
+        # Polls each changed file has stayed unchanged for
+        self._pending = {}
+
+    def poll(self):
+        """Diff one snapshot and run the callback on settled acquisitions.
+
+        Returns
+        -------
+        results : dict
+            Return value of the callback for each basename handled.
+        """
+        current = scan(self.directory)
+        for path, stat in current.items():
+            if self._snapshot.get(path) != stat:
+                self._pending[path] = 0
+            elif path in self._pending:
+                self._pending[path] += 1
+        for path in set(self._pending) - set(current):
+            del self._pending[path]
+        self._snapshot = current
+
+        waiting = {}
+        for path, polls in self._pending.items():
+            basename = os.path.splitext(path)[0]
+            waiting.setdefault(basename, []).append(polls >= self.settle)
+        results = {}
+        for basename, settled in sorted(waiting.items()):
+            if not all(settled):
+                continue
+            suffixes = sorted(
+                suffix for suffix in (".SPE", ".WIP") if basename + suffix in current
+            )
+            for suffix in suffixes:
+                self._pending.pop(basename + suffix, None)
+            try:
+                results[basename] = self.callback(basename, suffixes)
+            except Exception:  # pylint: disable=broad-except
+                log.exception("Callback failed for %s", basename)
+        return results
+
+    def run(self, iterations=None):
+        """Poll every `interval` seconds until interrupted.
+
+        Parameters
+        ----------
+        iterations : int (optional)
+            Stop after this many polls instead of running forever.
+        """
+        log.info("Watching %s every %s s", self.directory, self.interval)
+        count = 0
+        try:
+            while iterations is None or count < iterations:
+                self.poll()
+                count += 1
+                if iterations is None or count < iterations:
+                    time.sleep(self.interval)
+        except KeyboardInterrupt:
+            log.info("Stopped watching %s", self.directory)
@@ -5,6 +5,8 @@ import struct
 import numpy as np
 import logging
 
+from witec.scan import scan_view
+
 __all__ = ['SpeFile', 'print_offsets']
 
 __author__ = "Anton Loukianov"
@@ -151,6 +153,30 @@ class SpeFile(object):
 
             return self._data
 
+    def memmap(self):
+        ''' Memory-map the data segment as stored, (NumFrames, ydim, xdim), with the flip of _read '''
+
+        frames = np.memmap(self.path, dtype=SpeFile._datatype_map[self.header.datatype], mode='r',
+                           offset=4100, shape=(self.header.NumFrames, self.header.ydim, self.header.xdim))
+        # Same flip as _read, along xdim
+        if (self.reversed == True) != (self.adc == '100 KHz'):
+            frames = frames[:, :, ::-1]
+        return frames
+
+    def _map(self):
+        ''' Memory-map the data segment, oriented like `data` but without reading it '''
+
+        return np.rollaxis(self.memmap(), 2, 1)
+
+    def cube(self, points_per_line, lines=None, serpentine=False, mmap=False):
+        ''' View the frames of a map as an array of (lines, points_per_line, x, y)
+
+        The view shares memory with `data`, or with the file itself when `mmap` is set. Odd
+        lines of a `serpentine` scan are mirrored by index arithmetic, see witec.scan.scan_view.
+        '''
+        frames = self._map() if mmap else self.data
+        return scan_view(frames, points_per_line, lines, serpentine)
+
     @property
     def xaxis(self):
         if self._xaxis is not None:
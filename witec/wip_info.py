@@ -0,0 +1,178 @@
+"""This module parses the information text of WIP data objects into typed
+values.
+
+metadata_from_wip keeps every "key: value" line of an info stream as a
+string, such as "Integration Time": "0.5 s" or "Scan Width [µm]":
+"20.000". typed_info converts those values once, with precompiled
+patterns, into numbers in SI units, ISO 8601 dates and times, and
+tuples of coordinates. A unit, whether given in the key or after the
+value, moves into the key the same way metadata_from_name names its
+settings:
+
+>>> from witec.wip_info import parse_info
+
+>>> parse_info("Spectrum Information\\nIntegration Time:\\t0.5 s\\n"
+...            "Points per Line:\\t4\\nScan Width [µm]:\\t20.000\\n")
+{'Information': 'Spectrum Information', 'Integration Time (s)': 0.5,
+ 'Points per Line': 4, 'Scan Width (m)': 2e-05}
+
+Parsed streams are cached by a hash of their content, so projects that
+share a template, or that are catalogued again, are parsed only once.
+"""
+
+from collections import OrderedDict
+import datetime
+from decimal import Decimal
+import functools
+import hashlib
+import re
+
+from dateutil import parser
+
+from witec.utils import parse_wip_text
+
+# Number of parsed info streams kept by parse_info
+CACHE_SIZE = 2**12
+
+# SI prefixes, as powers of ten, and the units they may precede
+PREFIXES = {"p": -12, "n": -9, "u": -6, "µ": -6, "μ": -6, "m": -3, "c": -2}
+PREFIXES.update(k=3, M=6, G=9)
+BASE_UNITS = ("m", "s", "W", "Hz", "A", "V", "K", "J")
+
+# SI unit of each recognized unit string, and the factor to reach it
+UNITS = {
+    prefix + unit: (unit, Decimal(10) ** power)
+    for prefix, power in PREFIXES.items()
+    for unit in BASE_UNITS
+}
+UNITS.update({unit: (unit, 1) for unit in BASE_UNITS})
+UNITS.update(
+    {
+        "min": ("s", 60),
+        "h": ("s", 3600),
+        "°": ("°", 1),
+        "deg": ("°", 1),
+        "°C": ("°C", 1),
+        "1/cm": ("1/m", 100),
+        "rel. 1/cm": ("1/m", 100),
+    }
+)
+
+_NUMBER = r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"
+_KEY_UNIT = re.compile(r"(.*?)\s*\[([^\]]*)\]")
+_INTEGER = re.compile(r"[-+]?\d+")
+_UNIT = r"(rel\. 1/cm|1/cm|[^\d\s,;().+-]\S*)"
+_QUANTITY = re.compile(rf"({_NUMBER})\s*{_UNIT}?")
+_COORDINATES = re.compile(
+    rf"\(?\s*({_NUMBER}(?:\s*[,;]\s*{_NUMBER})+)\s*\)?\s*{_UNIT}?"
+)
+_SEPARATOR = re.compile(r"\s*[,;]\s*")
+_CLOCK = re.compile(r"\d{1,2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:\s*[AaPp]\.?[Mm]\.?)?")
+
+_parsed = OrderedDict()
+
+
+def parse_info(text):
+    """Parse the plain text of an info stream into typed values.
+
+    Parameters
+    ----------
+    text : str
+        Information text as returned by project.info_streams.
+
+    Returns
+    -------
+    info : dict
+        The fields of metadata_from_wip, converted by typed_info.
+    """
+    digest = hashlib.blake2b(text.encode(), digest_size=16).digest()
+    if digest in _parsed:
+        _parsed.move_to_end(digest)
+    else:
+        _parsed[digest] = typed_info(parse_wip_text(text))
+        if len(_parsed) > CACHE_SIZE:
+            _parsed.popitem(last=False)
+    return dict(_parsed[digest])
+
+
+def typed_info(fields):
+    """Convert the string values of one WIP data object.
+
+    Parameters
+    ----------
+    fields : dict
+        Information fields of one data object, as in metadata_from_wip.
+
+    Returns
+    -------
+    info : dict
+        Integers, floats in SI units, ISO 8601 dates and times, or
+        tuples of coordinates where a value can be read as such, and the
+        original string otherwise. Keys carry the SI unit of their value,
+        e.g. "Scan Width (m)". Matching "<name> Date" and "<name> Time"
+        fields are also combined into a "<name> Datetime".
+    """
+    info = dict(typed_value(key, value) for key, value in fields.items())
+    for key, value in list(info.items()):
+        if not key.endswith(" Date") or not isinstance(value, datetime.date):
+            continue
+        clock = info.get(key[: -len("Date")] + "Time")
+        if isinstance(clock, datetime.time):
+            info[key[: -len("Date")] + "Datetime"] = datetime.datetime.combine(
+                value, clock
+            )
+    return {key: _isoformat(value) for key, value in info.items()}
+
+
+def _isoformat(value):
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return value
+
+
+@functools.lru_cache(maxsize=2**12)
+def typed_value(key, value):
+    """Convert a single "key: value" pair of an info stream.
+
+    Returns
+    -------
+    item : tuple
+        (key, value), with the unit in the key as in typed_info. Dates
+        and times are returned as datetime objects.
+    """
+    name, unit = key, None
+    if match := _KEY_UNIT.fullmatch(key.strip()):
+        name, unit = match.groups()
+        unit = unit.strip() or None
+    value = value.strip()
+    if _INTEGER.fullmatch(value) and unit is None:
+        return name, int(value)
+    if match := _QUANTITY.fullmatch(value):
+        number, trailing = match.groups()
+        return _with_unit(name, number, unit or trailing)
+    if match := _COORDINATES.fullmatch(value):
+        numbers, trailing = match.groups()
+        numbers = tuple(_SEPARATOR.split(numbers))
+        return _with_unit(name, numbers, unit or trailing)
+    if _CLOCK.fullmatch(value):
+        return key, parser.parse(value).time()
+    if "Date" in key:
+        try:
+            return key, parser.parse(value).date()
+        except (ValueError, OverflowError):
+            pass
+    return key, value
+
+
+def _with_unit(name, number, unit):
+    """Scale a number, or tuple of numbers, to SI and name its unit.
+
+    Numbers are scaled as decimal strings, so that 532.123 nm becomes
+    the float nearest to 5.32123e-07 m.
+    """
+    si_unit, factor = (None, 1) if unit is None else UNITS.get(unit, (unit, 1))
+    if isinstance(number, tuple):
+        number = tuple(float(Decimal(value) * factor) for value in number)
+    else:
+        number = float(Decimal(number) * factor)
+    return (name, number) if si_unit is None else (f"{name} ({si_unit})", number)